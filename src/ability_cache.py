@@ -0,0 +1,46 @@
+from typing import Dict, Iterable, List
+
+from sc2 import BotAI
+from sc2.constants import AbilityId
+from sc2.unit import Unit
+
+
+class AbilityCache(object):
+    """
+    Available abilities per unit tag for the current game step.
+    Units are queried together in one batched request; lookups afterwards are synchronous.
+    Everything is dropped once the game loop advances.
+    """
+
+    def __init__(self, bot: BotAI):
+        self.bot = bot
+        self.game_loop = None
+        self.abilities: Dict[int, List[AbilityId]] = {}
+        self.query_count = 0
+
+    def _reset_if_new_step(self):
+        game_loop = self.bot.state.game_loop
+        if game_loop != self.game_loop:
+            self.game_loop = game_loop
+            self.abilities = {}
+
+    async def prefetch(self, units: Iterable[Unit]):
+        """Queries every unit that has not been queried this step in a single request"""
+        self._reset_if_new_step()
+        missing = list({unit.tag: unit for unit in units if unit.tag not in self.abilities}.values())
+        if not missing:
+            return
+        self.query_count += 1
+        results = await self.bot.get_available_abilities(missing)
+        for unit, abilities in zip(missing, results):
+            self.abilities[unit.tag] = abilities
+
+    def available(self, unit: Unit) -> List[AbilityId]:
+        """Returns the prefetched abilities of the unit, or an empty list if it was not prefetched this step"""
+        self._reset_if_new_step()
+        return self.abilities.get(unit.tag, [])
+
+    async def get(self, unit: Unit) -> List[AbilityId]:
+        """Returns the abilities of the unit, querying it on its own if it was not prefetched this step"""
+        await self.prefetch([unit])
+        return self.available(unit)
@@ -0,0 +1,157 @@
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from sc2 import BotAI
+from sc2.data import ActionResult
+from sc2.unit_command import UnitCommand
+
+import src.bot_logger as bot_logger
+
+
+class ActionBuffer(object):
+    """
+    Collects the unit commands issued during a step so they can be sent in one request.
+    Conflicting commands for the same unit tag are resolved as they are added:
+      - a non queued move / attack style command (one with a target) replaces the targeted commands
+        buffered for that unit earlier in the step
+      - commands without a target (toggles like creep generation, morphs, trains, stop) are always kept
+      - structures keep all of their commands, train / research queue up and rally doesn't replace them
+      - queued commands are appended in the order they were issued
+    Units are flushed in the order they first received a command.
+
+    >>> from sc2.constants import AbilityId
+    >>> from sc2.position import Point2
+    >>> from sc2.unit import Unit
+    >>> class FakeUnit(Unit):
+    ...     tag, is_structure = None, None
+    ...     def __init__(self, tag, is_structure=False):
+    ...         self.tag, self.is_structure = tag, is_structure
+    >>> drone, hatchery, buffer = FakeUnit(1), FakeUnit(2, is_structure=True), ActionBuffer()
+    >>> move = UnitCommand(AbilityId.MOVE, drone, Point2((10, 10)))
+    >>> build = UnitCommand(AbilityId.ZERGBUILD_SPAWNINGPOOL, drone, Point2((20, 20)))
+    >>> stop = UnitCommand(AbilityId.STOP, drone)
+    >>> # the targeted build replaces the move, the untargeted stop stays next to the build
+    >>> buffer.add(move), buffer.add(build) == [move], buffer.add(stop)
+    ([], True, [])
+    >>> train = UnitCommand(AbilityId.TRAINQUEEN_QUEEN, hatchery)
+    >>> rally = UnitCommand(AbilityId.RALLY_HATCHERY_UNITS, hatchery, Point2((30, 30)))
+    >>> other_rally = UnitCommand(AbilityId.RALLY_HATCHERY_WORKERS, hatchery, Point2((31, 31)))
+    >>> # structures keep every command
+    >>> buffer.add(train), buffer.add(rally), buffer.add(train), buffer.add(other_rally)
+    ([], [], [], [])
+    >>> buffer.pop_all() == [build, stop, train, rally, train, other_rally], len(buffer)
+    (True, 0)
+    """
+
+    def __init__(self):
+        self.commands: Dict[int, List[UnitCommand]] = OrderedDict()
+        self.batched_count = 0
+
+    def __len__(self) -> int:
+        return sum(len(commands) for commands in self.commands.values())
+
+    def add(self, action: UnitCommand) -> List[UnitCommand]:
+        """Buffers the action and returns the previously buffered actions it discarded"""
+        self.batched_count += 1
+        commands = self.commands.setdefault(action.unit.tag, [])
+        discarded = []
+        if not action.queue and action.target is not None and not action.unit.is_structure:
+            discarded = [command for command in commands if command.target is not None]
+            commands[:] = [command for command in commands if command.target is None]
+        commands.append(action)
+        return discarded
+
+    def pop_all(self) -> List[UnitCommand]:
+        """Returns every buffered action and empties the buffer"""
+        actions = [action for commands in self.commands.values() for action in commands]
+        self.commands = OrderedDict()
+        self.batched_count = 0
+        return actions
+
+
+class BufferedActionsBot(BotAI):
+    """
+    BotAI whose do / do_actions only buffer commands; they are flushed in a single request at the end of on_step.
+    Subclasses implement on_game_step instead of on_step.
+    Costs are deducted when an action is buffered, so can_afford stays accurate during the step.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.action_buffer = ActionBuffer()
+        self.last_batched_action_count = 0
+        self.last_flushed_action_count = 0
+        self.log_action_counts = False
+
+    def _deduct_cost(self, action: UnitCommand, multiplier: int=1):
+        cost = self._game_data.calculate_ability_cost(action.ability)
+        self.minerals -= cost.minerals * multiplier
+        self.vespene -= cost.vespene * multiplier
+
+    def _buffer_action(self, action: UnitCommand):
+        """
+        Deducts the action's cost and refunds the costs of the buffered actions it replaced
+
+        >>> from types import SimpleNamespace
+        >>> from sc2.constants import AbilityId
+        >>> from sc2.game_data import Cost
+        >>> from sc2.position import Point2
+        >>> from sc2.unit import Unit
+        >>> class FakeUnit(Unit):
+        ...     tag, is_structure = 1, False
+        ...     def __init__(self):
+        ...         pass
+        >>> costs = {AbilityId.ZERGBUILD_SPAWNINGPOOL: Cost(200, 0), AbilityId.ZERGBUILD_EVOLUTIONCHAMBER: Cost(75, 0)}
+        >>> bot = BufferedActionsBot()
+        >>> bot._game_data = SimpleNamespace(calculate_ability_cost=lambda ability: costs.get(ability, Cost(0, 0)))
+        >>> bot.minerals, bot.vespene, drone = 300, 0, FakeUnit()
+        >>> bot._buffer_action(UnitCommand(AbilityId.ZERGBUILD_SPAWNINGPOOL, drone, Point2((20, 20))))
+        >>> bot.minerals
+        100
+        >>> # the drone builds the evolution chamber instead, the pool is refunded
+        >>> bot._buffer_action(UnitCommand(AbilityId.ZERGBUILD_EVOLUTIONCHAMBER, drone, Point2((25, 20))))
+        >>> bot.minerals, len(bot.action_buffer)
+        (225, 1)
+        """
+        self._deduct_cost(action)
+        for discarded in self.action_buffer.add(action):
+            self._deduct_cost(discarded, multiplier=-1)
+
+    async def do(self, action: UnitCommand) -> Optional[ActionResult]:
+        if not self.can_afford(action):
+            return ActionResult.Error
+        self._buffer_action(action)
+
+    async def do_actions(self, actions: List[UnitCommand]):
+        for action in actions:
+            self._buffer_action(action)
+
+    async def flush_actions(self) -> Optional[List[ActionResult]]:
+        """Sends every buffered action in one request"""
+        self.last_batched_action_count = self.action_buffer.batched_count
+        actions = self.action_buffer.pop_all()
+        self.last_flushed_action_count = len(actions)
+        if self.log_action_counts and self.last_batched_action_count:
+            bot_logger.log_action(self, 'flushing {} actions ({} batched)'.format(
+                self.last_flushed_action_count, self.last_batched_action_count))
+        if not actions:
+            return None
+        errors = await self._client.actions(actions, game_data=self._game_data)
+        if errors:
+            bot_logger.log_action(self, 'action errors: {}'.format(errors))
+        return errors
+
+    async def on_game_step(self, iteration):
+        """override to allow the bot to perform actions every game step"""
+        pass
+
+    async def on_step(self, iteration):
+        try:
+            await self.on_game_step(iteration)
+        finally:
+            await self.flush_actions()
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -7,28 +7,109 @@ from sc2.units import Units
 from sc2.position import Point2, Point3, Pointlike
 from sc2.constants import AbilityId, BuffId, UnitTypeId, UpgradeId
 from sc2.unit_command import UnitCommand
-from sc2.data import race_worker
-from typing import List, Callable, Optional, Dict, Union
-from functools import reduce
+from sc2.data import race_worker, ActionResult
+from typing import List, Callable, Optional, Dict, Union, Iterator, Tuple
 
 import src.bot_logger as bot_logger
-from src.helpers import roundrobin, between, property_cache_forever, \
-get_figure_name, get_plot_directory, make_dir_if_not_exists
-from src.bot_actions import build_building_once, get_workers_per_townhall, get_enemies_near_position, \
-find_potential_enemy_expansions, get_is_targettable_callable, get_is_threat_callable, get_closest_to
-from src.zerg_actions import get_random_larva, build_drone, build_zergling, build_overlord, \
-    upgrade_zergling_speed, get_forces, geyser_has_extractor, already_researching_lair, \
+from src.helpers import roundrobin, between, \
+get_figure_name, get_plot_directory, make_dir_if_not_exists, get_profile_name, get_profile_directory
+from src.bot_actions import get_workers_per_townhall, get_enemies_near_position, \
+get_is_targettable_callable, get_is_threat_callable, get_closest_to, \
+get_closest_enemy, get_total_dps
+from src.zerg_actions import get_random_larva, build_drone, build_overlord, \
+    upgrade_zergling_speed, get_forces, get_ready_townhalls, get_free_larvae, geyser_has_extractor, already_researching_lair, \
     already_researching_hive, ZERG_MELEE_WEAPON_UPGRADES, ZERG_RANGED_WEAPON_UPGRADES, \
     ZERG_GROUND_ARMOR_UPGRADES, ZERG_FLYING_WEAPON_UPGRADES, ZERG_FLYING_ARMOR_UPGRADES, \
-    ULTRALISK_CAVERN_ABILITIES, ROACHWARREN_ABILITIES, HYDRALISK_DEN_ABILITIES
+    ULTRALISK_CAVERN_ABILITIES, ROACHWARREN_ABILITIES, HYDRALISK_DEN_ABILITIES, TOWNHALL_TYPES
 from src.zerg_bot_base import ZergBotBase
 from src.location_picker import LocationPicker
 from src.location_checker import LocationChecker
-from src.bot_plotter import BotPlotter
+from src.plot_renderer import PlotRenderer
+from src.results_store import get_game_summary
 from src.types import Location
 from src.colors import DebugColor
 from src.bot_debugger import BotDebugger
 from src.timing_manager import TimingManager, Timing
+from src.vectorized_micro import MicroTargetPlan
+from src.command_cache import CommandCache
+from src.enemy_army_tracker import EnemyArmyTracker
+from src.step_profiler import StepProfiler
+from src.influence_map import InfluenceMap, get_influence_sources
+from src.memoization import memoize, memoized_property, get_memo_stats, GAME, STEP
+from src.pending_production import compare_already_pending
+from src.larva_planner import ProductionOption, plan_larva_production
+from src.build_order_search import BuildOrderExecutor, BUILD_ACTIONS, DEFAULT_BUILD_ORDERS_PATH, load_build_orders
+from src.economy_model import EconomyState, EconomyProjection, INJECT_SECONDS, OVERLORD_SECONDS, OVERLORD_SUPPLY, \
+    HATCHERY_SECONDS, HATCHERY_SUPPLY
+from src.map_cache import MapAnalysis, load_map_analysis, analyze_map
+from src.placement_planner import PlacementPlanner, FOOTPRINT_SIZES, NO_CREEP_STRUCTURES, pixel_map_to_array, \
+    get_resource_blocked_cells
+
+# timing name: (strategy flag, strategy name logged), for the strategies that only follow their timings
+TIMING_STRATEGIES = {
+    'boom': ('booming', 'booming'),
+    'mutalisk': ('use_mutalisk_strategy', 'mutalisk'),
+    'ultralisk': ('use_ultralisk_strategy', 'ultralisk'),
+    'roach': ('use_roach_strategy', 'roach'),
+    'hydralisk': ('use_hydralisk_strategy', 'hydralisk'),
+    'broodlord': ('use_broodlord_strategy', 'broodlord'),
+}
+
+# enemy dps on a townhall that is worth pulling its drones away for
+DRONE_PULL_THREAT = 30
+# enemy dps on a returning drone that sends it home, about more than 5 enemy units so a scouting worker doesn't
+DRONE_FLEE_THREAT = 30
+
+# unit types the should_* predicates ask already_pending about, compared against python-sc2's when profiling
+PENDING_UNIT_TYPES = [
+    UnitTypeId.LAIR, UnitTypeId.HIVE, UnitTypeId.QUEEN, UnitTypeId.SPINECRAWLER, UnitTypeId.SPORECRAWLER,
+    UnitTypeId.EXTRACTOR, UnitTypeId.ROACHWARREN, UnitTypeId.HYDRALISKDEN, UnitTypeId.INFESTATIONPIT,
+    UnitTypeId.ULTRALISKCAVERN, UnitTypeId.EVOLUTIONCHAMBER, UnitTypeId.OVERLORD,
+]
+
+# share of the larva each army unit gets while it can be built, only the ratios between them matter
+MILITARY_UNIT_WEIGHTS = {
+    UnitTypeId.ULTRALISK: .8,
+    UnitTypeId.MUTALISK: .7,
+    UnitTypeId.HYDRALISK: .2,
+    UnitTypeId.ROACH: .1,
+    UnitTypeId.ZERGLING: .9,
+    UnitTypeId.CORRUPTOR: .9,
+}
+# seconds of income the larva planner may wait for the highest weighted unit instead of spending on cheaper ones
+PRODUCTION_SAVE_SECONDS = 10
+
+# seconds of bank, larva and supply the economy model projects
+ECONOMY_HORIZON_SECONDS = 30
+# minerals left over the horizon after spending every larva on the army, above it more drones would only float
+FLOATING_MINERALS_LIMIT = 400
+
+# the mineral fields and geysers of an expansion are within this distance of its townhall spot
+EXPANSION_RESOURCE_DISTANCE = 10
+
+# seconds a planned building keeps its footprint reserved while its drone walks there
+PLACEMENT_RESERVATION_TIME = 20
+# seconds a spot the game refused to confirm stays off limits (usually units standing on it)
+PLACEMENT_REFUSED_TIME = 10
+
+# scheduled tasks that keep running once every townhall is lost
+NO_TOWNHALL_TASKS = {'manage_strategies', 'update_plot', 'show_debug', 'camera'}
+# the production predicates the build order executor stands in for while it follows an order
+BUILD_ORDER_REPLACED_TASKS = {'build_static_defenses', 'build_military_units', 'build_units', 'build_drones',
+                              'improve_military_tech', 'build_gas', 'expansion', 'build_tech_structures'}
+# build order action: unit type it trains, builds or morphs to
+BUILD_ORDER_UNIT_TYPES = {
+    'drone': UnitTypeId.DRONE,
+    'overlord': UnitTypeId.OVERLORD,
+    'zergling': UnitTypeId.ZERGLING,
+    'roach': UnitTypeId.ROACH,
+    'queen': UnitTypeId.QUEEN,
+    'hatchery': UnitTypeId.HATCHERY,
+    'extractor': UnitTypeId.EXTRACTOR,
+    'spawningpool': UnitTypeId.SPAWNINGPOOL,
+    'roachwarren': UnitTypeId.ROACHWARREN,
+    'lair': UnitTypeId.LAIR,
+}
 
 
 class BalancedZergBot(ZergBotBase):
@@ -36,6 +117,13 @@ class BalancedZergBot(ZergBotBase):
         auto_camera=True,
         should_show_plot=True,
         show_debug=True,
+        vectorized_micro=False,
+        command_refresh_interval=224,
+        profile_steps=False,
+        step_budget_ms=20,
+        deterministic_production=False,
+        build_order: Optional[str]=None,
+        build_orders_path=DEFAULT_BUILD_ORDERS_PATH,
         timings={
             'boom': [
                 Timing(-1, 500),
@@ -77,13 +165,29 @@ class BalancedZergBot(ZergBotBase):
         super().__init__()
         self.auto_camera = auto_camera
         self.should_show_debug = show_debug
+        # pick army targets for all units at once with numpy instead of one unit at a time
+        self.vectorized_micro = vectorized_micro
+        self.micro_plan: Optional[MicroTargetPlan] = None
+        # drops micro commands the units are already carrying out, resending them every command_refresh_interval game loops
+        self.command_cache = CommandCache(refresh_interval=command_refresh_interval)
+        # allocate larva without random weight jitter, so benchmark runs produce the same army
+        self.deterministic_production = deterministic_production
+        # name of the precompiled opening in build_orders_path, the predicates take over once it ends or is disrupted
+        self.build_order_name = build_order
+        self.build_orders_path = build_orders_path
+        # subsystems that don't fit in step_budget_ms are pushed to the following steps
+        self.scheduler.budget_ms = step_budget_ms
+        # times each subsystem of the step, the percentiles are written to the profiles directory when the game ends
+        if profile_steps:
+            self.profiler = StepProfiler()
         self.timings = timings
-        self.timing_manager = TimingManager(self.timings)
+        self.timing_manager = TimingManager(self.timings, on_enter=self.on_timing_start, on_exit=self.on_timing_end)
         if self.should_show_debug:
             self.debugger: BotDebugger = BotDebugger()
         self.should_show_plot = should_show_plot
         if self.should_show_plot:
-            self.plotter = BotPlotter({
+            # matplotlib runs in a separate process, the bot only pushes samples to it
+            self.plot_renderer = PlotRenderer({
                 'mpm': [
                     (([], [], 'c-'), {'label': 'Minerals per minute'})
                 ],
@@ -119,7 +223,7 @@ class BalancedZergBot(ZergBotBase):
 
     @property
     def _is_ultralisk_time(self):
-        return self.timing_manager.is_timing('ultraliks')
+        return self.timing_manager.is_timing('ultralisk')
 
     @property
     def _is_roach_time(self):
@@ -140,9 +244,34 @@ class BalancedZergBot(ZergBotBase):
         military_value_killed = self.state.score.killed_minerals_army + self.state.score.killed_vespene_army
         return (military_value_lost < military_value_killed) or self._is_rushing_time
 
-    @property_cache_forever
+    @property
+    def estimated_enemy_army_location(self) -> Point2:
+        # TODO: pick a better start estimate
+        return self.enemy_army_tracker.estimated_location or self.game_info.map_center
+
+    @memoized_property(STEP)
+    def expansion_locations(self) -> Dict[Point2, Units]:
+        """The expansions of the cached map analysis with the resources left around them"""
+        if getattr(self, 'map_analysis', None) is None:
+            return super().expansion_locations
+        resources = self.state.resources
+        return {Point2(location): resources.closer_than(EXPANSION_RESOURCE_DISTANCE, location)
+                for location in self.map_analysis.expansion_locations}
+
+    async def get_next_expansion(self) -> Optional[Point2]:
+        """The free expansion with the shortest walk from the start, read from the map analysis instead of queried"""
+        if self.map_analysis is None:
+            return await super().get_next_expansion()
+        for location in map(Point2, self.map_analysis.expansions_by_ground(self.game_info.player_start_location)):
+            if not any(townhall.position.distance_to(location) < self.EXPANSION_GAP_THRESHOLD
+                       for townhall in self.townhalls):
+                return location
+        return None
+
+    @memoized_property(GAME)
     def potential_enemy_expansions(self) -> List[Point2]:
-        return find_potential_enemy_expansions(self)
+        return [Point2(location) for location in self.map_analysis.potential_enemy_expansions(
+            self.start_location, self.enemy_start_locations[0])]
 
     def get_has_been_under_attack_recently(self, is_under_attack=False) -> bool:
         recent_combat = self.time - \
@@ -150,6 +279,8 @@ class BalancedZergBot(ZergBotBase):
         return is_under_attack or recent_combat
 
     def on_start(self):
+        self.profiler.attach(self._client)
+        self.register_scheduled_tasks()
         # settings
         self.max_worker_count = 85
         self.ideal_workers_per_hatch = 24
@@ -169,29 +300,35 @@ class BalancedZergBot(ZergBotBase):
             location_options[str(i)] = location
         self.checked_enemy_start_locations = LocationPicker(
             self, location_options=location_options, location_checker=lambda bot, location: bot.units.closer_than(20, location).amount > 10)
-        self.known_enemy_army_centers: List[Pointlike] = []
-        # TODO: pick a better start estimate or initialize as None
-        self.estimated_enemy_army_location: Point2 = self.game_info.map_center
+        self.enemy_army_tracker = EnemyArmyTracker()
+        # ground and air dps of the known enemy units over the map, shared by the micro routines
+        map_size = self.game_info.map_size
+        self.influence_map = InfluenceMap(map_size.width, map_size.height)
+        # expansions, ramps and ground distances of the map, read from the map cache when this map was analyzed before
+        self.map_analysis: MapAnalysis = load_map_analysis(self.game_info)
+        # built by _prepare_first_step, on_start runs before the first observation
+        self.placement_planner: PlacementPlanner = None
+        self.placement_creep_loop = None
+        self.build_order_executor: Optional[BuildOrderExecutor] = None
+        if self.build_order_name:
+            build_order = load_build_orders(self.build_orders_path).get(self.build_order_name)
+            if build_order is None:
+                bot_logger.log_action(self, 'no build order {} in {}'.format(self.build_order_name, self.build_orders_path))
+            else:
+                self.build_order_executor = BuildOrderExecutor(build_order)
 
         # graphing
         if self.should_show_plot:
-            self._time_history = []
-            self._minerals_per_minute_history = []
-            self._gas_per_minute_history = []
-            self._supply_used_history = []
-            self._workers_history = []
-            self._forces_history = []
-            self._army_value_lost_history = []
-            self._army_killed_value_history = []
-
-        # strategy toggles (these are all managed, see the __init__ method for timings,
-        # and the manage_strategies method for the heuristics that enable / disable these properties)
+            self.plot_renderer.start()
+
+        # strategy toggles (these are all managed, the timing manager turns the TIMING_STRATEGIES on and off
+        # on the first step and every time their timings start or end, see manage_strategies for rushing)
         self.use_mutalisk_strategy = False
         self.use_ultralisk_strategy = False
         self.use_roach_strategy = False
         self.use_hydralisk_strategy = False
         self.use_broodlord_strategy = False
-        self.booming = True
+        self.booming = False
         self.rushing = False
 
         # upgrade lists used to perform upgrades in a particular order
@@ -203,6 +340,18 @@ class BalancedZergBot(ZergBotBase):
         self.roach_warren_upgrades = ROACHWARREN_ABILITIES
         self.ultralisk_cavern_upgrades = ULTRALISK_CAVERN_ABILITIES
 
+    def _prepare_first_step(self):
+        """automatically called by base class with the first observation, before its events"""
+        if self.map_analysis is None:
+            super()._prepare_first_step()
+            self.map_analysis = analyze_map(self)
+        else:
+            # same as the base class, with the cached ramps instead of searching the grids for them
+            if self.townhalls:
+                self._game_info.player_start_location = self.townhalls.first.position
+            self._game_info.map_ramps = self.map_analysis.get_ramps(self._game_info)
+        self.placement_planner = self.create_placement_planner()
+
     async def on_unit_created(self, unit: Unit):
         """automatically called by base class"""
         if unit.type_id is UnitTypeId.DRONE:
@@ -210,22 +359,40 @@ class BalancedZergBot(ZergBotBase):
         if unit.type_id is UnitTypeId.OVERLORD:
             await self.do(unit.move(self.state.mineral_field.further_than(10, self.enemy_start_locations[0]).random))
 
+    async def on_building_construction_started(self, unit: Unit):
+        if unit.type_id in FOOTPRINT_SIZES:
+            self.placement_planner.add_structure(unit.tag, unit.position, FOOTPRINT_SIZES[unit.type_id])
+
+    async def on_unit_destroyed(self, unit_tag):
+        self.placement_planner.remove_structure(unit_tag)
+
     async def on_building_construction_complete(self, unit: Unit):
         if unit.type_id is UnitTypeId.EXTRACTOR:
             await self.distribute_workers()
 
     def get_townhalls_under_attack(self) -> Units:
-        return self.townhalls.filter(lambda townhall: get_enemies_near_position(bot=self, position=townhall, distance=35, unit_filter=lambda u: u.can_attack_ground and u.ground_dps > 5).amount > 3)
+        return self.townhalls.filter(lambda townhall: get_enemies_near_position(bot=self, position=townhall, distance=35, unit_filter=None, can_attack_ground=True, ground_dps_above=5).amount > 3)
+
+    def get_ability_query_units(self) -> List[Unit]:
+        """idle queens for injects, upgrade structures and spawning pools for research"""
+        return [
+            *self.unit_snapshot.idle(UnitTypeId.QUEEN),
+            *self.unit_snapshot.ready_noqueue({UnitTypeId.EVOLUTIONCHAMBER, UnitTypeId.SPIRE, UnitTypeId.ROACHWARREN,
+                                               UnitTypeId.HYDRALISKDEN, UnitTypeId.ULTRALISKCAVERN}),
+            *self.unit_snapshot.ready(UnitTypeId.SPAWNINGPOOL),
+        ]
 
-    def manage_booming(self):
-        if self._is_booming:
-            if not self.booming:
-                bot_logger.log_strategy_start(self, 'booming')
-                self.booming = True
-        else:
-            if self.booming:
-                bot_logger.log_strategy_end(self, 'booming')
-                self.booming = False
+    def on_timing_start(self, timing_name: str):
+        if timing_name in TIMING_STRATEGIES:
+            flag_name, strategy_name = TIMING_STRATEGIES[timing_name]
+            bot_logger.log_strategy_start(self, strategy_name)
+            setattr(self, flag_name, True)
+
+    def on_timing_end(self, timing_name: str):
+        if timing_name in TIMING_STRATEGIES:
+            flag_name, strategy_name = TIMING_STRATEGIES[timing_name]
+            bot_logger.log_strategy_end(self, strategy_name)
+            setattr(self, flag_name, False)
 
     def manage_rushing(self):
         if self._is_rushing:
@@ -237,64 +404,10 @@ class BalancedZergBot(ZergBotBase):
                 bot_logger.log_strategy_end(self, 'rushing')
                 self.rushing = False
 
-    def manage_mutalisk_strategy(self):
-        if self._is_mutalisk_time:
-            if not self.use_mutalisk_strategy:
-                bot_logger.log_strategy_start(self, 'mutalisk')
-                self.use_mutalisk_strategy = True
-        else:
-            if self.use_mutalisk_strategy:
-                bot_logger.log_strategy_end(self, 'mutalisk')
-                self.use_mutalisk_strategy = False
-
-    def manage_ultralisk_strategy(self):
-        if self._is_ultralisk_time:
-            if not self.use_ultralisk_strategy:
-                bot_logger.log_strategy_start(self, 'ultralisk')
-                self.use_ultralisk_strategy = True
-        else:
-            if self.use_ultralisk_strategy:
-                bot_logger.log_strategy_end(self, 'ultralisk')
-                self.use_ultralisk_strategy = False
-
-    def manage_roach_strategy(self):
-        if self._is_roach_time:
-            if not self.use_roach_strategy:
-                bot_logger.log_strategy_start(self, 'roach')
-                self.use_roach_strategy = True
-        else:
-            if self.use_roach_strategy:
-                bot_logger.log_strategy_end(self, 'roach')
-                self.use_roach_strategy = False
-
-    def manage_hydralisk_strategy(self):
-        if self._is_hydralisk_time:
-            if not self.use_hydralisk_strategy:
-                bot_logger.log_strategy_start(self, 'hydralisk')
-                self.use_hydralisk_strategy = True
-        else:
-            if self.use_hydralisk_strategy:
-                bot_logger.log_strategy_end(self, 'hydralisk')
-                self.use_hydralisk_strategy = False
-
-    def manage_broodlord_strategy(self):
-        if self._is_broodlord_time:
-            if not self.use_broodlord_strategy:
-                bot_logger.log_strategy_start(self, 'broodlord')
-                self.use_broodlord_strategy = True
-        else:
-            if self.use_broodlord_strategy:
-                bot_logger.log_strategy_end(self, 'broodlord')
-                self.use_broodlord_strategy = False
-
     def manage_strategies(self):
-        self.manage_booming()
+        # strategies that only follow their timings are toggled by the timing manager callbacks,
+        # rushing also depends on the army trades so it's checked here
         self.manage_rushing()
-        self.manage_roach_strategy()
-        self.manage_hydralisk_strategy()
-        self.manage_mutalisk_strategy()
-        self.manage_ultralisk_strategy()
-        self.manage_broodlord_strategy()
 
     async def can_build_lair(self):
         if not self.townhalls.noqueue.exists:
@@ -302,15 +415,13 @@ class BalancedZergBot(ZergBotBase):
         return await self.can_cast(self.townhalls.noqueue.closest_to(self.start_location), AbilityId.UPGRADETOLAIR_LAIR) and self.can_afford(UnitTypeId.LAIR)
 
     def should_build_lair(self):
-        return not self.units(UnitTypeId.HIVE) and not self.units(UnitTypeId.LAIR)
+        return not self.unit_snapshot(UnitTypeId.HIVE) and not self.unit_snapshot(UnitTypeId.LAIR)
 
     def should_build_hive(self):
-        return self.units(UnitTypeId.INFESTATIONPIT).ready.exists and not self.units(
-            UnitTypeId.HIVE).ready.exists and not self.already_pending(UnitTypeId.HIVE) and self.can_afford(UnitTypeId.HIVE)
+        return self.unit_snapshot.ready(UnitTypeId.INFESTATIONPIT).exists and not self.unit_snapshot.ready(UnitTypeId.HIVE).exists and not self.already_pending(UnitTypeId.HIVE) and self.can_afford(UnitTypeId.HIVE)
 
     def should_build_spire(self):
-        return self.use_mutalisk_strategy and not self.units(
-            UnitTypeId.SPIRE).ready.exists and not self.already_pending(UnitTypeId.SPIRE)
+        return self.use_mutalisk_strategy and not self.unit_snapshot.ready(UnitTypeId.SPIRE).exists and not self.already_pending(UnitTypeId.SPIRE)
 
     async def can_build_expansion(self):
         return await self.get_next_expansion() and self.can_afford(UnitTypeId.HATCHERY)
@@ -327,28 +438,24 @@ class BalancedZergBot(ZergBotBase):
             if attacking_forces.exists:
                 return attacking_forces.center
             return forces.center
-        enemy_units = self.known_enemy_units
-        if enemy_units.exists:
-            enemy_military_units = enemy_units.filter(lambda u: u.can_attack_ground)
-            if enemy_military_units.exists:
-                return enemy_military_units.closest_to(self.start_location)
+        closest_enemy_military_unit = get_closest_enemy(self, self.start_location, can_attack_ground=True)
+        if closest_enemy_military_unit:
+            return closest_enemy_military_unit
         return self.get_rally_point()
 
     def update_plot(self):
-        self.plotter.plot('mpm', self._time_history, self._minerals_per_minute_history, 'c-', label='Minerals per minute')
-        self.plotter.plot('gpm', self._time_history, self._gas_per_minute_history, 'g-', label='Gas per minute')
-        self.plotter.plot('supply_used', self._time_history, self._supply_used_history,
-                    'k-', label='Supply used')
-        self.plotter.plot('supply_used', self._time_history, self._workers_history,
-                    'g-', label='Workers')
-        self.plotter.plot('supply_used', self._time_history, self._forces_history,
-                    'b-', label='Forces')
-        self.plotter.plot('army_value_balance', self._time_history, self._army_value_lost_history, 'r-', label='Army value lost')
-        self.plotter.plot('army_value_balance', self._time_history,
-                          self._army_killed_value_history, 'b-', label='Army value killed')
-        self.plotter.show()
-
-    async def show_debug(self, draw_own_unit_range=True, draw_own_unit_targets=True, draw_enemy_unit_range=True, draw_rally_point=True, draw_estimated_enemy_army_center=True):
+        """pushes the current score, etc. to the plot renderer (used for graphing only so far)"""
+        self.plot_renderer.push(self.time, {
+            'mpm': [self.state.score.collection_rate_minerals],
+            'gpm': [self.state.score.collection_rate_vespene],
+            'supply_used': [self.supply_used, self.workers.ready.amount, get_forces(self).amount],
+            'army_value_balance': [
+                self.state.score.lost_minerals_army + self.state.score.lost_vespene_army,
+                self.state.score.killed_minerals_army + self.state.score.killed_vespene_army
+            ],
+        })
+
+    async def show_debug(self, draw_own_unit_range=True, draw_own_unit_targets=True, draw_enemy_unit_range=True, draw_rally_point=True, draw_estimated_enemy_army_center=True, draw_action_counts=True):
         for unit in self.units.not_structure.ready:
             enemy_is_close_by = get_enemies_near_position(self, unit, distance=max(
                 unit.ground_range, unit.air_range) + unit.radius * 1.2).exists
@@ -371,37 +478,45 @@ class BalancedZergBot(ZergBotBase):
             estimated_enemy_army_center_3d = Point3((*self.estimated_enemy_army_location, z_pos))
             self._client.debug_sphere_out(estimated_enemy_army_center_3d, 10, color=DebugColor.yellow)
             self._client.debug_text_3d('ESTIMATED ENEMY ARMY POSITION', estimated_enemy_army_center_3d, color=DebugColor.red, size=20)
+            for group in self.enemy_army_tracker.groups:
+                group_center_3d = Point3((*group.location, z_pos))
+                self._client.debug_sphere_out(group_center_3d, 6, color=DebugColor.red)
+                self._client.debug_text_3d('ENEMY GROUP ({} UNITS)'.format(group.size), group_center_3d, color=DebugColor.red, size=14)
+        if draw_action_counts:
+            action_counts = 'LAST STEP ACTIONS BATCHED: {} FLUSHED: {} SUPPRESSED TOTAL: {} SCHEDULED {:.1f} MS DEFERRED TOTAL: {}'.format(
+                self.last_batched_action_count, self.last_flushed_action_count, self.command_cache.suppressed_count,
+                self.scheduler.last_step_ms, self.scheduler.deferred_count)
+            self._client.debug_text_screen(action_counts, (.01, .1), color=DebugColor(), size=12)
         await self._client.send_debug()
 
     async def on_game_step(self, iteration):
         # print('LOST ARMY: {} KILLED ARMY: {} MINERALS GAINED per minute: {}'.format(
         #     self.state.score.lost_minerals_army, self.state.score.killed_minerals_army, self.state.score.collection_rate_minerals))
         self.timing_manager.manage_timings(self.time)
-        enemy_units = self.known_enemy_units.not_structure
-        if enemy_units.exists:
-            known_enemy_combat_units = enemy_units.exclude_type(race_worker.values())
-            if known_enemy_combat_units.exists:
-                history_item = known_enemy_combat_units.center.rounded
-                self.known_enemy_army_centers.append(history_item)
-                self.known_enemy_army_centers = self.known_enemy_army_centers[-20:]
-            else:
-                history_item = enemy_units.center.rounded
-                self.known_enemy_army_centers.append(history_item)
-                self.known_enemy_army_centers = self.known_enemy_army_centers[-20:]
-        elif iteration % 100 and self.known_enemy_units.exists:
-            history_item = self.known_enemy_units.center.rounded
-            self.known_enemy_army_centers.append(history_item)
-            self.known_enemy_army_centers = self.known_enemy_army_centers[-20:]
-        
-        estimated_enemy_army_location_total = reduce(
-            lambda location, location_sum: (location[0] + location_sum[0], location[1] + location_sum[1]), self.known_enemy_army_centers, (0, 0))
-        number_of_locations = len(self.known_enemy_army_centers)
-        if number_of_locations:
-            self.estimated_enemy_army_location = Point2((estimated_enemy_army_location_total[0] / number_of_locations, estimated_enemy_army_location_total[1] / number_of_locations))
+        if self.profiler.enabled and iteration % 50 == 0:
+            mismatches = compare_already_pending(self, PENDING_UNIT_TYPES, sc2.BotAI.already_pending)
+            if mismatches:
+                bot_logger.log_action(self, 'already_pending differs from python-sc2 for {}'.format(mismatches))
+        with self.profiler.section('enemy_army_tracking'):
+            enemy_units = self.known_enemy_units.not_structure
+            if enemy_units.exists:
+                known_enemy_combat_units = enemy_units.exclude_type(race_worker.values())
+                if known_enemy_combat_units.exists:
+                    self.enemy_army_tracker.add(known_enemy_combat_units.center.rounded, self.time)
+                else:
+                    self.enemy_army_tracker.add(enemy_units.center.rounded, self.time)
+                self.enemy_army_tracker.update_groups(known_enemy_combat_units, self.time)
+            elif iteration % 100 and self.known_enemy_units.exists:
+                self.enemy_army_tracker.add(self.known_enemy_units.center.rounded, self.time)
+            # groups of an army that left vision get no sightings, they time out here
+            self.enemy_army_tracker.expire(self.time)
+        with self.profiler.section('influence_map'):
+            self.influence_map.update(get_influence_sources(self.known_enemy_units))
         if self.already_pending(UnitTypeId.LAIR) or self.already_pending(UnitTypeId.HIVE):
             print('lair pending: {} hive pending: {}'.format(self.already_pending(
                 UnitTypeId.LAIR), self.already_pending(UnitTypeId.HIVE)))
-        townhalls_under_attack = self.get_townhalls_under_attack()
+        with self.profiler.section('townhalls_under_attack'):
+            townhalls_under_attack = self.get_townhalls_under_attack()
         is_under_attack = townhalls_under_attack.amount > 0
         has_been_under_attack_recently = self.get_has_been_under_attack_recently(
             is_under_attack=is_under_attack)
@@ -409,89 +524,140 @@ class BalancedZergBot(ZergBotBase):
         # print(checked_start_locations)
         if is_under_attack:
             self.last_defensive_situation_time = self.time
-        if self.should_show_debug:
-            await self.show_debug()
-        if iteration % 8 == 0:
-            self.manage_strategies()
-
-            if self.should_show_plot:
-                # track history of score, etc. (used for graphing only so far)
-                self._time_history.append(self.time)
-                self._minerals_per_minute_history.append(self.state.score.collection_rate_minerals)
-                self._gas_per_minute_history.append(self.state.score.collection_rate_vespene)
-                self._supply_used_history.append(self.supply_used)
-                self._workers_history.append(self.workers.ready.amount)
-                self._forces_history.append(get_forces(self).amount)
-                self._army_value_lost_history.append(self.state.score.lost_minerals_army + self.state.score.lost_vespene_army)
-                self._army_killed_value_history.append(self.state.score.killed_minerals_army + self.state.score.killed_vespene_army)
-                self._time_history = self._time_history[-20:]
-                self._workers_history = self._workers_history[-20:]
-                self._forces_history = self._forces_history[-20:]
-                self._minerals_per_minute_history = self._minerals_per_minute_history[-20:]
-                self._gas_per_minute_history = self._gas_per_minute_history[-20:]
-                self._supply_used_history = self._supply_used_history[-20:]
-                self._army_value_lost_history = self._army_value_lost_history[-20:]
-                self._army_killed_value_history = self._army_killed_value_history[-20:]
-                self.update_plot()
-
-        # if self.should_show_plot and iteration % 25 == 0:
-
-        if self.auto_camera:
-            camera_position = self.get_camera_position()
-            if camera_position:
-                await self._client.move_camera(camera_position)
+        # read by the scheduled tasks below
+        self.townhalls_under_attack = townhalls_under_attack
+        self.is_under_attack = is_under_attack
+        self.has_been_under_attack_recently = has_been_under_attack_recently
 
         # we're losing, go for broke.
         if not self.townhalls.exists:
             target = self.select_target()
             if iteration % 50 == 0:
                 actions = []
-                for unit in self.workers | self.units(UnitTypeId.QUEEN) | get_forces(self):
+                for unit in self.workers | self.unit_snapshot(UnitTypeId.QUEEN) | get_forces(self):
                     actions.append(unit.attack(target))
                 await self.do_actions(actions)
+            await self.scheduler.run_step(iteration, section=self.profiler.section, only=NO_TOWNHALL_TASKS)
             return
 
-        if iteration % 50 == 0:
-            await self.distribute_workers()
-            await self.set_rally_points()
-        await self.improve_military_tech()
-        await self.build_static_defenses()
+        only = None
+        if self.is_following_build_order:
+            if is_under_attack:
+                self.build_order_executor.disrupt('under attack')
+                bot_logger.log_action(self, 'leaving build order {}: under attack'.format(self.build_order_name))
+            else:
+                only = [name for name in self.scheduler.tasks if name not in BUILD_ORDER_REPLACED_TASKS]
+        # runs whatever fits the step budget, defense first while a base is under attack
+        await self.scheduler.run_step(iteration, urgent=is_under_attack, section=self.profiler.section, only=only)
 
-        if not has_been_under_attack_recently and self.should_build_gas():
-            await self.build_gas()
+    @property
+    def is_following_build_order(self) -> bool:
+        return self.build_order_executor is not None and self.build_order_executor.is_active
 
-        if self.units(UnitTypeId.SPAWNINGPOOL).ready.exists and iteration % 10 == 0:
-            if not self.units(UnitTypeId.LAIR).ready.exists and self.townhalls.first:
-                if self.should_build_lair():
-                    if await self.can_build_lair() and not already_researching_lair(self):
-                        bot_logger.log_action(self, "building lair")
-                        await self.do(self.townhalls.ready.first.build(UnitTypeId.LAIR))
-            elif self.should_build_spire():
-                bot_logger.log_action(self, "building spire")
-                await self.build(UnitTypeId.SPIRE, near=self.start_location)
+    async def follow_build_order(self, iteration):
+        """starts the next step of the build order once it can be, the order is left when the bot falls behind it"""
+        if not self.is_following_build_order:
+            return
+        executor = self.build_order_executor
+        step = executor.next_step(self.time)
+        if step is None:
+            bot_logger.log_action(self, 'leaving build order {}: {}'.format(self.build_order_name, executor.disruption))
+            return
+        if await self.start_build_order_step(step.name):
+            bot_logger.log_action(self, 'build order {} step {} at supply {} (planned {:g})'.format(
+                self.build_order_name, step.name, self.supply_used, step.supply))
+            executor.step_done()
+            if not executor.is_active:
+                bot_logger.log_action(self, 'build order {} finished'.format(self.build_order_name))
+
+    async def start_build_order_step(self, name: str) -> bool:
+        """issues a build order step when it's affordable and its producer is free, true once it was issued"""
+        if name == 'zerglingmovementspeed':
+            return await upgrade_zergling_speed(self)
+        unit_type = BUILD_ORDER_UNIT_TYPES[name]
+        requirements = [BUILD_ORDER_UNIT_TYPES[requirement] for requirement in BUILD_ACTIONS[name].requires]
+        if not self.can_afford(unit_type) or any(not self.unit_tracker.ready_count(requirement) for requirement in requirements):
+            return False
+        if unit_type is UnitTypeId.HATCHERY:
+            if not await self.get_next_expansion():
+                return False
+            self.expansion_count += 1
+            self.last_expansion_time = self.time
+            await self.expand_now(max_distance=5)
+            return True
+        if unit_type is UnitTypeId.EXTRACTOR:
+            for townhall in get_ready_townhalls(self):
+                for vespene_geyser in self.state.vespene_geyser.closer_than(10.0, townhall):
+                    worker = self.select_build_worker(vespene_geyser.position)
+                    if worker is not None and not geyser_has_extractor(self, vespene_geyser):
+                        await self.do(worker.build(UnitTypeId.EXTRACTOR, vespene_geyser))
+                        return True
+            return False
+        if unit_type in (UnitTypeId.SPAWNINGPOOL, UnitTypeId.ROACHWARREN):
+            return not await self.build_planned(unit_type, self.start_location, max_distance=15, min_distance=7)
+        if unit_type in (UnitTypeId.QUEEN, UnitTypeId.LAIR):
+            townhalls = self.unit_snapshot.ready_noqueue(UnitTypeId.HATCHERY if unit_type is UnitTypeId.LAIR else TOWNHALL_TYPES)
+            if not townhalls.exists:
+                return False
+            townhall = townhalls.first
+            await self.do(townhall(AbilityId.UPGRADETOLAIR_LAIR) if unit_type is UnitTypeId.LAIR else townhall.train(unit_type))
+            return True
+        larvae = get_free_larvae(self)
+        if not larvae.exists:
+            return False
+        await self.do(larvae.first.train(unit_type))
+        return True
+
+    def register_scheduled_tasks(self):
+        """subsystems run by the frame scheduler, higher priorities run first, intervals are in steps"""
+        register = self.scheduler.register
+        register('micro_army', self.run_micro_army, priority=100, urgent=True)
+        register('build_order', self.follow_build_order, priority=95)
+        register('build_static_defenses', lambda iteration: self.build_static_defenses(), priority=90, urgent=True)
+        register('build_military_units', self.run_build_military_units, priority=80, urgent=True)
+        register('build_units', lambda iteration: self.build_units(iteration, is_under_attack=self.is_under_attack), priority=70)
+        register('inject_larva', self.inject_larva, priority=60)
+        register('build_drones', self.run_build_drones, priority=50)
+        register('improve_military_tech', lambda iteration: self.improve_military_tech(), priority=40)
+        register('build_gas', self.run_build_gas, priority=40)
+        register('expansion', self.run_expansion, priority=30)
+        register('build_tech_structures', self.build_tech_structures, interval=10, priority=30)
+        register('distribute_workers', lambda iteration: self.distribute_workers(), interval=50, priority=20)
+        register('set_rally_points', lambda iteration: self.set_rally_points(), interval=50, priority=20)
+        register('manage_strategies', lambda iteration: self.manage_strategies(), interval=8, priority=10)
+        if self.should_show_plot:
+            register('update_plot', lambda iteration: self.update_plot(), interval=8)
+        if self.should_show_debug:
+            register('show_debug', lambda iteration: self.show_debug())
+        if self.auto_camera:
+            register('camera', self.move_camera)
 
-            if self.should_build_hive():
-                lair = self.units(UnitTypeId.LAIR).ready.noqueue.exists and self.units(UnitTypeId.LAIR).ready.noqueue.closest_to(
-                    self.start_location)
-                if lair and not already_researching_hive(self):
-                    bot_logger.log_action(self, "building hive")
-                    await self.do(lair.build(UnitTypeId.HIVE))
+    async def run_micro_army(self, iteration):
+        await self.micro_army(iteration=iteration, is_under_attack=self.is_under_attack,
+                              townhalls_under_attack=self.townhalls_under_attack)
 
+    async def run_build_military_units(self, iteration):
         if self.supply_left > 0:
             await self.build_military_units()
-            if not (is_under_attack or has_been_under_attack_recently) and self.should_build_drones():
-                if self.can_build_drone():
-                    await self.build_drones()
 
-        await self.build_units(iteration, is_under_attack=is_under_attack)
-        
+    async def run_build_drones(self, iteration):
+        if self.supply_left > 0 and not (self.is_under_attack or self.has_been_under_attack_recently) and self.should_build_drones():
+            if self.can_build_drone():
+                await self.build_drones()
+
+    async def run_build_gas(self, iteration):
+        if not self.has_been_under_attack_recently and self.should_build_gas():
+            await self.build_gas()
 
-        for queen in self.units(UnitTypeId.QUEEN).idle:
-            abilities = await self.get_available_abilities(queen)
+    async def inject_larva(self, iteration):
+        for queen in self.unit_snapshot.idle(UnitTypeId.QUEEN):
+            abilities = self.ability_cache.available(queen)
             if AbilityId.EFFECT_INJECTLARVA in abilities:
                 await self.do(queen(AbilityId.EFFECT_INJECTLARVA, self.townhalls.closest_to(queen)))
-        townhall_count = self.townhalls.ready.amount
-        if townhall_count < 3 or self.time > 500 and not has_been_under_attack_recently and get_workers_per_townhall(self) > 14:
+
+    async def run_expansion(self, iteration):
+        townhall_count = get_ready_townhalls(self).amount
+        if townhall_count < 3 or self.time > 500 and not self.has_been_under_attack_recently and get_workers_per_townhall(self) > 14:
             if self.should_build_expansion():
                 if await self.can_build_expansion():
                     self.expansion_count += 1
@@ -500,10 +666,37 @@ class BalancedZergBot(ZergBotBase):
                         self, "taking expansion #{} at time: {} with {} workers per hatchery".format(self.expansion_count, self.time, get_workers_per_townhall(self)))
                     await self.expand_now(max_distance=5)
 
-        await self.micro_army(iteration=iteration, is_under_attack=is_under_attack, townhalls_under_attack=townhalls_under_attack)
+    async def move_camera(self, iteration):
+        camera_position = self.get_camera_position()
+        if camera_position:
+            await self._client.move_camera(camera_position)
+
+    async def build_tech_structures(self, iteration):
+        """lair, spire and hive"""
+        if self.unit_snapshot.ready(UnitTypeId.SPAWNINGPOOL).exists:
+            if not self.unit_snapshot.ready(UnitTypeId.LAIR).exists and self.townhalls.first:
+                if self.should_build_lair():
+                    if await self.can_build_lair() and not already_researching_lair(self):
+                        bot_logger.log_action(self, "building lair")
+                        await self.do(get_ready_townhalls(self).first.build(UnitTypeId.LAIR))
+            elif self.should_build_spire():
+                bot_logger.log_action(self, "building spire")
+                await self.build_planned(UnitTypeId.SPIRE, near=self.start_location)
+
+            if self.should_build_hive():
+                lair = self.unit_snapshot.ready_noqueue(UnitTypeId.LAIR).exists and self.unit_snapshot.ready_noqueue(UnitTypeId.LAIR).closest_to(
+                    self.start_location)
+                if lair and not already_researching_hive(self):
+                    bot_logger.log_action(self, "building hive")
+                    await self.do(lair.build(UnitTypeId.HIVE))
 
     def get_rally_point(self):
-        if self.rushing:
+        # manage_strategies can start or stop rushing after the rally point was read earlier in the step
+        return self._get_rally_point(self.rushing)
+
+    @memoize(STEP)
+    def _get_rally_point(self, rushing: bool):
+        if rushing:
             return self.game_info.map_center
         if self.townhalls.exists:
             return self.townhalls.center.towards(self.game_info.map_center, 25)
@@ -518,18 +711,18 @@ class BalancedZergBot(ZergBotBase):
         rally_workers = AbilityId.RALLY_HATCHERY_WORKERS
         rally_point = self.get_rally_point()
         actions = []
-        for townhall in self.townhalls.ready:
+        for townhall in get_ready_townhalls(self):
             actions.append(townhall(rally_units, rally_point))
             actions.append(
                 townhall(rally_workers, self.state.mineral_field.closest_to(townhall)))
         await self.do_actions(actions)
 
     async def build_static_defenses(self):
-        spawning_pools = self.units(UnitTypeId.SPAWNINGPOOL)
+        spawning_pools = self.unit_snapshot(UnitTypeId.SPAWNINGPOOL)
         if not spawning_pools.ready.exists:
             return
-        spine_crawlers = self.units(UnitTypeId.SPINECRAWLER)
-        spore_crawlers = self.units(UnitTypeId.SPORECRAWLER)
+        spine_crawlers = self.unit_snapshot(UnitTypeId.SPINECRAWLER)
+        spore_crawlers = self.unit_snapshot(UnitTypeId.SPORECRAWLER)
         ideal_spine_crawlers_per_base = 0
         ideal_spore_crawlers_per_base = 0
         if self.time > 250:
@@ -547,15 +740,17 @@ class BalancedZergBot(ZergBotBase):
         #     ideal_spore_crawlers_per_base += 1
 
         if ideal_spine_crawlers_per_base > 0 or ideal_spore_crawlers_per_base > 0:
-            townhalls = self.townhalls.ready
+            townhalls = get_ready_townhalls(self)
             if townhalls.exists:
                 townhall = townhalls.closest_to(self.enemy_start_locations[0])
                 if spine_crawlers.closer_than(20, townhall).ready.amount < ideal_spine_crawlers_per_base and not self.already_pending(UnitTypeId.SPINECRAWLER) and self.can_afford(UnitTypeId.SPINECRAWLER):
-                    await self.build(UnitTypeId.SPINECRAWLER, near=townhall.position.towards_with_random_angle(self.game_info.map_center, distance=10))
+                    await self.build_planned(UnitTypeId.SPINECRAWLER, near=townhall.position.towards(self.game_info.map_center, 10), max_distance=6)
                 if spore_crawlers.closer_than(20, townhall).ready.amount < ideal_spore_crawlers_per_base and not self.already_pending(UnitTypeId.SPORECRAWLER) and self.can_afford(UnitTypeId.SPORECRAWLER):
-                    await self.build(UnitTypeId.SPORECRAWLER, near=townhall)
+                    await self.build_planned(UnitTypeId.SPORECRAWLER, near=townhall)
 
     async def micro_army(self, iteration=None, is_under_attack=False, townhalls_under_attack=[]):
+        if self.vectorized_micro:
+            self.micro_plan = MicroTargetPlan(get_forces(self), self.known_enemy_units)
         actions = [
             *self.micro_idle(is_under_attack=is_under_attack),
             *self.micro_drones(is_under_attack=is_under_attack,
@@ -572,7 +767,7 @@ class BalancedZergBot(ZergBotBase):
             *self.micro_broodlords(is_under_attack=is_under_attack, townhalls_under_attack=townhalls_under_attack),
             *self.micro_overlords(iteration)
         ]
-        await self.do_actions(actions)
+        await self.do_actions(self.command_cache.filter(actions, self.state.game_loop))
 
     def micro_idle(self, is_under_attack=False) -> List[UnitCommand]:
         actions = []
@@ -597,12 +792,8 @@ class BalancedZergBot(ZergBotBase):
         else:
             return unit.attack(target)
 
-    def micro_military_unit(self, unit: Unit, is_under_attack: bool=False, townhalls_under_attack=[]) -> Optional[UnitCommand]:
-        #   for effect in self.state.effects:
-        #     if effect.id == EffectId.RAVAGERCORROSIVEBILECP:
-        #         positions = effect.positions
-        #         # dodge the ravager biles
-
+    def _iter_target_candidates(self, unit: Unit) -> Iterator[Unit]:
+        """Yields targets for the unit in priority order. MicroTargetPlan computes the same candidates in bulk."""
         is_threat = get_is_threat_callable(unit)
 
         is_targettable = get_is_targettable_callable(unit)
@@ -618,36 +809,41 @@ class BalancedZergBot(ZergBotBase):
             # attack low health threats in range first
             low_health_threats_in_range = targettable_threats.closer_than(weapon_range, unit).filter(lambda u: u.health_percentage < .5)
             if low_health_threats_in_range.exists:
-                lowest_health_threat_in_range = low_health_threats_in_range.sorted(lambda u: u.health_percentage).first
-                action = self._micro_military_unit_with_target(unit, lowest_health_threat_in_range)
-                if action:
-                    return action
+                yield low_health_threats_in_range.sorted(lambda u: u.health_percentage).first
 
             # otherwise the closest threat first
-            closest_threat = targettable_threats.closest_to(unit)
-            action = self._micro_military_unit_with_target(unit, closest_threat)
-            if action:
-                return action
+            yield targettable_threats.closest_to(unit)
 
         # then target low health units in range
         if targettable_units_in_range.exists:
             
             lowest_health = targettable_units_in_range.sorted(lambda u: u.health_percentage and u.can_attack_ground or u.can_attack_air).first
             if lowest_health.health_percentage < .8:
-                action = self._micro_military_unit_with_target(unit, lowest_health)
-                if action:
-                    return action
+                yield lowest_health
 
         # then attack any targettable unit nearby
         if targettable_units.exists:
-            closest = targettable_units.closest_to(unit)
-            action = self._micro_military_unit_with_target(unit, closest)
+            yield targettable_units.closest_to(unit)
+
+    def micro_military_unit(self, unit: Unit, is_under_attack: bool=False, townhalls_under_attack=[]) -> Optional[UnitCommand]:
+        #   for effect in self.state.effects:
+        #     if effect.id == EffectId.RAVAGERCORROSIVEBILECP:
+        #         positions = effect.positions
+        #         # dodge the ravager biles
+
+        is_targettable = get_is_targettable_callable(unit)
+
+        candidates = self.micro_plan.get_candidates(unit) if self.vectorized_micro and self.micro_plan else None
+        if candidates is None:
+            candidates = self._iter_target_candidates(unit)
+        for target in candidates:
+            action = self._micro_military_unit_with_target(unit, target)
             if action:
                 return action
 
         # then attack closest unit attacking one of our bases
         if townhalls_under_attack:
-            return unit.attack(self.known_enemy_units.closest_to(townhalls_under_attack.filter(is_targettable).closest_to(unit)))
+            return unit.attack(get_closest_enemy(self, townhalls_under_attack.filter(is_targettable).closest_to(unit)))
         # perform a rush or timing
         elif self.rushing or self.supply_used > 190:
             all_forces = get_forces(self)
@@ -663,17 +859,15 @@ class BalancedZergBot(ZergBotBase):
 
     def micro_drones(self, is_under_attack=False, townhalls_under_attack=[]) -> List[UnitCommand]:
         actions = []
-        for drone in self.workers.returning.further_than(10, self.start_location).filter(lambda d: get_enemies_near_position(self, d, distance=30).amount > 5):
+        for drone in self.workers.returning.further_than(10, self.start_location).filter(lambda d: self.influence_map.ground_threat(d.position) > DRONE_FLEE_THREAT):
             actions.append(drone.move(self.start_location))
         if is_under_attack:
             # pull drones from hatcheries that are under attack
             for townhall in townhalls_under_attack:
                 is_main = townhall.distance_to(self.start_location) < 10
-                should_pull_drones = get_enemies_near_position(
-                    bot=self, position=townhall, distance=10, unit_filter=lambda u: u.can_attack_ground and u.ground_dps > 5).amount > 5
+                should_pull_drones = self.influence_map.ground_threat(townhall.position, target_radius=townhall.radius) > DRONE_PULL_THREAT
                 if should_pull_drones:
-                    drones = self.units(
-                        UnitTypeId.DRONE).closer_than(20, townhall)
+                    drones = self.unit_snapshot(UnitTypeId.DRONE).closer_than(20, townhall)
                     if drones.exists and drones.filter(lambda d: d.health_percentage < .5).exists:
                         for drone in drones:
                             if not is_main:
@@ -684,20 +878,19 @@ class BalancedZergBot(ZergBotBase):
         # TODO desperately needs to be improved.
         # After early game, zerglings just pour in to die by the hundreds
         unit_id = UnitTypeId.ZERGLING
-        zerglings = self.units(unit_id).ready
+        zerglings = self.unit_snapshot.ready(unit_id)
         actions = []
         forces = get_forces(self)
         for zergling in zerglings:
-            is_zergling_threat = get_is_targettable_callable(zergling)
             nearby_forces = forces.closer_than(30, zergling)
-            nearby_threats = get_enemies_near_position(self, zergling, 50, unit_filter=is_zergling_threat)
-            distance_to_estimated_enemy_army_location = zergling.distance_to(self.estimated_enemy_army_location)
-            is_way_outnumbered = nearby_threats.amount * 2 > nearby_forces.amount - 1
+            nearby_forces_dps = get_total_dps(nearby_forces)
+            distance_to_estimated_enemy_army_location = self.enemy_army_tracker.distance_to_closest([zergling])
+            is_way_outnumbered = self.influence_map.ground_threat(zergling.position) * 2 > nearby_forces_dps
             is_near_enemy_army_center = distance_to_estimated_enemy_army_location < 30
             is_not_grouped_up_near_enemy_army = nearby_forces.amount < 3 and is_near_enemy_army_center
             if (is_way_outnumbered or is_not_grouped_up_near_enemy_army):
                 closest_townhall = self.townhalls.closest_to(zergling)
-                if get_enemies_near_position(self, closest_townhall, 15, unit_filter=is_zergling_threat).amount > nearby_forces.amount:
+                if self.influence_map.ground_threat(closest_townhall.position, target_radius=closest_townhall.radius) > nearby_forces_dps:
                     actions.append(zergling.move(closest_townhall))
                     continue
             action = self.micro_military_unit(
@@ -708,9 +901,9 @@ class BalancedZergBot(ZergBotBase):
 
     def micro_roaches(self, is_under_attack=False, townhalls_under_attack=[]) -> List[UnitCommand]:
         unit_id = UnitTypeId.ROACH
-        roaches = self.units(unit_id).ready
+        roaches = self.unit_snapshot.ready(unit_id)
         actions = []
-        for burrowed_roach in self.units(UnitTypeId.ROACHBURROWED).ready:
+        for burrowed_roach in self.unit_snapshot.ready(UnitTypeId.ROACHBURROWED):
             if burrowed_roach.health_percentage > .50:
                 actions.append(burrowed_roach(AbilityId.BURROWUP_ROACH))
             else:
@@ -726,7 +919,7 @@ class BalancedZergBot(ZergBotBase):
 
     def micro_hydralisks(self, is_under_attack: bool=False, townhalls_under_attack=[]) -> List[UnitCommand]:
         unit_id = UnitTypeId.HYDRALISK
-        hydralisks = self.units(unit_id).ready
+        hydralisks = self.unit_snapshot.ready(unit_id)
         actions = []
         for hydralisk in hydralisks:
             action = self.micro_military_unit(hydralisk, is_under_attack=is_under_attack, townhalls_under_attack=townhalls_under_attack)
@@ -736,22 +929,20 @@ class BalancedZergBot(ZergBotBase):
 
     def micro_mutalisks(self, is_under_attack=False, townhalls_under_attack=[]) -> List[UnitCommand]:
         unit_id = UnitTypeId.MUTALISK
-        mutalisks = self.units(unit_id).ready
+        mutalisks = self.unit_snapshot.ready(unit_id)
         actions = []
         forces = get_forces(self)
         for mutalisk in mutalisks:
             # retreat if low health or outnumbered
             if mutalisk.health_percentage < .40:
                 nearby_forces = forces.closer_than(20, mutalisk)
-                nearby_threats = get_enemies_near_position(
-                    self, mutalisk, distance=20, unit_filter=get_is_threat_callable(mutalisk))
-                should_retreat = nearby_forces.amount < nearby_threats.amount
+                should_retreat = self.influence_map.air_threat(mutalisk.position) > get_total_dps(nearby_forces)
                 has_forces = forces.amount > 10
                 if should_retreat:
-                    retreat_distance = mutalisk.ground_range if has_forces else mutalisk.ground_range * 3
-                    retreat_position = mutalisk.position.towards(
-                        forces.center if has_forces else self.start_location, retreat_distance)
-                    if mutalisk.distance_to(retreat_position) > retreat_distance / 2:
+                    retreat_position = Point2(self.influence_map.safest_position(
+                        mutalisk.position, is_flying=True, clearance=2,
+                        fallback=forces.center if has_forces else self.start_location))
+                    if mutalisk.distance_to(retreat_position) > 1:
                         actions.append(mutalisk.move(retreat_position))
                         continue
 
@@ -763,9 +954,9 @@ class BalancedZergBot(ZergBotBase):
 
     def micro_ultralisks(self, is_under_attack=False, townhalls_under_attack=[]) -> List[UnitCommand]:
         unit_id = UnitTypeId.ULTRALISK
-        ultralisks = self.units(unit_id).ready
+        ultralisks = self.unit_snapshot.ready(unit_id)
         actions = []
-        for burrowed_ultralisk in self.units(UnitTypeId.ULTRALISKBURROWED).ready:
+        for burrowed_ultralisk in self.unit_snapshot.ready(UnitTypeId.ULTRALISKBURROWED):
             if burrowed_ultralisk.health_percentage > .50:
                 actions.append(burrowed_ultralisk(AbilityId.BURROWUP_ULTRALISK))
         for ultralisk in ultralisks:
@@ -783,7 +974,7 @@ class BalancedZergBot(ZergBotBase):
 
     def micro_broodlords(self, is_under_attack=False, townhalls_under_attack=[]) -> List[UnitCommand]:
         unit_id = UnitTypeId.BROODLORD
-        broodlords = self.units(unit_id).ready
+        broodlords = self.unit_snapshot.ready(unit_id)
         actions = []
         for broodlord in broodlords:
             action = self.micro_military_unit(broodlord, is_under_attack=is_under_attack, townhalls_under_attack=townhalls_under_attack)
@@ -793,20 +984,18 @@ class BalancedZergBot(ZergBotBase):
 
     def micro_overlords(self, iteration, be_cowardly=True, spread_creep=True, spread_out=True) -> List[UnitCommand]:
         unit_id = UnitTypeId.OVERLORD
-        overlords = self.units(unit_id).ready
+        overlords = self.unit_snapshot.ready(unit_id)
         actions = []
-        if spread_creep and iteration % 50 == 0 and self.units(UnitTypeId.LAIR).ready.exists or self.units(UnitTypeId.HIVE).ready.exists:
+        if spread_creep and iteration % 50 == 0 and self.unit_snapshot.ready(UnitTypeId.LAIR).exists or self.unit_snapshot.ready(UnitTypeId.HIVE).exists:
             for overlord in overlords:
                 actions.append(overlord(AbilityId.BEHAVIOR_GENERATECREEPON))
         if be_cowardly:
             for overlord in overlords:
-                enemy_threats = get_enemies_near_position(
-                    self, overlord, 20, unit_filter=lambda u: u.can_attack_air)
-                if enemy_threats.exists:
-                    closest_threat = enemy_threats.closest_to(overlord)
-                    away_from_threat = closest_threat.position.towards(
-                        self.start_location, distance=closest_threat.sight_range + 10)
-                    actions.append(overlord.move(away_from_threat))
+                if self.influence_map.is_threatened(overlord.position, is_flying=True):
+                    # overlords are slow, so they keep some distance from the edge of the threat
+                    away_from_threat = self.influence_map.safest_position(
+                        overlord.position, is_flying=True, clearance=10, fallback=self.start_location)
+                    actions.append(overlord.move(Point2(away_from_threat)))
         # scout for enemy bases
         if not self.known_enemy_structures.exists:
             for overlord in overlords.idle:
@@ -839,14 +1028,16 @@ class BalancedZergBot(ZergBotBase):
         start_location = self.start_location
         return get_closest_to(locations, start_location)
 
+    @memoize(STEP)
     def select_target(self):
         """select a general priority target"""
         if self.known_enemy_structures.exists:
             return self.known_enemy_structures.closest_to(self.start_location)
         if self.time < 400:
-            target = self.enemy_start_locations[0].closest(
-                self.potential_enemy_expansions)
-            return target
+            target = self.map_analysis.closest_by_ground(
+                self.enemy_start_locations[0], self.potential_enemy_expansions)
+            if target is not None:
+                return target
         if self.time < 450:
             return self.enemy_start_locations[0]
         
@@ -854,8 +1045,7 @@ class BalancedZergBot(ZergBotBase):
         # return self.enemy_start_locations[0]
 
     async def scout_enemy(self):
-        scout = self.workers.random if self.time < 200 else self.units(
-            UnitTypeId.ZERGLING).idle.random
+        scout = self.workers.random if self.time < 200 else self.unit_snapshot.idle(UnitTypeId.ZERGLING).random
         action_list = []
         start_location = random.choice(self.enemy_start_locations)
         for _ in range(100):
@@ -874,8 +1064,9 @@ class BalancedZergBot(ZergBotBase):
             townhalls_with_mineral_fields if townhalls_with_mineral_fields else worker_count
         ideal_workers_per_hatch_met = workers_per_hatch >= self.ideal_workers_per_hatch
         is_worker_count_under_maximum = worker_count < self.max_worker_count
-        has_available_larva = self.units(UnitTypeId.LARVA).ready.amount > 0
-        result = has_available_larva and is_worker_count_under_maximum and self.booming and not ideal_workers_per_hatch_met
+        has_available_larva = self.unit_snapshot.ready(UnitTypeId.LARVA).amount > 0
+        result = has_available_larva and is_worker_count_under_maximum and self.booming and not ideal_workers_per_hatch_met \
+            and not self.is_bank_floating()
         return result
 
     def can_build_drone(self):
@@ -885,8 +1076,8 @@ class BalancedZergBot(ZergBotBase):
         return await build_drone(self)
 
     async def handle_evo_chamber_upgrades(self):
-        for evo_chamber in self.units(UnitTypeId.EVOLUTIONCHAMBER).ready.noqueue:
-            evo_chamber_abilities = await self.get_available_abilities(evo_chamber)
+        for evo_chamber in self.unit_snapshot.ready_noqueue(UnitTypeId.EVOLUTIONCHAMBER):
+            evo_chamber_abilities = self.ability_cache.available(evo_chamber)
             for upgrade in self.evolution_chamber_upgrades:
                 if upgrade in evo_chamber_abilities and self.minerals > 300 and self.vespene > 300:
                     bot_logger.log_action(
@@ -895,8 +1086,8 @@ class BalancedZergBot(ZergBotBase):
                     return
 
     async def handle_spire_upgrades(self):
-        for spire in self.units(UnitTypeId.SPIRE).ready.noqueue:
-            spire_abilities = await self.get_available_abilities(spire)
+        for spire in self.unit_snapshot.ready_noqueue(UnitTypeId.SPIRE):
+            spire_abilities = self.ability_cache.available(spire)
             for upgrade in self.spire_upgrades:
                 if upgrade in spire_abilities and self.minerals > 400 and self.vespene > 400:
                     bot_logger.log_action(
@@ -905,8 +1096,8 @@ class BalancedZergBot(ZergBotBase):
                     return
 
     async def handle_roach_warren_upgrades(self):
-        for warren in self.units(UnitTypeId.ROACHWARREN).ready.noqueue:
-            warren_abilities = await self.get_available_abilities(warren)
+        for warren in self.unit_snapshot.ready_noqueue(UnitTypeId.ROACHWARREN):
+            warren_abilities = self.ability_cache.available(warren)
             for upgrade in self.roach_warren_upgrades:
                 if upgrade in warren_abilities and self.can_afford(upgrade):
                     bot_logger.log_action(self, 'buying upgrade {}'.format(upgrade))
@@ -914,8 +1105,8 @@ class BalancedZergBot(ZergBotBase):
                     return
 
     async def handle_hydralisk_den_upgrade(self):
-        for den in self.units(UnitTypeId.HYDRALISKDEN).ready.noqueue:
-            den_abilities = await self.get_available_abilities(den)
+        for den in self.unit_snapshot.ready_noqueue(UnitTypeId.HYDRALISKDEN):
+            den_abilities = self.ability_cache.available(den)
             for upgrade in self.hydralisk_den_upgrades:
                 if upgrade in den_abilities and self.can_afford(upgrade):
                     bot_logger.log_action(self, 'buying upgrade {}'.format(upgrade))
@@ -923,8 +1114,8 @@ class BalancedZergBot(ZergBotBase):
                     return
 
     async def handle_ultralisk_cavern_upgrades(self):
-        for ultralisk_cavern in self.units(UnitTypeId.ULTRALISKCAVERN).ready.noqueue:
-            cavern_abilities = await self.get_available_abilities(ultralisk_cavern)
+        for ultralisk_cavern in self.unit_snapshot.ready_noqueue(UnitTypeId.ULTRALISKCAVERN):
+            cavern_abilities = self.ability_cache.available(ultralisk_cavern)
             for upgrade in self.ultralisk_cavern_upgrades:
                 if upgrade in cavern_abilities and self.can_afford(upgrade):
                     result = await self.do(ultralisk_cavern(upgrade))
@@ -943,8 +1134,8 @@ class BalancedZergBot(ZergBotBase):
             if started_upgrade:
                 self.metabolic_boost_started = True
         if not self.burrow_started and not self.already_pending_upgrade(UpgradeId.BURROW) and self.can_afford(UpgradeId.BURROW):
-            if self.townhalls.ready.noqueue.exists:
-                await self.do(self.townhalls.ready.noqueue.closest_to(self.start_location).research(UpgradeId.BURROW))
+            if self.unit_snapshot.ready_noqueue(TOWNHALL_TYPES).exists:
+                await self.do(self.unit_snapshot.ready_noqueue(TOWNHALL_TYPES).closest_to(self.start_location).research(UpgradeId.BURROW))
                 self.burrow_started = True
 
         await self.handle_evo_chamber_upgrades()
@@ -959,13 +1150,13 @@ class BalancedZergBot(ZergBotBase):
             await self.handle_ultralisk_cavern_upgrades()
 
     def should_build_infestation_pit(self) -> bool:
-        return self.supply_used > 100 and not self.units(UnitTypeId.INFESTATIONPIT).ready.exists and self.can_afford(UnitTypeId.INFESTATIONPIT) and not self.already_pending(UnitTypeId.INFESTATIONPIT)
+        return self.supply_used > 100 and not self.unit_snapshot.ready(UnitTypeId.INFESTATIONPIT).exists and self.can_afford(UnitTypeId.INFESTATIONPIT) and not self.already_pending(UnitTypeId.INFESTATIONPIT)
 
     def should_build_ultralisk_den(self) -> bool:
-        return self.use_ultralisk_strategy and not self.units(UnitTypeId.ULTRALISKCAVERN).exists and not self.already_pending(UnitTypeId.ULTRALISKCAVERN) and self.can_afford(UnitTypeId.ULTRALISKCAVERN)
+        return self.use_ultralisk_strategy and not self.unit_snapshot(UnitTypeId.ULTRALISKCAVERN).exists and not self.already_pending(UnitTypeId.ULTRALISKCAVERN) and self.can_afford(UnitTypeId.ULTRALISKCAVERN)
 
     def should_check_if_should_research_adrenal_glands(self) -> bool:
-        return self.units(UnitTypeId.SPAWNINGPOOL).ready.noqueue.exists and self.can_afford(AbilityId.RESEARCH_ZERGLINGADRENALGLANDS)
+        return self.unit_snapshot.ready_noqueue(UnitTypeId.SPAWNINGPOOL).exists and self.can_afford(AbilityId.RESEARCH_ZERGLINGADRENALGLANDS)
 
     def should_build_evolution_chamber(self) -> bool:
         ideal_evolution_chamber_amount = 0
@@ -974,22 +1165,62 @@ class BalancedZergBot(ZergBotBase):
         if self.time > 300:
             ideal_evolution_chamber_amount += 1
 
-        return self.expansion_count > 1 and self.units(UnitTypeId.EVOLUTIONCHAMBER).amount < ideal_evolution_chamber_amount and self.can_afford(UnitTypeId.EVOLUTIONCHAMBER) and not self.already_pending(UnitTypeId.EVOLUTIONCHAMBER)
+        return self.expansion_count > 1 and self.unit_tracker.count(UnitTypeId.EVOLUTIONCHAMBER) < ideal_evolution_chamber_amount and self.can_afford(UnitTypeId.EVOLUTIONCHAMBER) and not self.already_pending(UnitTypeId.EVOLUTIONCHAMBER)
 
     def should_build_roach_warren(self) -> bool:
-        return self.use_roach_strategy and self.units(UnitTypeId.SPAWNINGPOOL).ready.exists and not self.units(UnitTypeId.ROACHWARREN).ready.exists and self.can_afford(UnitTypeId.ROACHWARREN) and not self.already_pending(UnitTypeId.ROACHWARREN)
+        return self.use_roach_strategy and self.unit_tracker.ready_count(UnitTypeId.SPAWNINGPOOL) > 0 and self.unit_tracker.ready_count(UnitTypeId.ROACHWARREN) == 0 and self.can_afford(UnitTypeId.ROACHWARREN) and not self.already_pending(UnitTypeId.ROACHWARREN)
 
     def should_build_hydralisk_den(self) -> bool:
-        return self.use_hydralisk_strategy and (self.units(UnitTypeId.LAIR).ready.exists or self.units(UnitTypeId.HIVE).ready.exists) and not self.units(UnitTypeId.HYDRALISKDEN).ready.exists and self.can_afford(UnitTypeId.HYDRALISKDEN) and not self.already_pending(UnitTypeId.HYDRALISKDEN)
+        return self.use_hydralisk_strategy and (self.unit_snapshot.ready(UnitTypeId.LAIR).exists or self.unit_snapshot.ready(UnitTypeId.HIVE).exists) and not self.unit_snapshot.ready(UnitTypeId.HYDRALISKDEN).exists and self.can_afford(UnitTypeId.HYDRALISKDEN) and not self.already_pending(UnitTypeId.HYDRALISKDEN)
+
+    def create_placement_planner(self) -> PlacementPlanner:
+        """buildable cells of the placement grid without the resources and their mining area, with the expansions kept free"""
+        map_size = self.game_info.map_size
+        planner = PlacementPlanner(pixel_map_to_array(self.game_info.placement_grid) > 0,
+                                   creep=pixel_map_to_array(self.state.creep) > 0)
+        resources = [resource.position for resource in self.state.mineral_field | self.state.vespene_geyser]
+        planner.block(get_resource_blocked_cells(resources, map_size.width, map_size.height))
+        for expansion_location in self.map_analysis.expansion_locations:
+            planner.reserve(expansion_location, FOOTPRINT_SIZES[UnitTypeId.HATCHERY])
+        for structure in self.units.structure:
+            if structure.type_id in FOOTPRINT_SIZES:
+                planner.add_structure(structure.tag, structure.position, FOOTPRINT_SIZES[structure.type_id])
+        return planner
+
+    async def build_planned(self, building: UnitTypeId, near: Union[Point2, Unit], max_distance=15, min_distance=0) -> Optional[ActionResult]:
+        """builds on the closest free spot of the placement planner, the spot is confirmed with a single placement query"""
+        planner = self.placement_planner
+        if self.placement_creep_loop != self.state.game_loop:
+            planner.set_creep(pixel_map_to_array(self.state.creep) > 0)
+            planner.expire(self.time)
+            self.placement_creep_loop = self.state.game_loop
+        near = near.position if isinstance(near, Unit) else near
+        size = FOOTPRINT_SIZES[building]
+        position = planner.find_placement(near, size, max_distance=max_distance, min_distance=min_distance,
+                                          requires_creep=building not in NO_CREEP_STRUCTURES)
+        if position is None:
+            return ActionResult.CantFindPlacementLocation
+        position = Point2(position)
+        if not await self.can_place(building, position):
+            planner.reserve(position, size, until=self.time + PLACEMENT_REFUSED_TIME)
+            return ActionResult.CantBuildLocationInvalid
+        worker = self.select_build_worker(position)
+        if worker is None:
+            return ActionResult.Error
+        result = await self.do(worker.build(building, position))
+        if not result:
+            planner.reserve(position, size, until=self.time + PLACEMENT_RESERVATION_TIME)
+        return result
 
     async def build_once_in_base(self, building: UnitTypeId, min_distance=7, max_distance=15):
         if not self.townhalls.exists:
             return
+        if self.unit_snapshot.ready(building).exists or self.already_pending(building) or not self.can_afford(building):
+            return
         base_location = self.start_location if self.is_visible(
             self.start_location) else self.townhalls.random.position
-        location_near_base = base_location.towards_with_random_angle(
-            self.game_info.map_center, random.randrange(min_distance, max_distance))
-        await build_building_once(self, building, location_near_base)
+        bot_logger.log_action(self, "building {} near {}".format(building, base_location))
+        await self.build_planned(building, base_location, max_distance=max_distance, min_distance=min_distance)
 
     async def improve_military_tech(self):
         if self.expansion_count > 0:
@@ -1000,23 +1231,22 @@ class BalancedZergBot(ZergBotBase):
             await self.build_once_in_base(UnitTypeId.HYDRALISKDEN)
         if self.should_build_infestation_pit():
             await self.build_once_in_base(UnitTypeId.INFESTATIONPIT)
-        if self.units(UnitTypeId.HIVE).ready.exists:
+        if self.unit_snapshot.ready(UnitTypeId.HIVE).exists:
             if self.should_build_ultralisk_den():
                 await self.build_once_in_base(UnitTypeId.ULTRALISKCAVERN)
             if self.should_check_if_should_research_adrenal_glands():
-                spawning_pool = self.units(
-                    UnitTypeId.SPAWNINGPOOL).ready.noqueue
+                spawning_pool = self.unit_snapshot.ready_noqueue(UnitTypeId.SPAWNINGPOOL)
                 if not spawning_pool.exists:
                     return
                 spawning_pool = spawning_pool.first
-                spawning_pool_abilities = await self.get_available_abilities(spawning_pool)
+                spawning_pool_abilities = self.ability_cache.available(spawning_pool)
                 if AbilityId.RESEARCH_ZERGLINGADRENALGLANDS in spawning_pool_abilities and not self.adrenal_glands_started:
                     bot_logger.log_action(self, 'upgrading adrenal glands')
                     self.adrenal_glands_started = True
                     await self.do(spawning_pool(AbilityId.RESEARCH_ZERGLINGADRENALGLANDS))
 
         if self.should_build_evolution_chamber():
-            await self.build(UnitTypeId.EVOLUTIONCHAMBER, near=self.townhalls.closest_to(self.start_location))
+            await self.build_planned(UnitTypeId.EVOLUTIONCHAMBER, near=self.townhalls.closest_to(self.start_location))
         await self.upgrade_military()
 
     def should_build_overlord(self) -> bool:
@@ -1024,151 +1254,174 @@ class BalancedZergBot(ZergBotBase):
             return True
         elif self.supply_used == 19	and self.time < 120:
             return True
-        supply_low_amount = 6
-        if self.time > 500:
-            self.supply_low_amount = 12
-        elif self.time > 400:
-            self.supply_low_amount = 10
-        elif self.time > 250:
-            self.supply_low_amount = 8
-        return not self.supply_cap == 200 and self.supply_left < supply_low_amount
-        # TODO reevaluate what can be used from the comment below
-        # return (self.supply_left < max(6, self.units(UnitTypeId.LARVA).ready.amount) or self.minerals > 1500) and not self.already_pending(
-        #     UnitTypeId.OVERLORD) and not self.supply_cap == 200
+        return not self.supply_cap == 200 and self.get_overlords_needed() > 0
 
     def should_build_ultralisk(self) -> bool:
-        return self.use_ultralisk_strategy and self.can_afford(UnitTypeId.ULTRALISK) and self.units(UnitTypeId.ULTRALISKCAVERN).ready.exists and self.supply_cap >= 6
+        return self.use_ultralisk_strategy and self.can_afford(UnitTypeId.ULTRALISK) and self.unit_snapshot.ready(UnitTypeId.ULTRALISKCAVERN).exists and self.supply_cap >= 6
 
     def should_build_mutalisk(self) -> bool:
-        return self.use_mutalisk_strategy and self.can_afford(UnitTypeId.MUTALISK) and self.units(UnitTypeId.SPIRE).ready.exists and self.supply_left >= 2
+        return self.use_mutalisk_strategy and self.can_afford(UnitTypeId.MUTALISK) and self.unit_snapshot.ready(UnitTypeId.SPIRE).exists and self.supply_left >= 2
 
     def should_build_hydralisk(self) -> bool:
         return self.use_hydralisk_strategy and self.can_afford(
-            UnitTypeId.HYDRALISK) and self.units(UnitTypeId.HYDRALISKDEN).ready.exists and self.supply_left >= 2
+            UnitTypeId.HYDRALISK) and self.unit_snapshot.ready(UnitTypeId.HYDRALISKDEN).exists and self.supply_left >= 2
     
     def should_build_roach(self) -> bool:
         if self.minerals < 150:
             return False
-        return self.use_roach_strategy and self.can_afford(UnitTypeId.ROACH) and self.units(UnitTypeId.ROACHWARREN).ready.exists and self.supply_left >= 2
+        return self.use_roach_strategy and self.can_afford(UnitTypeId.ROACH) and self.unit_snapshot.ready(UnitTypeId.ROACHWARREN).exists and self.supply_left >= 2
 
     def should_build_zergling(self) -> bool:
         # TODO needs work. Zerglings are built instead of any other unit because the bot never gets above 50 minerals
         has_right_mineral_gas_ratio = self.minerals / self.vespene > 1.3 if self.vespene else True
         # not self.state.score.lost_minerals_army + self.state.score.lost_vespene_army > 1200
         distance_to_center_map = self.start_location.distance_to(self.game_info.map_center)
-        enemy_is_close = self.known_enemy_units.not_structure.exclude_type(race_worker.values()).closer_than(distance_to_center_map, self.start_location).amount > 2 \
-            or self.estimated_enemy_army_location.distance_to_closest(self.townhalls) < 25
+        worker_types = set(race_worker.values())
+        enemy_is_close = get_enemies_near_position(self, self.start_location, distance_to_center_map,
+            unit_filter=lambda u: not u.is_structure and u.type_id not in worker_types).amount > 2 \
+            or self.enemy_army_tracker.distance_to_closest(self.townhalls) < 25
         if enemy_is_close:
             print(f'enemy_is_close: {enemy_is_close}')
         return enemy_is_close or self.get_has_been_under_attack_recently() or (not self.booming and has_right_mineral_gas_ratio)
 
     def should_build_broodlord(self) -> bool:
-        return self.use_broodlord_strategy and self.can_afford(UnitTypeId.CORRUPTOR) and self.units(UnitTypeId.SPIRE).ready.exists and self.supply_left >= 2
+        return self.use_broodlord_strategy and self.can_afford(UnitTypeId.CORRUPTOR) and self.unit_snapshot.ready(UnitTypeId.SPIRE).exists and self.supply_left >= 2
 
     def calculate_minerals_after_seconds(self, seconds_from_now) -> int:
-        return self.minerals + (seconds_from_now * self.state.score.collection_rate_minerals)
+        return int(self.economy.minerals_at(seconds_from_now))
+
+    @memoize(STEP)
+    def get_economy_state(self) -> EconomyState:
+        """the observed economy of this step, economy projects it from the bank left after the actions buffered since"""
+        townhalls = self.unit_snapshot.ready(TOWNHALL_TYPES)
+        injected = townhalls.filter(lambda townhall: townhall.has_buff(BuffId.QUEENSPAWNLARVATIMER))
+        queens_with_energy = self.unit_snapshot.ready(UnitTypeId.QUEEN).filter(lambda queen: queen.energy >= 25).amount
+        # the time left on an inject isn't observable, the ones running are assumed half way through
+        inject_times = [INJECT_SECONDS / 2] * injected.amount + \
+            [INJECT_SECONDS] * min(queens_with_energy, townhalls.amount - injected.amount)
+        pending_supply = [((1 - egg._proto.orders[0].progress) * OVERLORD_SECONDS, OVERLORD_SUPPLY)
+                          for egg in self.unit_snapshot(UnitTypeId.EGG)
+                          if egg._proto.orders and egg._proto.orders[0].ability_id == AbilityId.LARVATRAIN_OVERLORD.value]
+        pending_supply += [((1 - hatchery.build_progress) * HATCHERY_SECONDS, HATCHERY_SUPPLY)
+                           for hatchery in self.unit_snapshot(UnitTypeId.HATCHERY) if not hatchery.is_ready]
+        return EconomyState(
+            minerals=self.minerals, vespene=self.vespene,
+            mineral_rate=self.state.score.collection_rate_minerals / 60,
+            vespene_rate=self.state.score.collection_rate_vespene / 60,
+            larva=self.unit_tracker.ready_count(UnitTypeId.LARVA), hatcheries=townhalls.amount,
+            supply_used=self.supply_used, supply_cap=self.supply_cap,
+            inject_times=tuple(inject_times), pending_supply=tuple(pending_supply))
+
+    @property
+    def economy(self) -> EconomyProjection:
+        """bank, larva and supply cap over the next ECONOMY_HORIZON_SECONDS, projected again once the bank was spent"""
+        return self._project_economy(self.minerals, self.vespene)
+
+    @memoize(STEP)
+    def _project_economy(self, minerals: float, vespene: float) -> EconomyProjection:
+        state = self.get_economy_state()._replace(minerals=minerals, vespene=vespene)
+        return EconomyProjection(state, seconds=ECONOMY_HORIZON_SECONDS)
+
+    def get_larva_unit(self) -> UnitTypeId:
+        """the unit most larva turn into with the current strategy"""
+        if self.booming:
+            return UnitTypeId.DRONE
+        return self.get_army_unit()
+
+    def get_army_unit(self) -> UnitTypeId:
+        if self.use_ultralisk_strategy:
+            return UnitTypeId.ULTRALISK
+        if self.use_mutalisk_strategy:
+            return UnitTypeId.MUTALISK
+        if self.use_hydralisk_strategy:
+            return UnitTypeId.HYDRALISK
+        if self.use_roach_strategy:
+            return UnitTypeId.ROACH
+        return UnitTypeId.ZERGLING
 
-    # TODO needs work, still returning too many overlords
     def get_overlords_needed(self) -> int:
-            """Calculates the number of overlords to make given the current situation.
-                https://gamefaqs.gamespot.com/boards/939643-starcraft-ii-wings-of-liberty/58543769
-                > You should get about 6 or 7 larva per hatchery between every queen inject.
-                > Overlords take less time to build than it takes from inject to extra larva
-                > If you're going lings, 1 larva = 1 supply.
-                > If you're going roach, hydra, muta, 1 larva = 2 supply.
-                > Overlords give 8 supply.
-
-                Therefore,
-
-                If you're making lings, you can make 1 overlord per 7 larva and still have 
-                enough space to make a queen during that period (common).
-
-                If you're making 2 food units, you'll probably want to make 2 overlords per 7 larva 
-                (again, an inject period), and maybe 1 overlord per round every 3rd time.
-            """
-            larvae = self.units(UnitTypeId.LARVA).ready
-            queen_ready_to_inject_count = self.units(UnitTypeId.QUEEN).ready.filter(lambda q: q.energy >= 25).amount
-            maximum_future_larva_count = self.townhalls.amount + (queen_ready_to_inject_count * 7)
-            current_larva_count = larvae.amount
-            supply_cap = 200
-            supply_used = self.supply_used
-            maximum_supply_needed = supply_cap - supply_used
-            supply_per_overlord = 8
-            maximum_overlords_needed = round(
-                maximum_supply_needed / supply_per_overlord)
-            overlords_in_progress = self.units(UnitTypeId.OVERLORD).not_ready().amount
-            overlord_build_time = 18
-            minimum_unit_cost = 50
-            minerals_pending = self.calculate_minerals_after_seconds(overlord_build_time / 3)
-            max_units_buildable = round(minerals_pending / minimum_unit_cost)
-            larva_to_account_for = maximum_future_larva_count + current_larva_count
-            supply_per_larva = 1
-            if self.use_ultralisk_strategy:
-                supply_per_larva = 6
-            if self.use_roach_strategy or self.use_mutalisk_strategy or self.use_hydralisk_strategy:
-                supply_per_larva = 2
-            # TODO / 2 is just to lower the production rate a little bit. This might not be necessary
-            supply_demand = (larva_to_account_for * supply_per_larva)
-            overlords_to_meet_demand = min(round(supply_demand / supply_per_overlord), max_units_buildable)
-            return max(min(maximum_overlords_needed, overlords_to_meet_demand, ) - overlords_in_progress, 0)
+        """overlords to start now so the larva and bank of the next seconds never run into the supply cap"""
+        minerals, vespene, supply = self.get_train_cost(self.get_larva_unit())
+        return self.economy.overlords_needed(minerals, supply, vespene)
 
+    def is_bank_floating(self) -> bool:
+        """true when the larva can't spend the bank on the army, so more income would only float"""
+        minerals, vespene, _ = self.get_train_cost(self.get_army_unit())
+        return self.economy.floating_minerals(minerals, vespene) > FLOATING_MINERALS_LIMIT
 
     async def build_units(self, iteration, is_under_attack=False):
         if iteration % 50:
             # build queens
-            for townhall in self.townhalls.ready.noqueue:
-                if self.units(UnitTypeId.QUEEN).ready.closer_than(5, townhall).amount < 1:
-                    if self.can_afford(UnitTypeId.QUEEN) and self.units(UnitTypeId.SPAWNINGPOOL).ready.exists and not self.already_pending(UnitTypeId.QUEEN):
+            for townhall in self.unit_snapshot.ready_noqueue(TOWNHALL_TYPES):
+                if self.unit_snapshot.ready(UnitTypeId.QUEEN).closer_than(5, townhall).amount < 1:
+                    if self.can_afford(UnitTypeId.QUEEN) and self.unit_snapshot.ready(UnitTypeId.SPAWNINGPOOL).exists and not self.already_pending(UnitTypeId.QUEEN):
                         bot_logger.log_action(self, 'building queen')
                         await self.do(townhall.train(UnitTypeId.QUEEN))
-        if self.units(UnitTypeId.LARVA).amount <= 0:
+        if self.unit_snapshot(UnitTypeId.LARVA).amount <= 0:
             return
 
         if self.should_build_overlord():
-            overlords_to_build = self.get_overlords_needed()
-            if overlords_to_build > 1:
-                await build_overlord(self, None)
+            await build_overlord(self, None)
+
+    @memoize(GAME)
+    def get_train_cost(self, unit_type: UnitTypeId) -> Tuple[int, int, float]:
+        """minerals, vespene and supply of one train command (a zergling command trains two)"""
+        unit_data = self._game_data.units[unit_type.value]
+        cost = self._game_data.calculate_ability_cost(unit_data.creation_ability)
+        supply = unit_data._proto.food_required * (2 if unit_type is UnitTypeId.ZERGLING else 1)
+        return cost.minerals, cost.vespene, supply
+
+    def get_military_production_options(self) -> List[ProductionOption]:
+        available = {
+            UnitTypeId.ULTRALISK: self.should_build_ultralisk(),
+            UnitTypeId.MUTALISK: self.should_build_mutalisk(),
+            UnitTypeId.HYDRALISK: self.should_build_hydralisk(),
+            UnitTypeId.ROACH: self.should_build_roach(),
+            UnitTypeId.ZERGLING: self.unit_tracker.ready_count(UnitTypeId.SPAWNINGPOOL) > 0 and self.should_build_zergling(),
+            UnitTypeId.CORRUPTOR: self.should_build_broodlord(),
+        }
+        return [ProductionOption(unit_type, MILITARY_UNIT_WEIGHTS[unit_type], *self.get_train_cost(unit_type))
+                for unit_type, is_available in available.items() if is_available]
 
     async def build_military_units(self):
-        larvae = self.units(UnitTypeId.LARVA).ready
-        if larvae.exists:
-            larva = larvae.random
-            # TODO generate these weights more dynamically
-            ultralisk_weight = .8
-            mutalisk_weight = .7
-            hydralisk_weight = .2
-            roach_weight = .1
-            zergling_weight = .9
-            broodlord_weight = .9
-            if self.should_build_ultralisk() and random.random() < ultralisk_weight:
-                bot_logger.log_action(self, "building ultralisk")
-                return await self.do(larva.train(
-                    UnitTypeId.ULTRALISK
-                ))
-            if self.should_build_mutalisk() and random.random() < mutalisk_weight:
-                bot_logger.log_action(self, "building mutalisk")
-                return await self.do(larva.train(
-                    UnitTypeId.MUTALISK))
-            if self.should_build_hydralisk() and random.random() < hydralisk_weight:
-                bot_logger.log_action(self, "building hydralisk")
-                return await self.do(larva.train(UnitTypeId.HYDRALISK))
-            if self.should_build_roach() and random.random() < roach_weight:
-                bot_logger.log_action(self, "building roach")
-                return await self.do(larva.train(UnitTypeId.ROACH))
-            if self.should_build_zergling() and random.random() < zergling_weight:
-                return await build_zergling(self, larva)
-            if self.should_build_broodlord() and random.random() < broodlord_weight:
-                ready_corruptors = self.units(UnitTypeId.CORRUPTOR).ready
-                if ready_corruptors.exists:
-                    await self.do(ready_corruptors.first(AbilityId.MORPHTOBROODLORD_BROODLORD))
-                return await self.do(larva.train(UnitTypeId.CORRUPTOR))
+        """trains the army composition with every larva the drones and overlords of this step can spare"""
+        larvae = get_free_larvae(self)
+        if not larvae.exists:
+            return
+        options = self.get_military_production_options()
+        if not options:
+            return
+        # build_units and build_drones run after this task and take one larva each when they need it
+        reserved_larva = reserved_minerals = 0
+        if self.should_build_overlord():
+            reserved_larva += 1
+            reserved_minerals += self.get_train_cost(UnitTypeId.OVERLORD)[0]
+        if not (self.is_under_attack or self.has_been_under_attack_recently) and self.should_build_drones():
+            reserved_larva += 1
+            reserved_minerals += self.get_train_cost(UnitTypeId.DRONE)[0]
+        plan = plan_larva_production(
+            options, larvae.amount - reserved_larva, self.minerals - reserved_minerals, self.vespene, self.supply_left,
+            mineral_rate=self.economy.state.mineral_rate, vespene_rate=self.economy.state.vespene_rate,
+            # a floating bank already pays for the favorite unit
+            save_seconds=0 if self.is_bank_floating() else PRODUCTION_SAVE_SECONDS,
+            rng=None if self.deterministic_production else random)
+        if not plan:
+            return
+        actions = [larva.train(unit_type) for larva, unit_type in zip(larvae, plan)]
+        if UnitTypeId.CORRUPTOR in plan:
+            ready_corruptors = self.unit_snapshot.ready(UnitTypeId.CORRUPTOR)
+            if ready_corruptors.exists:
+                actions.append(ready_corruptors.first(AbilityId.MORPHTOBROODLORD_BROODLORD))
+        bot_logger.log_action(self, 'building {}'.format(', '.join(
+            '{} {}'.format(plan.count(unit_type), unit_type.name.lower()) for unit_type in dict.fromkeys(plan))))
+        await self.do_actions(actions)
 
     def should_build_gas(self) -> bool:
         has_excess_vespene = self.vespene > 1000
         is_late_game = self.time > 2000
         if has_excess_vespene and not is_late_game:
             return False
-        extractor_count = self.units(UnitTypeId.EXTRACTOR).amount
+        extractor_count = self.unit_tracker.count(UnitTypeId.EXTRACTOR)
         ideal_extractor_count = 0
         if self.expansion_count != 0 and self.time > 68:
             ideal_extractor_count += 1
@@ -1185,7 +1438,7 @@ class BalancedZergBot(ZergBotBase):
         return self.can_afford(UnitTypeId.EXTRACTOR)
 
     async def build_gas(self):
-        for hatch in self.townhalls.ready:
+        for hatch in get_ready_townhalls(self):
             if self.supply_used < 16:
                 break
             if self.already_pending(UnitTypeId.EXTRACTOR):
@@ -1205,8 +1458,21 @@ class BalancedZergBot(ZergBotBase):
 
     def on_end(self, game_result: Result):
         bot_logger.log_action(self, game_result)
+        # read by the training scripts once the game is over
+        self.game_summary = get_game_summary(self, game_result)
+        bot_logger.log_action(self, 'suppressed {} redundant micro commands, sent {}'.format(
+            self.command_cache.suppressed_count, self.command_cache.sent_count))
+        bot_logger.log_action(self, 'memoized hit rates: {}'.format(', '.join(
+            '{} {:.0%} of {}'.format(name, stats['hit_rate'], stats['hits'] + stats['misses'])
+            for name, stats in get_memo_stats(self).items())))
+        if self.profiler.enabled:
+            make_dir_if_not_exists(get_profile_directory())
+            profile_name = get_profile_name(game_result)
+            self.profiler.dump(profile_name)
+            bot_logger.log_action(self, 'step profile written to {}'.format(profile_name))
         if self.should_show_plot:
             plot_dir = get_plot_directory()
             make_dir_if_not_exists(plot_dir)
             figure_name = get_figure_name(game_result)
-            self.plotter.save(figure_name)
+            self.plot_renderer.save(figure_name)
+            self.plot_renderer.close()
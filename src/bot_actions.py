@@ -6,11 +6,12 @@ from sc2.units import Units
 from typing import Union, Optional, List, Callable
 
 import src.bot_logger as bot_logger
+from src.spatial_index import UnitGrid
 from src.types import Location, UnitPredicate
 
 
 async def build_building_once(bot: BotAI, building: UnitTypeId, location: Union[Point2, Point3, Unit], max_distance: int=20, unit: Optional[Unit]=None, random_alternative: bool=True, placement_step: int=2):
-    if not bot.units(building).ready.exists and not bot.already_pending(building) and bot.can_afford(building):
+    if not bot.unit_snapshot.ready(building).exists and not bot.already_pending(building) and bot.can_afford(building):
         bot_logger.log_action(
             bot, "building {} at {}".format(building, location))
         return await bot.build(building, near=location, max_distance=max_distance, unit=unit, random_alternative=random_alternative, placement_step=placement_step)
@@ -22,10 +23,24 @@ def get_workers_per_townhall(bot: BotAI) -> int:
         bot.townhalls.amount if bot.townhalls.ready.exists else bot.workers.ready.amount
 
 
-def get_enemies_near_position(bot: BotAI, position: Location, distance: Union[int, float]=20, unit_filter: UnitPredicate=lambda u: u.can_attack_ground) -> Units:
-    """Returns units closer than the distance from the given position."""
-    enemies_close_by = bot.known_enemy_units.closer_than(distance, position)
-    return enemies_close_by.filter(unit_filter)
+def get_enemy_index(bot: BotAI) -> UnitGrid:
+    """Returns a spatial index of the known enemy units, built at most once per game step."""
+    game_loop = bot.state.game_loop
+    if getattr(bot, '_enemy_index_game_loop', None) != game_loop:
+        bot._enemy_index = UnitGrid(bot.known_enemy_units)
+        bot._enemy_index_game_loop = game_loop
+    return bot._enemy_index
+
+
+def get_enemies_near_position(bot: BotAI, position: Location, distance: Union[int, float]=20, unit_filter: Optional[UnitPredicate]=lambda u: u.can_attack_ground, **flag_filters) -> Units:
+    """Returns units closer than the distance from the given position.
+    flag_filters are passed on to UnitGrid.closer_than (is_flying, can_attack_ground, ground_dps_above, ...)"""
+    return get_enemy_index(bot).closer_than(distance, position, unit_filter=unit_filter, **flag_filters)
+
+
+def get_closest_enemy(bot: BotAI, position: Location, unit_filter: Optional[UnitPredicate]=None, **flag_filters) -> Optional[Unit]:
+    """Returns the closest known enemy unit to the given position, if any."""
+    return get_enemy_index(bot).closest_to(position, unit_filter=unit_filter, **flag_filters)
 
 
 def targettable_by_both(unit: Unit) -> bool:
@@ -74,6 +89,11 @@ def get_is_threat_callable(unit: Unit) -> UnitPredicate:
         return is_threat_to_ground
 
 
+def get_total_dps(units: Units) -> float:
+    """summed dps of the units, each counted with its best weapon"""
+    return sum(max(unit.ground_dps, unit.air_dps) for unit in units)
+
+
 def is_researching(bot: BotAI, building: Unit, ability_id: AbilityId) -> bool:
     """Returns whether the given ability_id is in the orders of the """
     return sum([order.ability.id == ability_id for order in building.orders]) >= 1
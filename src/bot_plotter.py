@@ -1,34 +1,162 @@
+"""Live line plots of bot metrics.
+
+Run ``python -m src.bot_plotter`` to benchmark redraw time and memory over a full length game.
+"""
+import os
+import time
+
 import matplotlib.pyplot as plt
+import numpy as np
 from typing import List, Tuple, Dict
 
 
 class BotPlotter(object):
-    def __init__(self, initial_plots: Dict[str, List[Tuple[Tuple, Dict]]]):
+    """
+    Creates one line per series of initial_plots up front; updates only replace the line data.
+    With blit=True, only the axes whose lines changed are redrawn unless their limits had to grow.
+    """
+
+    def __init__(self, initial_plots: Dict[str, List[Tuple[Tuple, Dict]]], blit: bool=False, headroom: float=.25):
         plt.close('all')
         subplot_count = len(initial_plots)
         plt.style.use('ggplot')
-        figure, axes = plt.subplots(subplot_count, sharex=True)
+        figure, axes = plt.subplots(subplot_count, sharex=True, squeeze=False)
         self.axes = {}
+        self.lines = {}
         self.figure = figure
-        for (key, plots), axis in zip(initial_plots.items(), axes):
+        self.blit = blit
+        self.headroom = headroom
+        self.backgrounds = {}
+        self.changed_keys = set()
+        self.needs_full_draw = True
+        for (key, plots), axis in zip(initial_plots.items(), axes[:, 0]):
+            self.axes[key] = axis
+            self.lines[key] = []
             for args, kwargs in plots:
-                self.axes[key] = axis
-                axis.plot(*args, **kwargs)
+                line, = axis.plot(*args, animated=blit, **kwargs)
+                self.lines[key].append(line)
             legend = axis.legend(
                 loc='upper left', shadow=True, fontsize='large')
             legend.get_frame()
 
-    def plot(self, key, *args, **kwargs):
-        axis = self.axes.get(key)
-        assert(axis is not None)
-        axis.plot(*args, **kwargs)
+    def _grow_limits(self, key):
+        """
+        Resets the axis limits with some headroom once the data no longer fits, so they rarely change.
+        When the data is a sliding window the x limits follow it once it moved a headroom past the left limit.
+        """
+        axis = self.axes[key]
+        xs = np.concatenate([np.asarray(line.get_xdata(), dtype=float) for line in self.lines[key]])
+        ys = np.concatenate([np.asarray(line.get_ydata(), dtype=float) for line in self.lines[key]])
+        if not len(xs):
+            return
+        min_x, max_x, min_y, max_y = xs.min(), xs.max(), ys.min(), ys.max()
+        (left, right), (bottom, top) = axis.get_xlim(), axis.get_ylim()
+        x_margin = max(max_x - min_x, 1) * self.headroom
+        y_margin = max(max_y - min_y, 1) * self.headroom
+        fits = left <= min_x and max_x <= right and bottom <= min_y and max_y <= top
+        if self.needs_full_draw or not fits or min_x - left > x_margin:
+            axis.set_xlim(min_x, max_x + x_margin)
+            axis.set_ylim(min_y - y_margin, max_y + y_margin)
+            self.needs_full_draw = True
+
+    def set_data(self, key, index, x, y):
+        """Replaces the data of the index-th series of the plot"""
+        self.lines[key][index].set_data(x, y)
+        self.changed_keys.add(key)
+
+    def _draw_lines(self, key):
+        for line in self.lines[key]:
+            self.axes[key].draw_artist(line)
 
     def show(self):
-        plt.draw()
-        plt.pause(0.0000001)
+        for key in self.changed_keys:
+            self._grow_limits(key)
+        canvas = self.figure.canvas
+        if not self.blit:
+            plt.draw()
+            plt.pause(0.0000001)
+        elif self.needs_full_draw:
+            # the background (axes, ticks, legend) is drawn without the animated lines and kept for blitting
+            canvas.draw()
+            for key, axis in self.axes.items():
+                self.backgrounds[key] = canvas.copy_from_bbox(axis.bbox)
+                self._draw_lines(key)
+            canvas.blit(self.figure.bbox)
+            self.process_events()
+        else:
+            for key in self.changed_keys:
+                canvas.restore_region(self.backgrounds[key])
+                self._draw_lines(key)
+                canvas.blit(self.axes[key].bbox)
+            self.process_events()
+        self.changed_keys.clear()
+        self.needs_full_draw = False
+
+    def process_events(self):
+        self.figure.canvas.flush_events()
 
     def save(self, filename):
+        # animated (blitted) lines are skipped by regular draws, so they're switched off while saving
+        lines = [line for lines in self.lines.values() for line in lines]
+        for line in lines:
+            line.set_animated(False)
         self.figure.savefig(filename)
+        for line in lines:
+            line.set_animated(self.blit)
+        self.needs_full_draw = True
 
     def reset(self):
         plt.close(self.figure)
+
+
+def _get_rss_mb() -> float:
+    """Current resident memory of this process, falls back to the peak where /proc is not available"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        # not available on Windows
+        import resource
+    except ImportError:
+        return float('nan')
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2 ** 10
+
+
+def benchmark(samples=5000, report_every=1000, window=20):
+    """
+    Simulates the metric plots of a 30 minute game (one sample every 8 steps),
+    comparing the old axis.plot per update against persistent lines, with and without blitting
+    """
+    plt.switch_backend('Agg')
+    initial_plots = {
+        'mpm': [(([], [], 'c-'), {'label': 'Minerals per minute'})],
+        'supply_used': [(([], [], 'k-'), {'label': 'Supply used'}), (([], [], 'g-'), {'label': 'Workers'})],
+    }
+    for mode in ('new line per update', 'persistent lines', 'persistent lines + blit'):
+        plotter = BotPlotter(initial_plots, blit=mode.endswith('blit'))
+        times, values = [], {key: [[] for _ in plots] for key, plots in initial_plots.items()}
+        start = time.perf_counter()
+        for sample in range(1, samples + 1):
+            times.append(sample)
+            for key, series_list in values.items():
+                for index, series in enumerate(series_list):
+                    series.append(sample * (index + 1) % 200)
+                    if mode == 'new line per update':
+                        plotter.axes[key].plot(times[-window:], series[-window:])
+                    else:
+                        plotter.set_data(key, index, times[-window:], series[-window:])
+            if mode == 'new line per update':
+                plotter.figure.canvas.draw()
+            else:
+                plotter.show()
+            if sample % report_every == 0:
+                print('{:>24} | {:>5} updates | {:7.2f} ms/redraw | rss {:7.1f} MB'.format(
+                    mode, sample, (time.perf_counter() - start) * 1000 / report_every, _get_rss_mb()))
+                start = time.perf_counter()
+        plotter.reset()
+
+
+if __name__ == '__main__':
+    benchmark()
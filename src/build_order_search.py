@@ -0,0 +1,486 @@
+"""Offline search of zerg build orders that reach a target unit and tech state by a given time.
+
+A beam search plays candidate orders through a simplified economy (mining drones, hatchery larva, queen injects,
+supply and build times) and keeps the orders that meet the target with the most economy left at its time.
+Plans are written to a compact JSON file the bot loads at startup and follows step by step.
+Search with ``python -m src.build_order_search roach_push roach=8 --deadline 300``.
+The committed build_orders.json holds speedling (``zergling=6 zerglingmovementspeed=1 --deadline 200``)
+and roach_push, picked with ``python train_zerg_bot.py --build-order roach_push``.
+"""
+import argparse
+import json
+import math
+import os
+from collections import Counter
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from src.economy_model import LARVA_SPAWN_SECONDS, INJECT_SECONDS, INJECT_LARVA, OVERLORD_SUPPLY, MAX_SUPPLY
+
+DEFAULT_BUILD_ORDERS_PATH = 'build_orders.json'
+
+# minerals and vespene per game second of one drone, the 16 first drones of a base mine at the full rate
+MINERALS_PER_DRONE = .93
+SATURATED_MINERALS_PER_DRONE = .4
+VESPENE_PER_DRONE = .89
+DRONES_PER_BASE = 16
+SATURATED_DRONES_PER_BASE = 8
+DRONES_PER_EXTRACTOR = 3
+EXTRACTORS_PER_BASE = 2
+LARVA_PER_HATCHERY = 3
+# value of a drone when comparing the economies of two orders, what it costs
+DRONE_VALUE = 50
+
+
+class BuildAction(NamedTuple):
+    name: str
+    minerals: int
+    vespene: int
+    supply: float
+    seconds: float
+    # actions that must have finished at least once
+    requires: Tuple[str, ...] = ()
+    # 'larva', 'drone' (which becomes the structure) or the structure whose queue it takes
+    producer: str = 'larva'
+    amount: int = 1
+    provides_supply: int = 0
+    # most that may be finished or in progress at once, None for no limit
+    limit: Optional[int] = None
+
+
+BUILD_ACTIONS: Dict[str, BuildAction] = {action.name: action for action in [
+    BuildAction('drone', 50, 0, 1, 12),
+    BuildAction('overlord', 100, 0, 0, 18, provides_supply=OVERLORD_SUPPLY),
+    BuildAction('zergling', 50, 0, 1, 17, requires=('spawningpool',), amount=2),
+    BuildAction('roach', 75, 25, 2, 19, requires=('roachwarren',)),
+    BuildAction('queen', 150, 0, 2, 36, requires=('spawningpool',), producer='hatchery'),
+    BuildAction('hatchery', 300, 0, 0, 71, producer='drone', provides_supply=6, limit=4),
+    BuildAction('extractor', 25, 0, 0, 21, producer='drone'),
+    BuildAction('spawningpool', 200, 0, 0, 46, producer='drone', limit=1),
+    BuildAction('roachwarren', 150, 0, 0, 39, requires=('spawningpool',), producer='drone', limit=1),
+    BuildAction('lair', 150, 100, 0, 57, requires=('spawningpool',), producer='hatchery', limit=1),
+    BuildAction('zerglingmovementspeed', 100, 100, 0, 79, requires=('spawningpool',), producer='spawningpool',
+                limit=1),
+]}
+
+
+class PlanStep(NamedTuple):
+    # supply used when the step was started, the way build orders are usually written
+    supply: float
+    name: str
+    time: float
+
+
+class BuildOrder(NamedTuple):
+    name: str
+    target: Dict[str, int]
+    deadline: float
+    # seconds when the target state is reached
+    completion_time: float
+    steps: List[PlanStep]
+
+
+def get_required_actions(names: Iterable[str]) -> List[str]:
+    """
+    The actions and everything they depend on, including an extractor for vespene
+
+    >>> get_required_actions(['roach'])
+    ['extractor', 'roach', 'roachwarren', 'spawningpool']
+    """
+    required = set()
+    pending = list(names)
+    while pending:
+        name = pending.pop()
+        if name in required:
+            continue
+        required.add(name)
+        action = BUILD_ACTIONS[name]
+        pending += action.requires
+        if action.vespene:
+            pending.append('extractor')
+    return sorted(required)
+
+
+class SimulatedEconomy(object):
+    """
+    The simplified economy an order is played through. Time advances in whole seconds, drones
+    fill the extractors first and injects give every queen's hatchery INJECT_LARVA larva every INJECT_SECONDS.
+
+    >>> economy = SimulatedEconomy()
+    >>> economy.start(BUILD_ACTIONS['drone'])
+    >>> economy.advance_to(12)
+    >>> economy.drones, economy.larva, economy.supply_used, round(economy.minerals)
+    (13, 3, 13.0, 134)
+    """
+
+    def __init__(self):
+        self.time = 0
+        self.minerals = 50.0
+        self.vespene = 0.0
+        self.drones = 12
+        self.larva = 3
+        self.larva_progress = 0.0
+        self.inject_progress = 0.0
+        self.supply_used = 12.0
+        self.supply_cap = 14.0
+        self.finished: Counter = Counter({'hatchery': 1, 'overlord': 1})
+        # (finish time, action name), in order of start
+        self.in_progress: List[Tuple[int, str]] = []
+        self.busy: Counter = Counter()
+        self.steps: List[PlanStep] = []
+
+    def copy(self) -> 'SimulatedEconomy':
+        economy = SimulatedEconomy.__new__(SimulatedEconomy)
+        economy.__dict__.update(self.__dict__)
+        economy.finished = Counter(self.finished)
+        economy.in_progress = list(self.in_progress)
+        economy.busy = Counter(self.busy)
+        economy.steps = list(self.steps)
+        return economy
+
+    @property
+    def gas_drones(self) -> int:
+        return min(self.drones, self.finished['extractor'] * DRONES_PER_EXTRACTOR)
+
+    @property
+    def mineral_rate(self) -> float:
+        drones = self.drones - self.gas_drones
+        bases = self.finished['hatchery']
+        full = min(drones, bases * DRONES_PER_BASE)
+        saturated = min(drones - full, bases * SATURATED_DRONES_PER_BASE)
+        return full * MINERALS_PER_DRONE + saturated * SATURATED_MINERALS_PER_DRONE
+
+    @property
+    def vespene_rate(self) -> float:
+        return self.gas_drones * VESPENE_PER_DRONE
+
+    def count(self, name: str) -> int:
+        """Finished and in progress"""
+        return self.finished[name] + sum(1 for _, in_progress in self.in_progress if in_progress == name) \
+            * BUILD_ACTIONS[name].amount
+
+    def _finish(self, name: str):
+        action = BUILD_ACTIONS[name]
+        self.finished[name] += action.amount
+        self.supply_cap = min(MAX_SUPPLY, self.supply_cap + action.provides_supply)
+        if name == 'drone':
+            self.drones += 1
+        if action.producer not in ('larva', 'drone'):
+            self.busy[action.producer] -= 1
+
+    def advance(self):
+        """One second of mining, larva and production"""
+        self.time += 1
+        self.minerals += self.mineral_rate
+        self.vespene += self.vespene_rate
+        hatcheries = self.finished['hatchery']
+        if self.larva < hatcheries * LARVA_PER_HATCHERY:
+            self.larva_progress += hatcheries / LARVA_SPAWN_SECONDS
+            while self.larva_progress >= 1:
+                self.larva_progress -= 1
+                self.larva += 1
+        self.inject_progress += min(self.finished['queen'], hatcheries) / INJECT_SECONDS
+        while self.inject_progress >= 1:
+            self.inject_progress -= 1
+            self.larva += INJECT_LARVA
+        while self.in_progress and min(self.in_progress)[0] <= self.time:
+            finished = min(self.in_progress)
+            self.in_progress.remove(finished)
+            self._finish(finished[1])
+
+    def advance_to(self, time: float):
+        while self.time < time:
+            self.advance()
+
+    def pending_supply(self) -> int:
+        return sum(BUILD_ACTIONS[name].provides_supply for _, name in self.in_progress)
+
+    def can_ever_start(self, action: BuildAction) -> bool:
+        """False when waiting can't make the action possible"""
+        if action.limit is not None and self.count(action.name) >= action.limit:
+            return False
+        if action.name == 'extractor' and self.count('extractor') >= self.count('hatchery') * EXTRACTORS_PER_BASE:
+            return False
+        if any(not self.count(name) for name in action.requires):
+            return False
+        if action.vespene > self.vespene and not self.count('extractor'):
+            return False
+        if action.supply and self.supply_used + action.supply > min(MAX_SUPPLY, self.supply_cap + self.pending_supply()):
+            return False
+        if action.producer == 'drone':
+            return self.drones > 1
+        return action.producer == 'larva' or self.count(action.producer) > 0
+
+    def can_start(self, action: BuildAction) -> bool:
+        if self.minerals < action.minerals or self.vespene < action.vespene:
+            return False
+        if action.supply and self.supply_used + action.supply > self.supply_cap:
+            return False
+        if any(not self.finished[name] for name in action.requires):
+            return False
+        if action.producer == 'larva':
+            return self.larva > 0
+        if action.producer == 'drone':
+            return self.drones > 1
+        return self.finished[action.producer] - self.busy[action.producer] > 0
+
+    def start(self, action: BuildAction):
+        self.steps.append(PlanStep(self.supply_used, action.name, self.time))
+        self.minerals -= action.minerals
+        self.vespene -= action.vespene
+        self.supply_used += action.supply
+        if action.producer == 'larva':
+            self.larva -= 1
+        elif action.producer == 'drone':
+            self.drones -= 1
+            self.supply_used -= 1
+        else:
+            self.busy[action.producer] += 1
+        self.in_progress.append((self.time + math.ceil(action.seconds), action.name))
+
+    def meets(self, target: Dict[str, int]) -> bool:
+        """Everything in the target is finished or in progress"""
+        return all(self.count(name) >= amount for name, amount in target.items())
+
+    def missing_cost(self, target: Dict[str, int]) -> Tuple[int, int]:
+        """Minerals and vespene still to spend on the target and its requirements"""
+        missing_minerals = missing_vespene = 0
+        for name in get_required_actions(target):
+            action = BUILD_ACTIONS[name]
+            missing = max(0, math.ceil((target.get(name, 1) - self.count(name)) / action.amount))
+            missing_minerals += missing * action.minerals
+            missing_vespene += missing * action.vespene
+        return missing_minerals, missing_vespene
+
+    def value(self, deadline: float, target: Dict[str, int]) -> float:
+        """
+        Bank and drones projected to the deadline at the current income, minus what the missing part of the target
+        and its requirements still cost
+        """
+        seconds = max(0, deadline - self.time)
+        missing_minerals, missing_vespene = self.missing_cost(target)
+        drones = self.drones + sum(1 for _, name in self.in_progress if name == 'drone')
+        return self.minerals + self.vespene + (self.mineral_rate + self.vespene_rate) * seconds \
+            - missing_minerals - missing_vespene + drones * DRONE_VALUE
+
+    def earliest_completion(self, target: Dict[str, int]) -> float:
+        """A lower bound on when the target can be finished, from the build times of the missing requirement chains"""
+        def chain_seconds(name: str) -> float:
+            remaining = [finish for finish, in_progress in self.in_progress if in_progress == name]
+            if self.finished[name]:
+                return 0
+            if remaining:
+                return min(remaining) - self.time
+            if name == 'extractor' and not self.count(name):
+                return BUILD_ACTIONS[name].seconds
+            action = BUILD_ACTIONS[name]
+            ready = [chain_seconds(requirement) for requirement in action.requires]
+            if action.vespene > self.vespene:
+                # mined by the drones of one extractor once it is up
+                extractor_seconds = chain_seconds('extractor') if not self.finished['extractor'] else 0
+                vespene_rate = self.vespene_rate or DRONES_PER_EXTRACTOR * VESPENE_PER_DRONE
+                ready.append(extractor_seconds + (action.vespene - self.vespene) / vespene_rate)
+            return action.seconds + max(ready, default=0)
+        missing = [name for name, amount in target.items() if self.count(name) < amount]
+        if not missing:
+            return max([finish for finish, name in self.in_progress if name in target], default=self.time)
+        chains = max(chain_seconds(name) if not self.count(name) else BUILD_ACTIONS[name].seconds for name in missing)
+        # the larva still to spawn for the missing units, the last of them then needs its build time
+        larva_actions = [BUILD_ACTIONS[name] for name in missing if BUILD_ACTIONS[name].producer == 'larva']
+        missing_larva = sum(math.ceil((target[action.name] - self.count(action.name)) / action.amount)
+                            for action in larva_actions)
+        larva_rate = self.finished['hatchery'] / LARVA_SPAWN_SECONDS + \
+            min(self.finished['queen'], self.finished['hatchery']) * INJECT_LARVA / INJECT_SECONDS
+        larva_seconds = max(0, missing_larva - self.larva) / larva_rate + \
+            min(action.seconds for action in larva_actions) if larva_actions else 0
+        missing_minerals, missing_vespene = self.missing_cost(target)
+        mineral_seconds = max(0, missing_minerals - self.minerals) / max(self.mineral_rate, MINERALS_PER_DRONE) + \
+            min(BUILD_ACTIONS[name].seconds for name in missing)
+        return self.time + max(chains, larva_seconds, mineral_seconds)
+
+    def key(self) -> tuple:
+        return (self.time, int(self.minerals) // 25, int(self.vespene) // 25, self.drones, self.larva,
+                tuple(sorted(self.finished.items())), tuple(sorted(self.in_progress)))
+
+
+def _start_after_waiting(economy: SimulatedEconomy, action: BuildAction, deadline: float) -> Optional[SimulatedEconomy]:
+    if not economy.can_ever_start(action):
+        return None
+    economy = economy.copy()
+    while not economy.can_start(action):
+        if economy.time >= deadline:
+            return None
+        economy.advance()
+    economy.start(action)
+    return economy
+
+
+def search_build_order(name: str, target: Dict[str, int], deadline: float, beam_width: int=24,
+                       max_steps: int=80) -> Optional[BuildOrder]:
+    """
+    The order reaching the target by the deadline with the largest economy at the deadline, None when the beam
+    finds no order that makes it in time. Every step of the beam starts one more action in each kept order.
+
+    >>> order = search_build_order('speedlings', {'zergling': 6, 'zerglingmovementspeed': 1}, deadline=200)
+    >>> [step.name for step in order.steps if step.name != 'drone']
+    ['overlord', 'extractor', 'spawningpool', 'zerglingmovementspeed', 'overlord', 'zergling', 'zergling', 'zergling']
+    >>> order.completion_time <= 200, sum(step.name == 'drone' for step in order.steps) > 0
+    (True, True)
+    >>> search_build_order('too_early', {'roach': 4}, deadline=60) is None
+    True
+    """
+    actions = [BUILD_ACTIONS[action_name] for action_name in sorted({'drone', 'overlord', *get_required_actions(target)})]
+    beam = [SimulatedEconomy()]
+    completed: List[SimulatedEconomy] = []
+    for _ in range(max_steps):
+        children: Dict[tuple, SimulatedEconomy] = {}
+        for economy in beam:
+            for action in actions:
+                # overlords beyond the next two are never what the order is missing
+                if action.name == 'overlord' and \
+                        economy.supply_cap + economy.pending_supply() - economy.supply_used > OVERLORD_SUPPLY:
+                    continue
+                child = _start_after_waiting(economy, action, deadline)
+                if child is None:
+                    continue
+                if child.meets(target):
+                    child.advance_to(child.earliest_completion(target))
+                    if child.time <= deadline:
+                        completed.append(child)
+                elif child.earliest_completion(target) <= deadline:
+                    children.setdefault(child.key(), child)
+        # half the beam keeps the largest economies, the other half the orders closest to the target,
+        # so greedy droning can't crowd out every order that still makes the deadline
+        by_value = sorted(children.values(), key=lambda economy: economy.value(deadline, target), reverse=True)
+        by_completion = sorted(children.values(), key=lambda economy: economy.earliest_completion(target))
+        beam = list({id(economy): economy
+                     for economy in by_value[:beam_width - beam_width // 2] + by_completion[:beam_width // 2]}.values())
+        if not beam:
+            break
+    if not completed:
+        return None
+    best = max(completed, key=lambda economy: economy.value(deadline, target))
+    return BuildOrder(name, dict(target), deadline, best.time, best.steps)
+
+
+def serialize_build_orders(build_orders: Iterable[BuildOrder]) -> str:
+    """
+    One compact JSON object keyed by order name, steps are [supply, action, time]
+
+    >>> order = BuildOrder('pool_first', {'spawningpool': 1}, 120, 100, [PlanStep(12, 'spawningpool', 54)])
+    >>> serialize_build_orders([order])
+    '{"pool_first":{"completion_time":100,"deadline":120,"steps":[[12,"spawningpool",54]],"target":{"spawningpool":1}}}'
+    >>> deserialize_build_orders(serialize_build_orders([order]))['pool_first'] == order
+    True
+    """
+    return json.dumps({order.name: {
+        'target': order.target,
+        'deadline': order.deadline,
+        'completion_time': order.completion_time,
+        'steps': [[step.supply if step.supply % 1 else int(step.supply), step.name, step.time] for step in order.steps],
+    } for order in build_orders}, sort_keys=True, separators=(',', ':'))
+
+
+def deserialize_build_orders(serialized: str) -> Dict[str, BuildOrder]:
+    return {name: BuildOrder(name, order['target'], order['deadline'], order['completion_time'],
+                             [PlanStep(*step) for step in order['steps']])
+            for name, order in json.loads(serialized).items()}
+
+
+def load_build_orders(path: str=DEFAULT_BUILD_ORDERS_PATH) -> Dict[str, BuildOrder]:
+    """The orders stored at path, none when the file doesn't exist"""
+    if not os.path.exists(path):
+        return {}
+    with open(path) as build_orders_file:
+        return deserialize_build_orders(build_orders_file.read())
+
+
+def save_build_order(build_order: BuildOrder, path: str=DEFAULT_BUILD_ORDERS_PATH):
+    """Adds the order to the file, replacing an order of the same name"""
+    build_orders = load_build_orders(path)
+    build_orders[build_order.name] = build_order
+    temporary_path = path + '.tmp'
+    with open(temporary_path, 'w') as build_orders_file:
+        build_orders_file.write(serialize_build_orders(build_orders.values()))
+    os.replace(temporary_path, path)
+
+
+class BuildOrderExecutor(object):
+    """
+    Hands out the steps of an order one at a time. The order is abandoned once the bot falls more than
+    max_delay seconds behind the planned time of the next step, or when disrupt is called (e.g. under attack);
+    afterwards, like after the last step, is_active is False and the bot's own predicates take over.
+
+    >>> order = BuildOrder('pool_first', {'spawningpool': 1}, 120, 100,
+    ...                    [PlanStep(12, 'drone', 0), PlanStep(13, 'overlord', 12), PlanStep(13, 'spawningpool', 54)])
+    >>> executor = BuildOrderExecutor(order, max_delay=20)
+    >>> executor.next_step(time=0).name
+    'drone'
+    >>> executor.step_done()
+    >>> executor.next_step(time=20).name
+    'overlord'
+    >>> executor.step_done()
+    >>> executor.next_step(time=80), executor.is_active, executor.disruption
+    (None, False, 'behind plan at spawningpool by 26 seconds')
+    """
+
+    def __init__(self, build_order: BuildOrder, max_delay: float=30):
+        self.build_order = build_order
+        self.max_delay = max_delay
+        self.index = 0
+        self.disruption: Optional[str] = None
+
+    @property
+    def is_active(self) -> bool:
+        return self.disruption is None and self.index < len(self.build_order.steps)
+
+    def disrupt(self, reason: str):
+        self.disruption = reason
+
+    def next_step(self, time: float) -> Optional[PlanStep]:
+        """The step to carry out now, None once the order is over"""
+        if not self.is_active:
+            return None
+        step = self.build_order.steps[self.index]
+        if time - step.time > self.max_delay:
+            self.disrupt('behind plan at {} by {:.0f} seconds'.format(step.name, time - step.time))
+            return None
+        return step
+
+    def step_done(self):
+        self.index += 1
+
+
+def parse_target(values: Iterable[str]) -> Dict[str, int]:
+    """
+    >>> parse_target(['roach=8', 'lair'])
+    {'roach': 8, 'lair': 1}
+    """
+    target = {}
+    for value in values:
+        name, _, amount = value.partition('=')
+        if name not in BUILD_ACTIONS:
+            raise ValueError('unknown action {}, pick from {}'.format(name, ', '.join(sorted(BUILD_ACTIONS))))
+        target[name] = int(amount) if amount else 1
+    return target
+
+
+def main(argv: Optional[List[str]]=None):
+    parser = argparse.ArgumentParser(description='Search a build order reaching a unit and tech target by a deadline')
+    parser.add_argument('name', help='name the bot loads the order by')
+    parser.add_argument('target', nargs='+', help='action=amount pairs, e.g. roach=8 lair')
+    parser.add_argument('--deadline', type=float, required=True, help='game seconds the target must be reached by')
+    parser.add_argument('--beam-width', type=int, default=24)
+    parser.add_argument('--output', default=DEFAULT_BUILD_ORDERS_PATH, help='build orders file the order is added to')
+    args = parser.parse_args(argv)
+    build_order = search_build_order(args.name, parse_target(args.target), args.deadline, beam_width=args.beam_width)
+    if build_order is None:
+        print('no order reaches the target by {:g} seconds'.format(args.deadline))
+        return
+    for step in build_order.steps:
+        print('{:>5g} {:>4.0f}s {}'.format(step.supply, step.time, step.name))
+    print('target reached at {:.0f}s, written to {}'.format(build_order.completion_time, args.output))
+    save_build_order(build_order, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+from typing import Dict, List, Tuple
+
+from sc2.constants import AbilityId
+from sc2.unit import Unit
+from sc2.unit_command import UnitCommand
+
+# untargeted commands that leave no order or unit state behind, so only the time since they were sent tells
+# whether they were already given
+UNOBSERVED_TOGGLES = {AbilityId.BEHAVIOR_GENERATECREEPON, AbilityId.BEHAVIOR_GENERATECREEPOFF}
+
+
+class CommandCache(object):
+    """
+    Drops unit commands that would not change anything:
+      - move / attack style commands the unit is already carrying out (same ability and target as its current order)
+      - commands without a target the unit is already carrying out (e.g. a burrow still in progress)
+      - toggles whose state the observation doesn't show (the overlord creep toggle) sent to the same unit recently
+    A unit is sent its command again anyway once refresh_interval game loops passed since it was last sent one,
+    so orders that were lost or rejected by the game still get retried.
+
+    >>> from types import SimpleNamespace
+    >>> class FakeUnit(Unit):
+    ...     tag, orders = None, None
+    ...     def __init__(self, tag):
+    ...         self.tag, self.orders = tag, []
+    >>> cache, roach, overlord = CommandCache(), FakeUnit(1), FakeUnit(2)
+    >>> burrow_down = UnitCommand(AbilityId.BURROWDOWN_ROACH, roach)
+    >>> burrow_up = UnitCommand(AbilityId.BURROWUP_ROACH, roach)
+    >>> # a roach burrowing again right after it came up is not dropped
+    >>> commands = [(burrow_down, 0), (burrow_up, 50), (burrow_down, 100)]
+    >>> [len(cache.filter([command], game_loop)) for command, game_loop in commands]
+    [1, 1, 1]
+    >>> roach.orders = [SimpleNamespace(ability=SimpleNamespace(id=AbilityId.BURROWDOWN_ROACH), target=None)]
+    >>> len(cache.filter([burrow_down], 110))
+    0
+    >>> creep = UnitCommand(AbilityId.BEHAVIOR_GENERATECREEPON, overlord)
+    >>> [len(cache.filter([creep], game_loop)) for game_loop in (0, 100, 300)]
+    [1, 0, 1]
+    """
+
+    def __init__(self, refresh_interval: int=224, position_tolerance: float=.5):
+        self.refresh_interval = refresh_interval
+        self.position_tolerance = position_tolerance
+        self.last_sent_loop: Dict[int, int] = {}
+        self.last_untargeted_loop: Dict[Tuple[int, AbilityId], int] = {}
+        self.suppressed_count = 0
+        self.sent_count = 0
+        self._last_prune_loop = 0
+
+    def _matches_current_order(self, action: UnitCommand) -> bool:
+        orders = action.unit.orders
+        if not orders:
+            return False
+        order = orders[0]
+        if order.ability.id != action.ability:
+            return False
+        target = action.target
+        if isinstance(target, Unit):
+            return order.target == target.tag
+        if isinstance(order.target, int):
+            return False
+        return abs(order.target.x - target.x) < self.position_tolerance \
+            and abs(order.target.y - target.y) < self.position_tolerance
+
+    def _is_redundant(self, action: UnitCommand, game_loop: int) -> bool:
+        tag = action.unit.tag
+        last_sent_loop = self.last_sent_loop.setdefault(tag, game_loop)
+        if game_loop - last_sent_loop >= self.refresh_interval:
+            return False
+        if action.target is None:
+            if action.ability in UNOBSERVED_TOGGLES:
+                last_untargeted_loop = self.last_untargeted_loop.get((tag, action.ability))
+                return last_untargeted_loop is not None and game_loop - last_untargeted_loop < self.refresh_interval
+            return any(order.ability.id == action.ability for order in action.unit.orders)
+        return self._matches_current_order(action)
+
+    def _prune(self, game_loop: int):
+        """Forgets units that have not been sent a command for a while (dead units mostly)"""
+        max_age = self.refresh_interval * 4
+        self.last_sent_loop = {tag: loop for tag, loop in self.last_sent_loop.items() if game_loop - loop < max_age}
+        self.last_untargeted_loop = {key: loop for key, loop in self.last_untargeted_loop.items()
+                                     if game_loop - loop < max_age}
+        self._last_prune_loop = game_loop
+
+    def filter(self, actions: List[UnitCommand], game_loop: int) -> List[UnitCommand]:
+        """Returns the actions that are not redundant, queued actions are always kept"""
+        if game_loop - self._last_prune_loop >= self.refresh_interval * 4:
+            self._prune(game_loop)
+        # a unit only carries out the last targeted command it gets, so that one decides for all of them
+        last_targeted: Dict[int, UnitCommand] = {}
+        for action in actions:
+            if action.target is not None and not action.queue:
+                last_targeted[action.unit.tag] = action
+        redundant_tags = {tag for tag, action in last_targeted.items() if self._is_redundant(action, game_loop)}
+
+        filtered = []
+        for action in actions:
+            tag = action.unit.tag
+            if not action.queue:
+                if action.target is None:
+                    if self._is_redundant(action, game_loop):
+                        self.suppressed_count += 1
+                        continue
+                    if action.ability in UNOBSERVED_TOGGLES:
+                        self.last_untargeted_loop[(tag, action.ability)] = game_loop
+                elif tag in redundant_tags:
+                    self.suppressed_count += 1
+                    continue
+            self.last_sent_loop[tag] = game_loop
+            filtered.append(action)
+        self.sent_count += len(filtered)
+        return filtered
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
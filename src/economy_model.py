@@ -0,0 +1,124 @@
+"""Forward model of the zerg economy over the next seconds.
+
+Bank, larva (hatchery spawns and queen injects) and supply cap (overlords and townhalls in progress) are projected
+on a grid of game seconds in a few numpy operations, and the production questions the bot asks every step
+(how many overlords to start, how much the bank floats) are answered from the same arrays.
+Run ``python -m src.economy_model`` for the doctests.
+"""
+import math
+from typing import NamedTuple, Tuple
+
+import numpy as np
+
+# game seconds on faster speed
+LARVA_SPAWN_SECONDS = 11
+INJECT_SECONDS = 29
+INJECT_LARVA = 3
+OVERLORD_SECONDS = 18
+OVERLORD_MINERALS = 100
+OVERLORD_SUPPLY = 8
+HATCHERY_SECONDS = 71
+HATCHERY_SUPPLY = 6
+MAX_SUPPLY = 200
+
+
+class EconomyState(NamedTuple):
+    minerals: float
+    vespene: float
+    # per game second
+    mineral_rate: float
+    vespene_rate: float
+    larva: int
+    hatcheries: int
+    supply_used: float
+    supply_cap: float
+    # seconds until each inject pops its larva
+    inject_times: Tuple[float, ...] = ()
+    # (seconds until done, supply provided) of every overlord and townhall in progress
+    pending_supply: Tuple[Tuple[float, float], ...] = ()
+
+
+class EconomyProjection(object):
+    """
+    The state projected every step seconds up to seconds from now, as if nothing was spent.
+    larva is the larva available by each time when every larva is used as soon as it spawns.
+
+    >>> state = EconomyState(minerals=200, vespene=0, mineral_rate=10, vespene_rate=0, larva=3, hatcheries=2,
+    ...                      supply_used=36, supply_cap=36, inject_times=(5,), pending_supply=((10, 8),))
+    >>> projection = EconomyProjection(state, seconds=30)
+    >>> projection.minerals_at(10), projection.larva_at(12), projection.supply_cap_at(12)
+    (300.0, 8, 44.0)
+    >>> # zergling pairs as fast as the larva and the bank allow outgrow the overlord in progress
+    >>> projection.supply_demand(50, 1).tolist()[::10]
+    [39.0, 42.0, 44.0, 46.0]
+    >>> projection.overlords_needed(50, 1), projection.floating_minerals(50)
+    (1, 0.0)
+    >>> rich = EconomyProjection(state._replace(minerals=1200), seconds=30)
+    >>> rich.overlords_needed(100, 2), rich.floating_minerals(100)
+    (2, 500.0)
+    """
+
+    def __init__(self, state: EconomyState, seconds: float=30, step: float=1):
+        self.state = state
+        self.times = np.arange(0, seconds + step / 2, step, dtype=float)
+        times = self.times
+        self.minerals = state.minerals + state.mineral_rate * times
+        self.vespene = state.vespene + state.vespene_rate * times
+        inject_times = np.asarray(state.inject_times, dtype=float).reshape(-1)
+        injected = (inject_times[:, None] <= times).sum(axis=0) * INJECT_LARVA
+        spawned = state.hatcheries * np.floor(times / LARVA_SPAWN_SECONDS)
+        self.larva = state.larva + spawned.astype(int) + injected
+        pending = np.asarray(state.pending_supply, dtype=float).reshape(-1, 2)
+        provided = ((pending[:, :1] <= times) * pending[:, 1:]).sum(axis=0)
+        self.supply_cap = np.minimum(state.supply_cap + provided, MAX_SUPPLY)
+
+    def _index(self, seconds: float) -> int:
+        return int(np.searchsorted(self.times, min(seconds, self.times[-1]), side='right')) - 1
+
+    def minerals_at(self, seconds: float) -> float:
+        return float(self.minerals[self._index(seconds)])
+
+    def larva_at(self, seconds: float) -> int:
+        return int(self.larva[self._index(seconds)])
+
+    def supply_cap_at(self, seconds: float) -> float:
+        return float(self.supply_cap[self._index(seconds)])
+
+    def _units_made(self, unit_minerals: float, unit_vespene: float, overlords: np.ndarray) -> np.ndarray:
+        """[overlords started now, time]: units made by each time with the larva and bank the overlords leave"""
+        minerals = self.minerals - overlords[:, None] * OVERLORD_MINERALS
+        units = np.minimum(self.larva - overlords[:, None], np.floor(minerals / max(unit_minerals, 1)))
+        if unit_vespene > 0:
+            units = np.minimum(units, np.floor(self.vespene / unit_vespene))
+        return np.maximum(units, 0)
+
+    def supply_demand(self, unit_minerals: float, unit_supply: float, unit_vespene: float=0) -> np.ndarray:
+        """Supply used by each time when every larva the bank pays for becomes a unit of this cost"""
+        units = self._units_made(unit_minerals, unit_vespene, np.zeros(1))[0]
+        return np.minimum(self.state.supply_used + units * unit_supply, MAX_SUPPLY)
+
+    def overlords_needed(self, unit_minerals: float, unit_supply: float, unit_vespene: float=0) -> int:
+        """
+        Fewest overlords to start now so that producing units of this cost with the rest of the larva and bank
+        never runs into the supply cap once they hatch
+        """
+        room = max(0, math.ceil((MAX_SUPPLY - self.supply_cap[-1]) / OVERLORD_SUPPLY))
+        overlords = np.arange(room + 1)
+        demand = self.state.supply_used + self._units_made(unit_minerals, unit_vespene, overlords) * unit_supply
+        hatched = self.times >= OVERLORD_SECONDS
+        cap = self.supply_cap + hatched * overlords[:, None] * OVERLORD_SUPPLY
+        # overlords started now can't lift a block before they hatch, so only the times after are checked
+        blocked = ((demand > cap) & (cap < MAX_SUPPLY) & hatched).any(axis=1)
+        enough = np.flatnonzero(~blocked)
+        return int(enough[0]) if len(enough) else room
+
+    def floating_minerals(self, unit_minerals: float, unit_vespene: float=0, seconds: float=None) -> float:
+        """Bank left seconds from now after every larva the bank pays for became a unit of this cost"""
+        index = len(self.times) - 1 if seconds is None else self._index(seconds)
+        units = self._units_made(unit_minerals, unit_vespene, np.zeros(1))[0, index]
+        return float(self.minerals[index] - units * unit_minerals)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
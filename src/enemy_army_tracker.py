@@ -0,0 +1,168 @@
+import math
+from typing import Iterable, List, Optional, Union
+
+import numpy as np
+from sc2.position import Point2
+
+from src.types import Location
+
+
+def _to_array(location: Location) -> np.ndarray:
+    position = getattr(location, 'position', location)
+    return np.array((position[0], position[1]), dtype=np.float64)
+
+
+class EnemyArmyGroup(object):
+    """One tracked enemy army cluster"""
+
+    def __init__(self, position: np.ndarray, size: int, time: Union[int, float]):
+        self.position = position
+        self.size = size
+        self.first_seen = time
+        self.last_seen = time
+
+    @property
+    def location(self) -> Point2:
+        return Point2((float(self.position[0]), float(self.position[1])))
+
+
+class EnemyArmyTracker(object):
+    """
+    Estimates where the enemy army is.
+    Sighted army centers go into a fixed size ring buffer; the estimate is their time decayed mean,
+    kept as running weighted sums so each update is O(1).
+    Separately, the currently visible enemy units are clustered into groups that are followed between steps,
+    so more than one enemy army can be tracked at a time.
+    """
+
+    def __init__(self, capacity: int=20, half_life: Optional[float]=30, cluster_radius: float=12,
+                 max_groups: int=4, group_timeout: float=30, group_smoothing: float=.5):
+        self.capacity = capacity
+        # decay rate per second, a sample's weight halves every half_life seconds (no decay if None)
+        self.decay_rate = math.log(2) / half_life if half_life else 0
+        self.cluster_radius = cluster_radius
+        self.max_groups = max_groups
+        self.group_timeout = group_timeout
+        self.group_smoothing = group_smoothing
+
+        self.positions = np.zeros((capacity, 2), dtype=np.float64)
+        self.times = np.zeros(capacity, dtype=np.float64)
+        self.count = 0
+        self.next_index = 0
+        self.last_time = 0
+        self.weight_sum = 0.0
+        self.weighted_position_sum = np.zeros(2, dtype=np.float64)
+
+        self.groups: List[EnemyArmyGroup] = []
+
+    def _decay(self, elapsed: float) -> float:
+        return math.exp(-self.decay_rate * elapsed)
+
+    def add(self, location: Location, time: Union[int, float]):
+        """Adds a sighted army center, evicting the oldest one when the buffer is full"""
+        position = _to_array(location)
+        decay = self._decay(time - self.last_time)
+        self.weight_sum *= decay
+        self.weighted_position_sum *= decay
+        if self.count == self.capacity:
+            evicted_weight = self._decay(time - self.times[self.next_index])
+            self.weight_sum -= evicted_weight
+            self.weighted_position_sum -= evicted_weight * self.positions[self.next_index]
+        else:
+            self.count += 1
+        self.positions[self.next_index] = position
+        self.times[self.next_index] = time
+        self.weight_sum += 1
+        self.weighted_position_sum += position
+        self.last_time = time
+        self.next_index = (self.next_index + 1) % self.capacity
+        if self.next_index == 0:
+            # rebuild the sums once per lap so floating point error can't build up
+            weights = np.exp(-self.decay_rate * (time - self.times[:self.count]))
+            self.weight_sum = weights.sum()
+            self.weighted_position_sum = (weights[:, np.newaxis] * self.positions[:self.count]).sum(axis=0)
+
+    @property
+    def estimated_location(self) -> Optional[Point2]:
+        """Time decayed mean of the buffered army centers, None before the first sighting"""
+        if not self.count or self.weight_sum <= 0:
+            return None
+        x, y = self.weighted_position_sum / self.weight_sum
+        return Point2((float(x), float(y)))
+
+    def _cluster(self, positions: np.ndarray) -> List[np.ndarray]:
+        """Greedy clustering, each unassigned unit seeds a cluster of every unassigned unit within cluster_radius"""
+        clusters = []
+        unassigned = np.ones(len(positions), dtype=bool)
+        while unassigned.any():
+            seed = positions[unassigned.argmax()]
+            members = unassigned & (((positions - seed) ** 2).sum(axis=1) < self.cluster_radius ** 2)
+            clusters.append(positions[members])
+            unassigned &= ~members
+        clusters.sort(key=len, reverse=True)
+        return clusters[:self.max_groups]
+
+    def update_groups(self, units: Iterable, time: Union[int, float]):
+        """Matches clusters of the given enemy units to the tracked groups and drops groups not seen recently"""
+        positions = np.array([(u.position.x, u.position.y) for u in units], dtype=np.float64).reshape(-1, 2)
+        for cluster in self._cluster(positions):
+            center = cluster.mean(axis=0)
+            group = self._closest_group(center, max_distance=self.cluster_radius * 2)
+            if group and group.last_seen < time:
+                group.position = group.position * (1 - self.group_smoothing) + center * self.group_smoothing
+                group.size = len(cluster)
+                group.last_seen = time
+            else:
+                self.groups.append(EnemyArmyGroup(center, len(cluster), time))
+        self.expire(time)
+        self.groups.sort(key=lambda group: group.size, reverse=True)
+        del self.groups[self.max_groups:]
+
+    def expire(self, time: Union[int, float]):
+        """
+        Drops the groups not seen for group_timeout seconds, called every step since the groups of an army
+        that left vision get no more sightings
+
+        >>> tracker = EnemyArmyTracker(group_timeout=30)
+        >>> tracker.update_groups([Point2((10, 10)), Point2((11, 10))], 0)
+        >>> tracker.expire(20)
+        >>> len(tracker.groups), tracker.distance_to_closest([Point2((10.5, 14))])
+        (1, 4.0)
+        >>> tracker.expire(30)
+        >>> tracker.groups, tracker.distance_to_closest([Point2((10, 14))])
+        ([], inf)
+        """
+        self.groups = [group for group in self.groups if time - group.last_seen < self.group_timeout]
+
+    def _closest_group(self, position: np.ndarray, max_distance: float=math.inf) -> Optional[EnemyArmyGroup]:
+        closest_group = None
+        closest_distance = max_distance
+        for group in self.groups:
+            distance = float(np.linalg.norm(group.position - position))
+            if distance < closest_distance:
+                closest_group, closest_distance = group, distance
+        return closest_group
+
+    def closest_group(self, location: Location) -> Optional[EnemyArmyGroup]:
+        return self._closest_group(_to_array(location))
+
+    def get_locations(self) -> List[Point2]:
+        """Locations of the tracked groups, or just the estimated location when no group is tracked"""
+        if self.groups:
+            return [group.location for group in self.groups]
+        estimated_location = self.estimated_location
+        return [estimated_location] if estimated_location else []
+
+    def distance_to_closest(self, locations: Iterable[Location]) -> float:
+        """Smallest distance between any of the locations and any tracked group (or the estimate)"""
+        army_positions = np.array([(p.x, p.y) for p in self.get_locations()], dtype=np.float64).reshape(-1, 2)
+        positions = np.array([_to_array(location) for location in locations], dtype=np.float64).reshape(-1, 2)
+        if not len(army_positions) or not len(positions):
+            return math.inf
+        offsets = positions[:, np.newaxis, :] - army_positions[np.newaxis, :, :]
+        return float(np.sqrt((offsets ** 2).sum(axis=2)).min())
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,134 @@
+"""Cooperative scheduler that spreads the bot's subsystems over game steps.
+
+Run ``python -m src.frame_scheduler`` for the doctests.
+"""
+import asyncio
+import inspect
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Collection, ContextManager, Dict, List, Optional
+
+
+@contextmanager
+def _no_section(name: str):
+    yield
+
+
+class ScheduledTask(object):
+    def __init__(self, name: str, run: Callable[[int], Any], interval: int=1, priority: int=0,
+                 cost: float=1.0, urgent: bool=False):
+        self.name = name
+        self.run = run
+        self.interval = max(1, interval)
+        self.priority = priority
+        # estimated milliseconds per run, replaced by a moving average of the measured times
+        self.cost = cost
+        self.urgent = urgent
+        self.last_run_iteration: Optional[int] = None
+
+    def overdue(self, iteration: int) -> float:
+        """How many intervals ago the task became due, 1 when it's due right now, below 1 when it isn't due yet"""
+        if self.last_run_iteration is None:
+            return 1.0
+        return (iteration - self.last_run_iteration) / self.interval
+
+    def __repr__(self):
+        return 'ScheduledTask({!r}, interval={}, priority={}, cost={:.2f})'.format(
+            self.name, self.interval, self.priority, self.cost)
+
+
+class FrameScheduler(object):
+    """
+    Runs the due tasks of a step, highest priority and then most overdue first, skipping the ones that
+    would not fit in the millisecond budget (the first task of a step runs whatever its cost). When the step is urgent (e.g. a base is under attack)
+    the urgent tasks run first on every step regardless of their interval or the budget.
+    A task that has waited max_delay intervals runs even over budget, so nothing starves.
+
+    >>> clock = FakeClock()
+    >>> scheduler = FrameScheduler(budget_ms=10.5, clock=clock)
+    >>> def task(cost):
+    ...     return lambda iteration: clock.advance(cost)
+    >>> scheduler.register('micro_army', task(4), priority=10, cost=4, urgent=True)
+    >>> scheduler.register('distribute_workers', task(5), interval=50, cost=5)
+    >>> scheduler.register('set_rally_points', task(5), interval=50, cost=5)
+    >>> scheduler.register('manage_strategies', task(1), interval=8, cost=1)
+    >>> [asyncio.run(scheduler.run_step(iteration)) for iteration in range(3)]
+    [['micro_army', 'distribute_workers', 'manage_strategies'], ['micro_army', 'set_rally_points'], ['micro_army']]
+    >>> # manage_strategies waited more than max_delay intervals, so it is forced in ahead of distribute_workers
+    >>> asyncio.run(scheduler.run_step(50)), asyncio.run(scheduler.run_step(51))
+    (['micro_army', 'manage_strategies', 'distribute_workers'], ['micro_army', 'set_rally_points'])
+    >>> scheduler.register('build_units', task(8), cost=8)
+    >>> asyncio.run(scheduler.run_step(52, urgent=True)), round(scheduler.last_step_ms, 3)
+    (['micro_army'], 4.0)
+    >>> asyncio.run(scheduler.run_step(53, only={'build_units', 'manage_strategies'}))
+    ['build_units']
+    >>> # a late game micro_army over the whole budget still runs on every step, the rest waits
+    >>> busy = FrameScheduler(budget_ms=20, clock=clock)
+    >>> busy.register('micro_army', task(25), priority=10, cost=25)
+    >>> busy.register('build_units', task(2), cost=2)
+    >>> [asyncio.run(busy.run_step(iteration)) for iteration in range(3)]
+    [['micro_army'], ['micro_army'], ['micro_army']]
+    """
+
+    def __init__(self, budget_ms: float=20, max_delay: float=4, smoothing: float=.2,
+                 clock: Callable[[], float]=time.perf_counter):
+        self.budget_ms = budget_ms
+        self.max_delay = max_delay
+        self.smoothing = smoothing
+        self.clock = clock
+        self.tasks: Dict[str, ScheduledTask] = {}
+        self.deferred_count = 0
+        self.last_step_ms = 0.0
+
+    def register(self, name: str, run: Callable[[int], Any], interval: int=1, priority: int=0,
+                 cost: float=1.0, urgent: bool=False):
+        """run is called with the iteration and may be a coroutine function"""
+        self.tasks[name] = ScheduledTask(name, run, interval=interval, priority=priority, cost=cost, urgent=urgent)
+
+    def _order(self, iteration: int, urgent: bool, only: Optional[Collection[str]]) -> List[ScheduledTask]:
+        tasks = self.tasks.values() if only is None else [task for name, task in self.tasks.items() if name in only]
+        due = [task for task in tasks if (urgent and task.urgent) or task.overdue(iteration) >= 1]
+        return sorted(due, key=lambda task: (urgent and task.urgent, task.priority,
+                                             min(task.overdue(iteration), self.max_delay)), reverse=True)
+
+    async def run_step(self, iteration: int, urgent: bool=False,
+                       section: Callable[[str], ContextManager]=_no_section, only: Optional[Collection[str]]=None) -> List[str]:
+        """Runs the tasks that fit this step (out of the only names, when given), returns their names in the order they ran"""
+        step_start = self.clock()
+        ran = []
+        for task in self._order(iteration, urgent, only):
+            elapsed_ms = (self.clock() - step_start) * 1000
+            # the first task always runs, a top task costlier than the whole budget would otherwise wait max_delay steps
+            forced = not ran or (urgent and task.urgent) or task.overdue(iteration) >= self.max_delay
+            if not forced and elapsed_ms + task.cost > self.budget_ms:
+                self.deferred_count += 1
+                continue
+            task_start = self.clock()
+            with section(task.name):
+                result = task.run(iteration)
+                if inspect.isawaitable(result):
+                    await result
+            task_ms = (self.clock() - task_start) * 1000
+            task.cost += self.smoothing * (task_ms - task.cost)
+            task.last_run_iteration = iteration
+            ran.append(task.name)
+        self.last_step_ms = (self.clock() - step_start) * 1000
+        return ran
+
+
+class FakeClock(object):
+    """Stands in for time.perf_counter in the doctests, advance takes milliseconds"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def advance(self, milliseconds: float):
+        self.now += milliseconds / 1000
+
+    def __call__(self) -> float:
+        return self.now
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
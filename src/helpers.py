@@ -1,7 +1,6 @@
 import os
 import itertools
 import datetime
-from functools import wraps
 from typing import Callable, Union, List, Tuple
 from sc2 import Result
 
@@ -62,18 +61,6 @@ def between(value: Union[int, float], minimum: Union[int, float], maximum: Union
     return minimum < value < maximum
 
 
-def property_cache_forever(f):
-    """Decorator that caches class properties"""
-    f.cached = None
-
-    @wraps(f)
-    def inner(self):
-        if f.cached is None:
-            f.cached = f(self)
-        return f.cached
-    return property(inner)
-
-
 def get_timestamp():
     return datetime.datetime.now().isoformat()
 
@@ -116,6 +103,16 @@ def get_figure_name(game_result: Result) -> str:
     return figure_name
 
 
+def get_profile_directory() -> str:
+    return os.path.join(os.getcwd(), 'profiles')
+
+
+def get_profile_name(game_result: Result) -> str:
+    """Gets a unique name for a step profile."""
+    file_name = '{}_{}.json'.format(game_result.name, get_filesafe_timestamp())
+    return os.path.join(get_profile_directory(), file_name)
+
+
 def make_dir_if_not_exists(dir_name):
     if not os.path.exists(dir_name):
         os.makedirs(dir_name)
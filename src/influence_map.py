@@ -0,0 +1,230 @@
+"""Grid of the enemy dps that can reach each cell of the map, one layer for ground and one for air.
+
+Run ``python -m src.influence_map`` for the doctests.
+"""
+import functools
+import math
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# x, y, ground range, air range, ground dps, air dps
+InfluenceSource = Tuple[float, float, float, float, float, float]
+Position = Tuple[float, float]
+
+
+@functools.lru_cache(maxsize=512)
+def _reach_kernel(reach: float, offset_x: float, offset_y: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Cells within reach of a center offset_x, offset_y into its cell: their x and y offsets
+    and the potential slope, 1 at the center down to 1 / (reach + 1) at the edge
+    """
+    size = int(math.ceil(reach)) + 1
+    cell_x, cell_y = np.mgrid[-size:size + 1, -size:size + 1]
+    distances = np.sqrt((cell_x + .5 - offset_x) ** 2 + (cell_y + .5 - offset_y) ** 2)
+    in_reach = distances <= reach
+    return cell_x[in_reach], cell_y[in_reach], (reach + 1 - distances[in_reach]) / (reach + 1)
+
+
+class InfluenceMap(object):
+    """
+    Enemy units are splatted as discs of their weapon range plus margin. The threat layers hold the summed dps
+    that reaches a cell (point lookups are a single index), the potential layers hold the same discs
+    sloping down towards their edge so their gradient always points out of danger.
+    update only re-splats the units that appeared, moved, changed or disappeared since the previous update,
+    all of them at once with one bincount per layer.
+
+    >>> influence = InfluenceMap(40, 30, margin=1)
+    >>> influence.update({1: (10, 10, 5, 0, 20, 0), 2: (12, 10, 6, 6, 10, 10)})
+    2
+    >>> influence.ground_threat((10.5, 10.5)), influence.air_threat((10.5, 10.5)), influence.ground_threat((30, 25))
+    (30.0, 10.0, 0.0)
+    >>> influence.update({1: (10.2, 10.1, 5, 0, 20, 0)})
+    1
+    >>> influence.ground_threat((12, 10)), influence.air_threat((12, 10))
+    (20.0, 0.0)
+    >>> x, y = influence.safest_position((12, 11))
+    >>> influence.is_threatened((x, y)), x > 12
+    (False, True)
+    >>> clear_x, clear_y = influence.safest_position((12, 11), clearance=3)
+    >>> round(math.hypot(clear_x - x, clear_y - y), 6)
+    3.0
+    >>> # a zergling hitting a hatchery stands past its melee reach of the hatchery's center
+    >>> melee = InfluenceMap(40, 30, margin=2)
+    >>> melee.update({3: (23.7, 20.5, .1 + .375, 0, 10, 0)})
+    1
+    >>> melee.ground_threat((20.5, 20.5)), melee.ground_threat((20.5, 20.5), target_radius=2.75)
+    (0.0, 10.0)
+    >>> influence.update({}), float(influence.ground.max()), float(influence.ground_potential.max())
+    (1, 0.0, 0.0)
+    """
+
+    def __init__(self, width: int, height: int, margin: float=2):
+        self.width = int(width)
+        self.height = int(height)
+        self.margin = margin
+        size = self.width * self.height
+        # flat layers for bincount, the 2d views below index them by [x, y]
+        self._threats = (np.zeros(size), np.zeros(size))
+        self._potentials = (np.zeros(size), np.zeros(size))
+        self.ground, self.air = (layer.reshape(self.width, self.height) for layer in self._threats)
+        self.ground_potential, self.air_potential = (layer.reshape(self.width, self.height) for layer in self._potentials)
+        # tag: (quantized source, ground splat, air splat), kept so a splat can be subtracted when the unit moves or dies
+        self._splats: Dict[int, tuple] = {}
+        self._gradients: Dict[bool, Tuple[np.ndarray, np.ndarray]] = {}
+
+    @staticmethod
+    def _quantize(source: InfluenceSource) -> tuple:
+        # half a cell of movement is not worth a re-splat
+        x, y, *weapons = source
+        return (round(x * 2), round(y * 2), *weapons)
+
+    def _splat(self, x: float, y: float, weapon_range: float, dps: float) -> Optional[tuple]:
+        """(flat cell indices, dps, potential slopes) of one layer, None without dps"""
+        if not dps:
+            return None
+        cell_x, cell_y = int(math.floor(x)), int(math.floor(y))
+        reach = weapon_range + self.margin
+        offsets_x, offsets_y, slopes = _reach_kernel(reach, x - cell_x, y - cell_y)
+        xs, ys = offsets_x + cell_x, offsets_y + cell_y
+        size = int(math.ceil(reach)) + 1
+        if not (size <= cell_x < self.width - size and size <= cell_y < self.height - size):
+            on_map = (xs >= 0) & (xs < self.width) & (ys >= 0) & (ys < self.height)
+            xs, ys, slopes = xs[on_map], ys[on_map], slopes[on_map]
+        return xs * self.height + ys, float(dps), slopes
+
+    def _splats_of(self, source: InfluenceSource) -> Tuple[Optional[tuple], Optional[tuple]]:
+        x, y, ground_range, air_range, ground_dps, air_dps = source
+        # centers snap to the half cell grid of _quantize, so the kernels are shared
+        x = min(self.width - .5, max(0.0, round(x * 2) / 2))
+        y = min(self.height - .5, max(0.0, round(y * 2) / 2))
+        return self._splat(x, y, ground_range, ground_dps), self._splat(x, y, air_range, air_dps)
+
+    def _apply(self, layer: int, changes: List[Tuple[float, tuple]]):
+        """Adds (sign, splat) changes to one layer (0 ground, 1 air) in one pass"""
+        if not changes:
+            return
+        indices = np.concatenate([splat[0] for _, splat in changes])
+        lengths = [len(splat[0]) for _, splat in changes]
+        dps = np.repeat([sign * splat[1] for sign, splat in changes], lengths)
+        slopes = np.concatenate([splat[2] for _, splat in changes])
+        size = self.width * self.height
+        threats, potentials = self._threats[layer], self._potentials[layer]
+        threats += np.bincount(indices, weights=dps, minlength=size)
+        potentials += np.bincount(indices, weights=dps * slopes, minlength=size)
+        if any(sign < 0 for sign, _ in changes):
+            # removing splats leaves float dust behind, nothing below it is a real threat
+            for values in (threats, potentials):
+                dust = indices[values[indices] < 1e-9]
+                values[dust] = 0
+
+    def update(self, sources: Dict[int, InfluenceSource]) -> int:
+        """Brings the layers to the given sources (by unit tag), returns how many sources were re-splatted"""
+        changes: Tuple[List, List] = ([], [])
+        changed = 0
+        for tag in [tag for tag in self._splats if tag not in sources]:
+            _, *splats = self._splats.pop(tag)
+            for layer, splat in enumerate(splats):
+                if splat is not None:
+                    changes[layer].append((-1, splat))
+            changed += 1
+        for tag, source in sources.items():
+            key = self._quantize(source)
+            previous = self._splats.get(tag)
+            if previous is not None:
+                if previous[0] == key:
+                    continue
+                for layer, splat in enumerate(previous[1:]):
+                    if splat is not None:
+                        changes[layer].append((-1, splat))
+            splats = self._splats_of(source)
+            for layer, splat in enumerate(splats):
+                if splat is not None:
+                    changes[layer].append((1, splat))
+            self._splats[tag] = (key, *splats)
+            changed += 1
+        for layer in (0, 1):
+            self._apply(layer, changes[layer])
+        if changed:
+            self._gradients.clear()
+        return changed
+
+    def _cell(self, position: Position) -> Tuple[int, int]:
+        return min(self.width - 1, max(0, int(position[0]))), min(self.height - 1, max(0, int(position[1])))
+
+    def _lookup(self, layer: np.ndarray, position: Position, target_radius: float) -> float:
+        """The layer at the position's cell, or its highest value over a target of target_radius around it"""
+        if target_radius <= 0:
+            return float(layer[self._cell(position)])
+        cell_x, cell_y = self._cell(position)
+        offsets_x, offsets_y, _ = _reach_kernel(float(target_radius), position[0] - cell_x, position[1] - cell_y)
+        xs, ys = offsets_x + cell_x, offsets_y + cell_y
+        on_map = (xs >= 0) & (xs < self.width) & (ys >= 0) & (ys < self.height)
+        return float(layer[xs[on_map], ys[on_map]].max(initial=0))
+
+    def ground_threat(self, position: Position, target_radius: float=0) -> float:
+        return self._lookup(self.ground, position, target_radius)
+
+    def air_threat(self, position: Position, target_radius: float=0) -> float:
+        return self._lookup(self.air, position, target_radius)
+
+    def threat(self, position: Position, is_flying: bool=False, target_radius: float=0) -> float:
+        """
+        Enemy dps that can hit a unit at the position, for a large target like a townhall anywhere on its footprint
+        of target_radius, where melee attackers reach it from its edge
+        """
+        return self.air_threat(position, target_radius) if is_flying else self.ground_threat(position, target_radius)
+
+    def is_threatened(self, position: Position, is_flying: bool=False) -> bool:
+        return self.threat(position, is_flying) > 0
+
+    def _gradient(self, is_flying: bool) -> Tuple[np.ndarray, np.ndarray]:
+        if is_flying not in self._gradients:
+            self._gradients[is_flying] = np.gradient(self.air_potential if is_flying else self.ground_potential)
+        return self._gradients[is_flying]
+
+    def safest_position(self, position: Position, is_flying: bool=False, max_steps: int=20, step: float=1,
+                        clearance: int=0, fallback: Optional[Position]=None) -> Position:
+        """
+        Follows the potential downhill until out of reach of every threat (or max_steps),
+        then keeps going the same way for clearance more steps.
+        fallback gives the direction to take where the potential is flat, like on top of a lone enemy.
+        """
+        x, y = float(position[0]), float(position[1])
+        gradient_x, gradient_y = self._gradient(is_flying)
+        potential = self.air_potential if is_flying else self.ground_potential
+        direction_x = direction_y = 0.0
+        steps_left = clearance
+        for _ in range(max_steps + clearance):
+            cell = self._cell((x, y))
+            if potential[cell] > 0:
+                direction_x, direction_y = -gradient_x[cell], -gradient_y[cell]
+                if not direction_x and not direction_y and fallback is not None:
+                    direction_x, direction_y = fallback[0] - x, fallback[1] - y
+            elif steps_left:
+                steps_left -= 1
+            else:
+                break
+            norm = math.hypot(direction_x, direction_y)
+            if not norm:
+                break
+            x = min(self.width - 1, max(0.0, x + direction_x / norm * step))
+            y = min(self.height - 1, max(0.0, y + direction_y / norm * step))
+        return float(x), float(y)
+
+
+def get_influence_sources(units: Iterable) -> Dict[int, InfluenceSource]:
+    """Sources of the units that can attack, ranges measured from the unit's edge"""
+    sources = {}
+    for unit in units:
+        ground_dps, air_dps = unit.ground_dps, unit.air_dps
+        if ground_dps or air_dps:
+            position = unit.position
+            sources[unit.tag] = (position[0], position[1], unit.ground_range + unit.radius, unit.air_range + unit.radius,
+                                 ground_dps, air_dps)
+    return sources
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
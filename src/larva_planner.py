@@ -0,0 +1,78 @@
+"""Allocation of a step's larva to the army composition.
+
+Every available larva is assigned in one go: each unit takes larva in proportion to its weight
+(highest weight / (allocated + 1) first, like seats in a D'Hondt apportionment) while the bank and the supply allow it.
+Run ``python -m src.larva_planner`` for the doctests.
+"""
+import random
+from typing import Any, Dict, List, NamedTuple, Optional
+
+
+class ProductionOption(NamedTuple):
+    unit_type: Any
+    weight: float
+    minerals: int
+    vespene: int
+    supply: float
+
+
+def _fits(option: ProductionOption, minerals: float, vespene: float, supply_left: float) -> bool:
+    return option.minerals <= minerals and option.vespene <= vespene and option.supply <= supply_left
+
+
+def plan_larva_production(options: List[ProductionOption], larva: int, minerals: float, vespene: float,
+                          supply_left: float, mineral_rate: float=0, vespene_rate: float=0, save_seconds: float=0,
+                          rng: Optional[random.Random]=None) -> List[Any]:
+    """
+    Unit types to train, one per larva used. When the highest weighted unit can't be afforded yet but the income
+    pays for it within save_seconds, its cost is kept aside instead of being spent on cheaper units.
+    Without rng the plan is deterministic; with it the weights are jittered so compositions vary between games.
+
+    >>> ZERGLING = ProductionOption('zergling', .9, 50, 0, 1)
+    >>> ROACH = ProductionOption('roach', .3, 75, 25, 2)
+    >>> MUTALISK = ProductionOption('mutalisk', 1.2, 100, 100, 2)
+    >>> plan_larva_production([ZERGLING, ROACH], larva=5, minerals=400, vespene=50, supply_left=20)
+    ['zergling', 'zergling', 'zergling', 'roach', 'zergling']
+    >>> plan_larva_production([ZERGLING, ROACH], larva=5, minerals=400, vespene=50, supply_left=3)
+    ['zergling', 'zergling', 'zergling']
+    >>> # a mutalisk is 40 gas short, the income covers that within 10 seconds so its cost is kept aside
+    >>> plan_larva_production([ZERGLING, MUTALISK], larva=3, minerals=90, vespene=60, supply_left=20,
+    ...                       mineral_rate=8, vespene_rate=4, save_seconds=10)
+    []
+    >>> plan_larva_production([ZERGLING, MUTALISK], larva=3, minerals=150, vespene=60, supply_left=20,
+    ...                       mineral_rate=8, vespene_rate=4, save_seconds=10)
+    ['zergling']
+    >>> len(plan_larva_production([ZERGLING, ROACH], larva=5, minerals=400, vespene=50, supply_left=20, rng=random.Random(1)))
+    5
+    """
+    if rng is not None:
+        options = [option._replace(weight=option.weight * rng.uniform(.5, 1.5)) for option in options]
+    options = [option for option in options if option.weight > 0]
+    if not options or larva <= 0:
+        return []
+    favorite = max(options, key=lambda option: option.weight)
+    if not _fits(favorite, minerals, vespene, supply_left) and favorite.supply <= supply_left:
+        mineral_seconds = (favorite.minerals - minerals) / mineral_rate if mineral_rate > 0 else float('inf')
+        vespene_seconds = (favorite.vespene - vespene) / vespene_rate if vespene_rate > 0 else float('inf')
+        if max(mineral_seconds if favorite.minerals > minerals else 0,
+               vespene_seconds if favorite.vespene > vespene else 0) <= save_seconds:
+            minerals -= min(minerals, favorite.minerals)
+            vespene -= min(vespene, favorite.vespene)
+    allocated: Dict[Any, int] = {option.unit_type: 0 for option in options}
+    plan = []
+    while len(plan) < larva:
+        affordable = [option for option in options if _fits(option, minerals, vespene, supply_left)]
+        if not affordable:
+            break
+        option = max(affordable, key=lambda option: option.weight / (allocated[option.unit_type] + 1))
+        allocated[option.unit_type] += 1
+        minerals -= option.minerals
+        vespene -= option.vespene
+        supply_left -= option.supply
+        plan.append(option.unit_type)
+    return plan
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
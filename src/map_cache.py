@@ -0,0 +1,296 @@
+"""On-disk cache of the map analysis that only depends on the map.
+
+Expansion locations, ramps, chokes, ground distances from every start location and the potential enemy expansions
+are computed once per map and stored in a compressed numpy file named after the map and a hash of its grids,
+so a changed map gets a new file and the stale one is removed.
+Run ``python -m src.map_cache`` for the doctests.
+"""
+import glob
+import hashlib
+import math
+import os
+import re
+import tempfile
+import zipfile
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from sc2.bot_ai import BotAI
+from sc2.game_info import Ramp
+from sc2.position import Point2
+
+import src.bot_logger as bot_logger
+from src.placement_planner import pixel_map_to_array
+
+# bump when the analysis or the file layout changes, older files are then ignored
+MAP_CACHE_VERSION = 1
+
+Position = Tuple[float, float]
+
+_MOVES = [(1, 0, 1.0), (-1, 0, 1.0), (0, 1, 1.0), (0, -1, 1.0),
+          (1, 1, math.sqrt(2)), (1, -1, math.sqrt(2)), (-1, 1, math.sqrt(2)), (-1, -1, math.sqrt(2))]
+
+
+def get_map_cache_directory() -> str:
+    return os.path.join(os.getcwd(), 'map_cache')
+
+
+def get_grid_hash(*grids: bytes) -> str:
+    """
+    >>> get_grid_hash(b'ab', b'c') == get_grid_hash(b'ab', b'c'), get_grid_hash(b'ab', b'c') == get_grid_hash(b'a', b'bc')
+    (True, False)
+    """
+    digest = hashlib.sha1(str(MAP_CACHE_VERSION).encode())
+    for grid in grids:
+        digest.update(len(grid).to_bytes(8, 'little'))
+        digest.update(grid)
+    return digest.hexdigest()[:16]
+
+
+def get_map_cache_path(directory: str, map_name: str, grid_hash: str) -> str:
+    """
+    >>> os.path.basename(get_map_cache_path('map_cache', 'Abyssal Reef LE', '0123'))
+    'Abyssal_Reef_LE_0123.npz'
+    """
+    return os.path.join(directory, '{}_{}.npz'.format(re.sub(r'\W+', '_', map_name), grid_hash))
+
+
+def ground_distance_field(pathable: np.ndarray, start: Position) -> np.ndarray:
+    """
+    Walking distance of every cell (indexed by [x, y]) from start, with diagonal moves, inf where unreachable.
+    The start cell counts as pathable since it's usually covered by a townhall.
+
+    >>> pathable = np.ones((6, 5), dtype=bool)
+    >>> pathable[2, :4] = False
+    >>> distances = ground_distance_field(pathable, (0.5, 0.5))
+    >>> float(distances[0, 0]), round(float(distances[4, 0]), 3), float(distances[2, 0])
+    (0.0, 9.657, inf)
+    """
+    distances = np.full(pathable.shape, np.inf)
+    start_cell = min(pathable.shape[0] - 1, max(0, int(start[0]))), min(pathable.shape[1] - 1, max(0, int(start[1])))
+    distances[start_cell] = 0
+    walls = ~pathable
+    walls[start_cell] = False
+    while True:
+        relaxed = distances.copy()
+        for dx, dy, cost in _MOVES:
+            # relaxed[x, y] = min(relaxed[x, y], distances[x - dx, y - dy] + cost)
+            target = relaxed[max(dx, 0):relaxed.shape[0] + min(dx, 0), max(dy, 0):relaxed.shape[1] + min(dy, 0)]
+            source = distances[max(-dx, 0):distances.shape[0] + min(-dx, 0), max(-dy, 0):distances.shape[1] + min(-dy, 0)]
+            np.minimum(target, source + cost, out=target)
+        relaxed[walls] = np.inf
+        if np.array_equal(relaxed, distances):
+            return distances
+        distances = relaxed
+
+
+class MapAnalysis(object):
+    """
+    Everything about a map that doesn't change during a game. Start locations are sorted, so the analysis is the same
+    whichever location the bot spawns at; ground_distances holds one distance field per start location.
+
+    >>> import tempfile
+    >>> analysis = MapAnalysis('Test', 'abc', start_locations=[(1.5, 1.5), (8.5, 1.5)],
+    ...                        expansion_locations=[(2.5, 3.5), (7.5, 3.5), (4.5, 3.5)],
+    ...                        ground_distances=np.stack([ground_distance_field(np.ones((10, 5), dtype=bool), start)
+    ...                                                   for start in [(1.5, 1.5), (8.5, 1.5)]]))
+    >>> analysis.potential_enemy_expansions((1.5, 1.5), (8.5, 1.5))
+    [(7.5, 3.5)]
+    >>> round(analysis.ground_distance((8.5, 1.5), (1.5, 4.5)), 3)
+    8.243
+    >>> analysis.expansions_by_ground((1.5, 1.5))
+    [(2.5, 3.5), (4.5, 3.5), (7.5, 3.5)]
+    >>> with tempfile.TemporaryDirectory() as directory:
+    ...     path = analysis.save(directory)
+    ...     loaded = MapAnalysis.load(path)
+    >>> loaded.map_name, loaded.expansion_locations, loaded.ground_distances.shape
+    ('Test', [(2.5, 3.5), (7.5, 3.5), (4.5, 3.5)], (2, 10, 5))
+    """
+
+    def __init__(self, map_name: str, grid_hash: str, start_locations: Sequence[Position],
+                 expansion_locations: Sequence[Position], ground_distances: np.ndarray,
+                 ramp_points: Sequence[np.ndarray]=(), chokes: Sequence[Position]=(),
+                 enemy_expansions: Optional[np.ndarray]=None):
+        self.map_name = map_name
+        self.grid_hash = grid_hash
+        self.start_locations: List[Position] = sorted(tuple(map(float, location)) for location in start_locations)
+        self.expansion_locations: List[Position] = [tuple(map(float, location)) for location in expansion_locations]
+        self.ground_distances = np.asarray(ground_distances, dtype=np.float32)
+        # integer (x, y) cells of every ramp
+        self.ramp_points = [np.asarray(points, dtype=np.int32).reshape(-1, 2) for points in ramp_points]
+        self.chokes: List[Position] = [tuple(map(float, choke)) for choke in chokes]
+        if enemy_expansions is None:
+            enemy_expansions = self._find_enemy_expansions()
+        # [own start index, enemy start index, expansion index]
+        self.enemy_expansions = np.asarray(enemy_expansions, dtype=bool)
+        # [start index]: the expansions reachable by ground from the start location, shortest walk first
+        self.expansion_order: List[List[Position]] = [self._find_expansion_order(start_index)
+                                                      for start_index in range(len(self.start_locations))]
+
+    def _find_enemy_expansions(self) -> np.ndarray:
+        """The expansions a shorter walk away from the enemy start than from our own (straight line when unreachable)"""
+        count = len(self.start_locations)
+        enemy_expansions = np.zeros((count, count, len(self.expansion_locations)), dtype=bool)
+        for own in range(count):
+            for enemy in range(count):
+                for index, location in enumerate(self.expansion_locations):
+                    own_distance = self._distance_from(own, location)
+                    enemy_distance = self._distance_from(enemy, location)
+                    enemy_expansions[own, enemy, index] = enemy_distance < own_distance
+        return enemy_expansions
+
+    def _find_expansion_order(self, start_index: int) -> List[Position]:
+        distances = [(self._walking_distance(start_index, location), location) for location in self.expansion_locations]
+        return [location for distance, location in sorted(distances) if not math.isinf(distance)]
+
+    def _walking_distance(self, start_index: int, position: Position) -> float:
+        """inf where the map has no path"""
+        width, height = self.ground_distances.shape[1:]
+        return float(self.ground_distances[start_index, min(width - 1, max(0, int(position[0]))),
+                                           min(height - 1, max(0, int(position[1])))])
+
+    def _distance_from(self, start_index: int, position: Position) -> float:
+        distance = self._walking_distance(start_index, position)
+        if math.isinf(distance):
+            start = self.start_locations[start_index]
+            return math.hypot(position[0] - start[0], position[1] - start[1])
+        return distance
+
+    def start_index(self, start_location: Position) -> int:
+        return min(range(len(self.start_locations)), key=lambda index: math.hypot(
+            self.start_locations[index][0] - start_location[0], self.start_locations[index][1] - start_location[1]))
+
+    def ground_distance(self, start_location: Position, position: Position) -> float:
+        """Walking distance from a start location, the straight line distance where the map has no path"""
+        return self._distance_from(self.start_index(start_location), position)
+
+    def closest_by_ground(self, start_location: Position, positions: Iterable[Position]):
+        """The position with the shortest walk from a start location"""
+        start_index = self.start_index(start_location)
+        return min(positions, key=lambda position: self._distance_from(start_index, position), default=None)
+
+    def expansions_by_ground(self, start_location: Position) -> List[Position]:
+        """The expansions a worker can walk to from a start location, shortest walk first"""
+        return self.expansion_order[self.start_index(start_location)]
+
+    def potential_enemy_expansions(self, start_location: Position, enemy_start_location: Position) -> List[Position]:
+        own, enemy = self.start_index(start_location), self.start_index(enemy_start_location)
+        return [location for location, is_enemy in zip(self.expansion_locations, self.enemy_expansions[own, enemy])
+                if is_enemy]
+
+    def get_ramps(self, game_info) -> List[Ramp]:
+        return [Ramp({Point2((int(x), int(y))) for x, y in points}, game_info) for points in self.ramp_points]
+
+    def save(self, directory: str) -> str:
+        """Writes the analysis, replacing the files of older versions of the same map, returns the path"""
+        os.makedirs(directory, exist_ok=True)
+        path = get_map_cache_path(directory, self.map_name, self.grid_hash)
+        # written aside under a name of this process and moved in place, so games analyzing the same map at once
+        # never write the same file or read half a file
+        handle, temporary_path = tempfile.mkstemp(suffix='.npz', dir=directory)
+        os.close(handle)
+        try:
+            self._write(temporary_path)
+            os.replace(temporary_path, path)
+        except BaseException:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+            raise
+        prefix, suffix = get_map_cache_path(directory, self.map_name, '*').split('*')
+        for stale_path in glob.glob(prefix + '*' + suffix):
+            # only files of this map, whose name continues with a hash and not with a longer map name
+            if stale_path != path and re.fullmatch('[0-9a-f]{16}', stale_path[len(prefix):-len(suffix)]):
+                try:
+                    os.remove(stale_path)
+                except FileNotFoundError:
+                    # another game removed it first
+                    pass
+        return path
+
+    def _write(self, path: str):
+        ramp_sizes = [len(points) for points in self.ramp_points]
+        np.savez_compressed(
+            path,
+            version=MAP_CACHE_VERSION,
+            map_name=self.map_name,
+            grid_hash=self.grid_hash,
+            start_locations=np.array(self.start_locations, dtype=float).reshape(-1, 2),
+            expansion_locations=np.array(self.expansion_locations, dtype=float).reshape(-1, 2),
+            ground_distances=self.ground_distances,
+            ramp_points=np.concatenate(self.ramp_points) if self.ramp_points else np.zeros((0, 2), dtype=np.int32),
+            ramp_sizes=np.array(ramp_sizes, dtype=np.int32),
+            chokes=np.array(self.chokes, dtype=float).reshape(-1, 2),
+            enemy_expansions=self.enemy_expansions)
+
+    @classmethod
+    def load(cls, path: str) -> Optional['MapAnalysis']:
+        """
+        The analysis stored at path, None when there is none, it was written by another MAP_CACHE_VERSION
+        or it can't be read (a damaged file is then analyzed and written again)
+
+        >>> with tempfile.TemporaryDirectory() as directory:
+        ...     path = os.path.join(directory, 'Test_0123456789abcdef.npz')
+        ...     with open(path, 'wb') as damaged:
+        ...         _ = damaged.write(b'PK not a zip')
+        ...     MapAnalysis.load(path) is None
+        True
+        """
+        if not os.path.exists(path):
+            return None
+        try:
+            return cls._read(path)
+        except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile):
+            return None
+
+    @classmethod
+    def _read(cls, path: str) -> Optional['MapAnalysis']:
+        with np.load(path) as data:
+            if int(data['version']) != MAP_CACHE_VERSION:
+                return None
+            ramp_points = np.split(data['ramp_points'], np.cumsum(data['ramp_sizes'])[:-1]) if len(data['ramp_sizes']) else []
+            return cls(str(data['map_name']), str(data['grid_hash']), data['start_locations'].tolist(),
+                       data['expansion_locations'].tolist(), data['ground_distances'], ramp_points=ramp_points,
+                       chokes=data['chokes'].tolist(), enemy_expansions=data['enemy_expansions'])
+
+
+def get_game_info_hash(game_info) -> str:
+    """Hash of the grids that don't change with the spawn location or during the game"""
+    map_size = game_info.map_size
+    return get_grid_hash('{}x{}'.format(map_size.width, map_size.height).encode(),
+                         bytes(game_info.placement_grid.data), bytes(game_info.terrain_height.data))
+
+
+def load_map_analysis(game_info, directory: Optional[str]=None) -> Optional[MapAnalysis]:
+    """The cached analysis of the game's map, needs only the game info so it can run in on_start"""
+    path = get_map_cache_path(directory or get_map_cache_directory(), game_info.map_name, get_game_info_hash(game_info))
+    return MapAnalysis.load(path)
+
+
+def analyze_map(bot, directory: Optional[str]=None) -> MapAnalysis:
+    """Computes the analysis from the first observation of a game and stores it in the cache"""
+    game_info = bot.game_info
+    pathable = (pixel_map_to_array(game_info.pathing_grid) > 0) | (pixel_map_to_array(game_info.placement_grid) > 0)
+    start_locations = sorted(tuple(location) for location in [bot.start_location, *bot.enemy_start_locations])
+    # the bot's own expansion_locations may read this analysis, and the cached base class property would
+    # keep the locations of the first map played in the process, so the base class search runs directly
+    expansion_locations = BotAI.expansion_locations.fget.__wrapped__(bot)
+    ramps = game_info.map_ramps if game_info.map_ramps is not None else game_info._find_ramps()
+    analysis = MapAnalysis(
+        game_info.map_name, get_game_info_hash(game_info), start_locations,
+        expansion_locations=[tuple(location) for location in expansion_locations],
+        ground_distances=np.stack([ground_distance_field(pathable, location) for location in start_locations]),
+        ramp_points=[[(point.x, point.y) for point in ramp.points] for ramp in ramps],
+        # the bottoms of the ramps are where armies walking between levels squeeze through
+        chokes=[tuple(ramp.bottom_center) for ramp in ramps])
+    try:
+        analysis.save(directory or get_map_cache_directory())
+    except OSError as error:
+        # the analysis is still good for this game, the next one analyzes the map again
+        bot_logger.log_action(bot, 'could not write the map cache: {}'.format(error))
+    return analysis
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
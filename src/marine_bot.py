@@ -5,9 +5,12 @@ import sc2
 from sc2.constants import AbilityId, COMMANDCENTER, BARRACKS, SCV, MARINE, BARRACKS, SUPPLYDEPOT, MORPH_SUPPLYDEPOT_LOWER, BUNKER, REFINERY
 from typing import List
 
+from src.action_buffer import BufferedActionsBot
 
-class MarineBot(sc2.BotAI):
+
+class MarineBot(BufferedActionsBot):
     def __init__(self):
+        super().__init__()
         self.built_bunker = False
 
     @property
@@ -43,7 +46,7 @@ class MarineBot(sc2.BotAI):
         self.built_barracks = False
         self.built_bunker = False
 
-    async def on_step(self, iteration):
+    async def on_game_step(self, iteration):
         cc = self.units(COMMANDCENTER)
         if not cc.ready.exists:
             return
@@ -0,0 +1,120 @@
+"""Runs independent games in a pool of worker processes.
+
+Nothing here imports sc2, the game itself is played by whatever function is passed in,
+so the scheduling can be exercised with a fake game (see the doctests, ``python -m src.match_runner``).
+"""
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Optional, Tuple
+
+Match = Tuple[Hashable, Dict[str, Any]]
+
+
+class MatchResult(object):
+    """Outcome of one match, error is set instead of result when the game raised"""
+
+    def __init__(self, key: Hashable, index: int, result: Any=None, error: Optional[BaseException]=None):
+        self.key = key
+        self.index = index
+        self.result = result
+        self.error = error
+
+    @property
+    def crashed(self) -> bool:
+        return self.error is not None
+
+    def __repr__(self):
+        outcome = 'error={!r}'.format(self.error) if self.crashed else 'result={!r}'.format(self.result)
+        return 'MatchResult(key={!r}, index={}, {})'.format(self.key, self.index, outcome)
+
+
+def _play(play_game: Callable[..., Any], start_delay: float, kwargs: Dict[str, Any]) -> Any:
+    # staggers the first games so the game clients don't all launch (and pick ports) at the same moment
+    if start_delay:
+        time.sleep(start_delay)
+    return play_game(**kwargs)
+
+
+def run_matches(play_game: Callable[..., Any], matches: List[Match], workers: int=1,
+                start_delay: float=2, max_retries: int=1) -> Iterator[MatchResult]:
+    """
+    Plays every (key, kwargs) match with play_game(**kwargs) and yields the results as games finish.
+    With more than one worker each game runs in its own process (so its own game client and port).
+    A game that raises only fails its own match; if a worker process dies, the pool is rebuilt
+    and the matches that were lost with it are retried up to max_retries times.
+    play_game must be picklable (a module level function) when workers > 1.
+
+    >>> results = list(run_matches(_fake_game, [('a', {'result': 'Victory'}), ('b', {'result': 'Defeat', 'crash': True})]))
+    >>> results
+    [MatchResult(key='a', index=0, result='Victory'), MatchResult(key='b', index=1, error=RuntimeError('game crashed'))]
+    >>> matches = [(i % 2, {'result': 'Victory' if i % 3 else 'Defeat', 'duration': .01 * (5 - i)}) for i in range(5)]
+    >>> results = sorted(run_matches(_fake_game, matches, workers=3, start_delay=0), key=lambda r: r.index)
+    >>> [(r.key, r.result) for r in results]
+    [(0, 'Defeat'), (1, 'Victory'), (0, 'Victory'), (1, 'Defeat'), (0, 'Victory')]
+    >>> results = sorted(run_matches(_fake_game, [(None, {'exit': True}), (None, {})], workers=2, start_delay=0, max_retries=0), key=lambda r: r.index)
+    >>> [r.index for r in results], results[0].crashed
+    ([0, 1], True)
+    """
+    if workers <= 1:
+        for index, (key, kwargs) in enumerate(matches):
+            try:
+                yield MatchResult(key, index, result=play_game(**kwargs))
+            except Exception as error:
+                yield MatchResult(key, index, error=error)
+        return
+
+    pending = [(index, key, kwargs, 0) for index, (key, kwargs) in enumerate(matches)]
+    while pending:
+        lost = []
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                pool.submit(_play, play_game, start_delay * slot if slot < workers else 0, kwargs): (index, key, kwargs, attempt)
+                for slot, (index, key, kwargs, attempt) in enumerate(pending)
+            }
+            for future in as_completed(futures):
+                index, key, kwargs, attempt = futures[future]
+                try:
+                    yield MatchResult(key, index, result=future.result())
+                except BrokenProcessPool as error:
+                    if attempt < max_retries:
+                        lost.append((index, key, kwargs, attempt + 1))
+                    else:
+                        yield MatchResult(key, index, error=error)
+                except Exception as error:
+                    yield MatchResult(key, index, error=error)
+        pending = sorted(lost, key=lambda match: match[0])
+
+
+def summarize_record(results: List[MatchResult], get_game_result: Callable[[Any], Any]=lambda result: result) -> Tuple[List[Any], int, int]:
+    """
+    Aggregates finished matches the same way test_bot does: (record, victory_count, defeat_count).
+    The record is in match order and leaves out crashed games.
+    get_game_result picks the game result out of what the game function returned.
+
+    >>> summarize_record([MatchResult(None, 1, 'Defeat'), MatchResult(None, 0, 'Victory'), MatchResult(None, 2, error=ValueError())])
+    (['Victory', 'Defeat'], 1, 1)
+    >>> summarize_record([MatchResult(None, 0, {'result': 'Victory'})], get_game_result=lambda summary: summary['result'])
+    (['Victory'], 1, 0)
+    """
+    record = [get_game_result(result.result) for result in sorted(results, key=lambda result: result.index) if not result.crashed]
+    victory_count = sum(map(lambda x: getattr(x, 'name', x) == 'Victory', record))
+    defeat_count = len(record) - victory_count
+    return record, victory_count, defeat_count
+
+
+def _fake_game(result: str='Victory', duration: float=0, crash: bool=False, exit: bool=False) -> str:
+    """Stands in for a game in the doctests"""
+    time.sleep(duration)
+    if exit:
+        # kills the worker process like a hard crash would
+        import os
+        os._exit(1)
+    if crash:
+        raise RuntimeError('game crashed')
+    return result
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
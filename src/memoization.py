@@ -0,0 +1,210 @@
+"""Per-instance memoization of bot properties and methods.
+
+Caches live on the instance they were computed for, so nothing leaks between games, bots or maps running
+in the same process. Each cache has a scope saying how long a value stays valid: the whole game (the
+instance's lifetime), one game step or a number of game seconds.
+Run ``python -m src.memoization`` for the doctests.
+"""
+import functools
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+_CACHES_ATTRIBUTE = '_memo_caches'
+
+
+class MemoScope(object):
+    """Valid for the instance's lifetime, subclasses stamp entries and tell when a stamp went stale"""
+
+    # True when every entry goes stale at the same time, so a stale entry means the whole cache can be dropped
+    expires_together = True
+
+    def stamp(self, instance: Any) -> Hashable:
+        return None
+
+    def is_fresh(self, stamp: Hashable, now: Hashable) -> bool:
+        return True
+
+    def __repr__(self):
+        return 'GAME'
+
+
+class StepScope(MemoScope):
+    """Valid for the game loop the value was computed on"""
+
+    def stamp(self, instance: Any) -> Hashable:
+        return instance.state.game_loop
+
+    def is_fresh(self, stamp: Hashable, now: Hashable) -> bool:
+        return stamp == now
+
+    def __repr__(self):
+        return 'STEP'
+
+
+class SecondsScope(MemoScope):
+    """Valid for a number of game seconds after the value was computed"""
+
+    expires_together = False
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+
+    def stamp(self, instance: Any) -> Hashable:
+        return instance.time
+
+    def is_fresh(self, stamp: Hashable, now: Hashable) -> bool:
+        return now - stamp < self.seconds
+
+    def __repr__(self):
+        return 'SECONDS({:g})'.format(self.seconds)
+
+
+GAME = MemoScope()
+STEP = StepScope()
+
+
+class MemoCache(object):
+    """Entries of one memoized function on one instance, least recently used ones are evicted past max_size"""
+
+    def __init__(self, scope: MemoScope, max_size: Optional[int]=None):
+        self.scope = scope
+        self.max_size = max_size
+        self.entries: 'OrderedDict[Hashable, tuple]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, instance: Any, key: Hashable, compute: Callable[[], Any]) -> Any:
+        now = self.scope.stamp(instance)
+        entry = self.entries.get(key)
+        if entry is not None:
+            stamp, value = entry
+            if self.scope.is_fresh(stamp, now):
+                self.hits += 1
+                if self.max_size is not None:
+                    self.entries.move_to_end(key)
+                return value
+            if self.scope.expires_together:
+                self.evictions += len(self.entries)
+                self.entries.clear()
+            else:
+                self.evictions += 1
+                del self.entries[key]
+        elif self.entries and self.scope.expires_together:
+            stamp, _ = next(iter(self.entries.values()))
+            if not self.scope.is_fresh(stamp, now):
+                self.evictions += len(self.entries)
+                self.entries.clear()
+        self.misses += 1
+        value = compute()
+        self.entries[key] = (now, value)
+        if self.max_size is not None and len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+        return value
+
+    @property
+    def hit_rate(self) -> float:
+        calls = self.hits + self.misses
+        return self.hits / calls if calls else 0.0
+
+
+def _get_cache(instance: Any, name: str, scope: MemoScope, max_size: Optional[int]) -> MemoCache:
+    caches = instance.__dict__.get(_CACHES_ATTRIBUTE)
+    if caches is None:
+        caches = instance.__dict__[_CACHES_ATTRIBUTE] = {}
+    cache = caches.get(name)
+    if cache is None:
+        cache = caches[name] = MemoCache(scope, max_size)
+    return cache
+
+
+def memoize(scope: MemoScope=GAME, max_size: Optional[int]=None):
+    """
+    Memoizes a method per instance and hashable arguments for the scope.
+
+    >>> class FakeState(object):
+    ...     game_loop = 0
+    >>> class Bot(object):
+    ...     def __init__(self):
+    ...         self.state, self.time, self.calls = FakeState(), 0, 0
+    ...     @memoize(STEP)
+    ...     def rally_point(self, offset=0):
+    ...         self.calls += 1
+    ...         return self.state.game_loop + offset
+    ...     @memoize(SecondsScope(10))
+    ...     def target(self):
+    ...         self.calls += 1
+    ...         return self.time
+    >>> bot, other_bot = Bot(), Bot()
+    >>> bot.rally_point(), bot.rally_point(), bot.rally_point(offset=5), other_bot.rally_point(), bot.calls
+    (0, 0, 5, 0, 2)
+    >>> bot.state.game_loop = 8
+    >>> bot.rally_point(), bot.calls
+    (8, 3)
+    >>> bot.target(), bot.target()
+    (0, 0)
+    >>> bot.time = 12
+    >>> bot.target(), bot.calls
+    (12, 5)
+    >>> get_memo_stats(bot)['rally_point']
+    {'scope': 'STEP', 'hits': 1, 'misses': 3, 'evictions': 2, 'hit_rate': 0.25, 'size': 1}
+    """
+    def decorator(function: Callable):
+        name = function.__name__
+
+        @functools.wraps(function)
+        def memoized(self, *args, **kwargs):
+            key = (args, tuple(sorted(kwargs.items()))) if kwargs else args
+            return _get_cache(self, name, scope, max_size).get(self, key, lambda: function(self, *args, **kwargs))
+        return memoized
+    return decorator
+
+
+def memoized_property(scope: MemoScope=GAME):
+    """
+    Property computed once per instance for the scope.
+
+    >>> class Bot(object):
+    ...     computed = 0
+    ...     @memoized_property()
+    ...     def expansions(self):
+    ...         self.computed += 1
+    ...         return [self.computed]
+    >>> first_game, second_game = Bot(), Bot()
+    >>> first_game.expansions, first_game.expansions, second_game.expansions
+    ([1], [1], [1])
+    >>> clear_memos(first_game)
+    >>> first_game.expansions
+    [2]
+    """
+    def decorator(function: Callable):
+        name = function.__name__
+
+        @functools.wraps(function)
+        def getter(self):
+            return _get_cache(self, name, scope, None).get(self, (), lambda: function(self))
+        return property(getter)
+    return decorator
+
+
+def get_memo_stats(instance: Any) -> Dict[str, Dict[str, Any]]:
+    """Hits, misses, evictions and hit rate of every memoized function used on the instance"""
+    return {name: {
+        'scope': repr(cache.scope),
+        'hits': cache.hits,
+        'misses': cache.misses,
+        'evictions': cache.evictions,
+        'hit_rate': cache.hit_rate,
+        'size': len(cache.entries),
+    } for name, cache in instance.__dict__.get(_CACHES_ATTRIBUTE, {}).items()}
+
+
+def clear_memos(instance: Any):
+    """Drops every memoized value of the instance, e.g. when one bot object is reused for another game"""
+    instance.__dict__.pop(_CACHES_ATTRIBUTE, None)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,143 @@
+"""Index of what is being produced, built in one pass over a step's units.
+
+python-sc2's already_pending walks every worker's and egg's orders on each call; the index counts the
+in-progress units and the orders once, so already_pending is a few dict lookups.
+Run ``python -m src.pending_production`` for the doctests and a benchmark against a per call scan.
+"""
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Set, Tuple
+
+
+class PendingRecord(NamedTuple):
+    type_id: int
+    is_ready: bool
+    is_structure: bool
+    # (raw ability id, progress) of each order, in queue order
+    orders: Tuple[Tuple[int, float], ...]
+
+
+# type id: is structure, constant for the whole game data so shared by every game
+_structure_types: Dict[int, bool] = {}
+
+
+def get_pending_records(units) -> List[PendingRecord]:
+    """Records of sc2 units read from their raw proto fields"""
+    records = []
+    for unit in units:
+        proto = unit._proto
+        is_structure = _structure_types.get(proto.unit_type)
+        if is_structure is None:
+            is_structure = _structure_types[proto.unit_type] = unit.is_structure
+        records.append(PendingRecord(proto.unit_type, proto.build_progress == 1, is_structure,
+                                     tuple((order.ability_id, order.progress) for order in proto.orders)))
+    return records
+
+
+class PendingProduction(object):
+    """
+    Counts of one observation, with the same semantics as python-sc2's already_pending:
+    the unfinished units of a type plus the workers' orders and the eggs' first orders with its creation ability
+    (every unit's orders with all_units).
+
+    >>> DRONE, EGG, HATCHERY, POOL, LAIR = 104, 103, 86, 89, 100
+    >>> BUILD_POOL, TRAIN_DRONE, MORPH_LAIR = 1155, 1342, 1216
+    >>> pending = PendingProduction(worker_types={DRONE}, egg_type=EGG)
+    >>> pending.update([PendingRecord(DRONE, True, False, ((BUILD_POOL, 0.0),)),
+    ...                 PendingRecord(POOL, False, True, ()),
+    ...                 PendingRecord(EGG, True, False, ((TRAIN_DRONE, .5),)),
+    ...                 PendingRecord(EGG, True, False, ((TRAIN_DRONE, .1),)),
+    ...                 PendingRecord(HATCHERY, True, True, ((MORPH_LAIR, .25),))])
+    >>> pending.count(POOL, BUILD_POOL), pending.count(DRONE, TRAIN_DRONE)
+    (2, 2)
+    >>> pending.count(LAIR, MORPH_LAIR), pending.count(LAIR, MORPH_LAIR, all_units=True)
+    (0, 1)
+    >>> pending.research_orders
+    [(1216, 0.25)]
+    """
+
+    def __init__(self, worker_types: Set[int], egg_type: int):
+        self.worker_types = worker_types
+        self.egg_type = egg_type
+        self.not_ready: Counter = Counter()
+        self.worker_orders: Counter = Counter()
+        self.egg_orders: Counter = Counter()
+        self.all_orders: Counter = Counter()
+        # (raw ability id, progress) of the orders of ready structures, in unit order, for the upgrades
+        self.research_orders: List[Tuple[int, float]] = []
+
+    def update(self, records: Iterable[PendingRecord]):
+        not_ready, worker_orders, egg_orders, all_orders = Counter(), Counter(), Counter(), Counter()
+        research_orders = []
+        for record in records:
+            if not record.is_ready:
+                not_ready[record.type_id] += 1
+            if not record.orders:
+                continue
+            abilities = [ability for ability, _ in record.orders]
+            all_orders.update(abilities)
+            if record.type_id in self.worker_types:
+                worker_orders.update(abilities)
+            elif record.type_id == self.egg_type:
+                egg_orders[abilities[0]] += 1
+            if record.is_structure and record.is_ready:
+                research_orders += record.orders
+        self.not_ready, self.worker_orders, self.egg_orders, self.all_orders = not_ready, worker_orders, egg_orders, all_orders
+        self.research_orders = research_orders
+
+    def count(self, type_id: int, creation_ability_id: int, all_units: bool=False) -> int:
+        if all_units:
+            return self.not_ready[type_id] + self.all_orders[creation_ability_id]
+        return self.not_ready[type_id] + self.worker_orders[creation_ability_id] + self.egg_orders[creation_ability_id]
+
+
+def _scan_count(records: List[PendingRecord], worker_types: Set[int], egg_type: int, type_id: int,
+                creation_ability_id: int) -> int:
+    """already_pending the way python-sc2 computes it, walking the units on every call"""
+    amount = sum(1 for record in records if record.type_id == type_id and not record.is_ready)
+    amount += sum(ability == creation_ability_id for record in records if record.type_id in worker_types
+                  for ability, _ in record.orders)
+    amount += sum(record.orders[0][0] == creation_ability_id for record in records
+                  if record.type_id == egg_type and record.orders)
+    return amount
+
+
+def compare_already_pending(bot: Any, unit_types: Iterable[Any], stock: Callable[[Any, Any], Any]) -> List[Any]:
+    """
+    Times the bot's already_pending against the stock implementation on the same observation (in the bot's profiler
+    sections) and returns the unit types they disagree on
+    """
+    unit_types = list(unit_types)
+    with bot.profiler.section('already_pending_stock'):
+        expected = [stock(bot, unit_type) for unit_type in unit_types]
+    with bot.profiler.section('already_pending_indexed'):
+        actual = [bot.already_pending(unit_type) for unit_type in unit_types]
+    return [unit_type for unit_type, stock_amount, amount in zip(unit_types, expected, actual) if stock_amount != amount]
+
+
+def benchmark(units: int=200, calls_per_step: int=40, steps: int=500):
+    """Per step cost of calls_per_step already_pending calls, scanning on every call against indexing once"""
+    drone, egg = 104, 103
+    records = [PendingRecord(drone if index % 3 else egg, index % 7 != 0, False, ((1342 + index % 5, .5),))
+               for index in range(units)]
+    queries = [(index, 1342 + index % 5) for index in range(calls_per_step)]
+    start = time.perf_counter()
+    for _ in range(steps):
+        for type_id, ability_id in queries:
+            _scan_count(records, {drone}, egg, type_id, ability_id)
+    scan = (time.perf_counter() - start) / steps
+    pending = PendingProduction({drone}, egg)
+    start = time.perf_counter()
+    for _ in range(steps):
+        pending.update(records)
+        for type_id, ability_id in queries:
+            pending.count(type_id, ability_id)
+    indexed = (time.perf_counter() - start) / steps
+    print('{} units, {} calls per step: scanning {:.0f} us, indexed {:.0f} us per step ({:.1f}x)'.format(
+        units, calls_per_step, scan * 1e6, indexed * 1e6, scan / indexed))
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
+    benchmark()
@@ -0,0 +1,226 @@
+"""Local building placement from a buildable cell bitmap.
+
+The bitmap starts from the map's placement grid with the resources and their mining area blocked,
+structures are added and removed from the construction and destruction events and planned buildings
+reserve their footprint until their structure shows up, so a placement costs no query to the game
+besides one confirmation of the chosen spot.
+Run ``python -m src.placement_planner`` for the doctests.
+"""
+import math
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+from sc2.ids.unit_typeid import UnitTypeId
+
+Position = Tuple[float, float]
+
+# width (and height) in cells of the structures
+FOOTPRINT_SIZES: Dict[UnitTypeId, int] = {
+    UnitTypeId.HATCHERY: 5,
+    UnitTypeId.LAIR: 5,
+    UnitTypeId.HIVE: 5,
+    UnitTypeId.EXTRACTOR: 3,
+    UnitTypeId.SPAWNINGPOOL: 3,
+    UnitTypeId.EVOLUTIONCHAMBER: 3,
+    UnitTypeId.ROACHWARREN: 3,
+    UnitTypeId.BANELINGNEST: 3,
+    UnitTypeId.HYDRALISKDEN: 3,
+    UnitTypeId.INFESTATIONPIT: 3,
+    UnitTypeId.ULTRALISKCAVERN: 3,
+    UnitTypeId.NYDUSNETWORK: 3,
+    UnitTypeId.SPIRE: 2,
+    UnitTypeId.GREATERSPIRE: 2,
+    UnitTypeId.SPINECRAWLER: 2,
+    UnitTypeId.SPORECRAWLER: 2,
+}
+
+# zerg structures that can be placed off creep
+NO_CREEP_STRUCTURES = {UnitTypeId.HATCHERY, UnitTypeId.EXTRACTOR}
+
+# cells this close to a mineral field or geyser stay free so buildings don't block mining
+RESOURCE_CLEARANCE = 3
+
+
+def pixel_map_to_array(pixel_map) -> np.ndarray:
+    """
+    Copy of a PixelMap indexed by [x, y], nonzero where the map is set.
+    PixelMap reads (x, y) from row -y of its data, so row 0 is y 0 and the other rows count down from the last one.
+
+    >>> class FakePixelMap(object):
+    ...     width, height, bytes_per_pixel = 3, 2, 1
+    ...     data = bytearray([1, 0, 0, 0, 0, 7])
+    ...     def __getitem__(self, position):
+    ...         x, y = position
+    ...         return self.data[-self.width * y + x]
+    >>> pixel_map = FakePixelMap()
+    >>> array = pixel_map_to_array(pixel_map)
+    >>> array.shape, all(array[x, y] == pixel_map[x, y] for x in range(3) for y in range(2))
+    ((3, 2), True)
+    """
+    values = np.frombuffer(bytes(pixel_map.data), dtype=np.uint8)[::pixel_map.bytes_per_pixel]
+    rows = values.reshape(pixel_map.height, pixel_map.width)
+    return rows[-np.arange(pixel_map.height) % pixel_map.height].T.copy()
+
+
+def _corner(center: Position, size: int) -> Tuple[int, int]:
+    """Lower left cell of a size x size footprint centered at center"""
+    return int(math.floor(center[0] - size / 2 + .5)), int(math.floor(center[1] - size / 2 + .5))
+
+
+def _window_sums(cells: np.ndarray, size: int) -> np.ndarray:
+    """Sum of every size x size window of cells, indexed by the window's lower left cell"""
+    table = np.zeros((cells.shape[0] + 1, cells.shape[1] + 1), dtype=np.int32)
+    table[1:, 1:] = cells.cumsum(0).cumsum(1)
+    return table[size:, size:] - table[:-size, size:] - table[size:, :-size] + table[:-size, :-size]
+
+
+class PlacementPlanner(object):
+    """
+    Buildable cells of the map (indexed by [x, y]) minus the cells of structures and reservations.
+    A reservation holds a footprint until it's released, replaced by a structure at the same spot or it expires.
+
+    >>> buildable = np.zeros((20, 20), dtype=bool)
+    >>> buildable[2:18, 2:18] = True
+    >>> planner = PlacementPlanner(buildable)
+    >>> planner.add_structure(1, (10.5, 10.5), 5)
+    >>> planner.find_placement((10.5, 10.5), 3)
+    (5.5, 10.5)
+    >>> planner.reserve((5.5, 10.5), 3, until=20)
+    >>> planner.find_placement((10.5, 10.5), 3)
+    (10.5, 5.5)
+    >>> planner.add_structure(2, (5.5, 10.5), 3)
+    >>> planner.expire(now=30), planner.can_place((5.5, 10.5), 3)
+    (0, False)
+    >>> planner.remove_structure(2), planner.can_place((5.5, 10.5), 3)
+    (True, True)
+    >>> planner.set_creep(np.zeros((20, 20), dtype=bool))
+    >>> planner.find_placement((10.5, 10.5), 3), planner.find_placement((10.5, 10.5), 3, requires_creep=False)
+    (None, (5.5, 10.5))
+    """
+
+    def __init__(self, buildable: np.ndarray, creep: Optional[np.ndarray]=None):
+        self.buildable = np.asarray(buildable, dtype=bool)
+        self.width, self.height = self.buildable.shape
+        self.creep = np.ones_like(self.buildable) if creep is None else np.asarray(creep, dtype=bool)
+        # how many structures and reservations cover each cell, a count so overlapping ones free cells correctly
+        self.occupied = np.zeros(self.buildable.shape, dtype=np.int16)
+        self.structures: Dict[int, Tuple[int, int, int]] = {}
+        # (x, y) of the footprint's lower left cell: (size, expiry time)
+        self.reservations: Dict[Tuple[int, int], Tuple[int, float]] = {}
+
+    def _cover(self, corner: Tuple[int, int], size: int, amount: int):
+        x, y = corner
+        self.occupied[max(0, x):max(0, x + size), max(0, y):max(0, y + size)] += amount
+
+    def set_creep(self, creep: np.ndarray):
+        self.creep = np.asarray(creep, dtype=bool)
+
+    def block(self, cells: np.ndarray):
+        """Makes the cells of an [x, y] mask permanently unbuildable, e.g. the resources and their mining area"""
+        self.buildable &= ~cells
+
+    def add_structure(self, tag: int, center: Position, size: int):
+        if tag in self.structures:
+            return
+        corner = _corner(center, size)
+        # the structure takes over the reservation it was planned with
+        if self.reservations.get(corner, (None,))[0] == size:
+            self.release(center, size)
+        self.structures[tag] = (*corner, size)
+        self._cover(corner, size, 1)
+
+    def remove_structure(self, tag: int) -> bool:
+        """Frees the cells of a destroyed structure, False when the tag isn't a known structure"""
+        structure = self.structures.pop(tag, None)
+        if structure is None:
+            return False
+        x, y, size = structure
+        self._cover((x, y), size, -1)
+        return True
+
+    def reserve(self, center: Position, size: int, until: float=math.inf):
+        corner = _corner(center, size)
+        if corner in self.reservations:
+            self.release(center, self.reservations[corner][0])
+        self.reservations[corner] = (size, until)
+        self._cover(corner, size, 1)
+
+    def release(self, center: Position, size: int):
+        corner = _corner(center, size)
+        reservation = self.reservations.pop(corner, None)
+        if reservation is not None:
+            self._cover(corner, reservation[0], -1)
+
+    def expire(self, now: float) -> int:
+        """Releases the reservations that expired by now, returns how many"""
+        expired = [corner for corner, (_, until) in self.reservations.items() if until <= now]
+        for corner in expired:
+            size, _ = self.reservations.pop(corner)
+            self._cover(corner, size, -1)
+        return len(expired)
+
+    def _free(self, requires_creep: bool) -> np.ndarray:
+        free = self.buildable & (self.occupied == 0)
+        return free & self.creep if requires_creep else free
+
+    def can_place(self, center: Position, size: int, requires_creep: bool=True) -> bool:
+        x, y = _corner(center, size)
+        if x < 0 or y < 0 or x + size > self.width or y + size > self.height:
+            return False
+        return bool(self._free(requires_creep)[x:x + size, y:y + size].all())
+
+    def find_placement(self, near: Position, size: int, max_distance: float=15, min_distance: float=0,
+                       requires_creep: bool=True, padding: int=1) -> Optional[Position]:
+        """
+        Center of the free footprint closest to near (between min_distance and max_distance of it), None if there is none.
+        padding cells around the footprint must be free of structures too, so buildings never wall off a path.
+        The padding of a footprint at the map edge hangs off the map, which counts as free.
+
+        >>> planner = PlacementPlanner(np.ones((10, 10), dtype=bool))
+        >>> planner.find_placement((0, 0), 3)
+        (1.5, 1.5)
+        >>> planner.add_structure(1, (4, 1), 2)
+        >>> planner.find_placement((0, 0), 3)
+        (1.5, 4.5)
+        """
+        reach = int(math.ceil(max_distance)) + size + padding
+        left, bottom = max(0, int(near[0]) - reach), max(0, int(near[1]) - reach)
+        right, top = min(self.width, int(near[0]) + reach + 1), min(self.height, int(near[1]) + reach + 1)
+        area = self._free(requires_creep)[left:right, bottom:top]
+        if area.shape[0] < size or area.shape[1] < size:
+            return None
+        fits = _window_sums(area, size) == size * size
+        if padding:
+            # the padding may hang over unbuildable terrain, just not over other structures
+            padded = np.pad(self.occupied[left:right, bottom:top] == 0, padding, 'constant', constant_values=True)
+            fits &= _window_sums(padded, size + 2 * padding) == (size + 2 * padding) ** 2
+        corners_x, corners_y = np.nonzero(fits)
+        centers_x = corners_x + left + size / 2
+        centers_y = corners_y + bottom + size / 2
+        distances = np.hypot(centers_x - near[0], centers_y - near[1])
+        in_range = (distances >= min_distance) & (distances <= max_distance)
+        if not in_range.any():
+            return None
+        best = np.flatnonzero(in_range)[np.argmin(distances[in_range])]
+        return float(centers_x[best]), float(centers_y[best])
+
+
+def get_resource_blocked_cells(resources: Iterable[Position], width: int, height: int,
+                               clearance: float=RESOURCE_CLEARANCE) -> np.ndarray:
+    """
+    [x, y] mask of the cells within clearance of a resource's center
+
+    >>> np.argwhere(get_resource_blocked_cells([(5, 5.5)], 12, 12, clearance=1)).tolist()
+    [[4, 5], [5, 5]]
+    """
+    cell_x, cell_y = np.mgrid[0:width, 0:height]
+    blocked = np.zeros((width, height), dtype=bool)
+    for x, y in resources:
+        blocked |= np.hypot(cell_x + .5 - x, cell_y + .5 - y) <= clearance
+    return blocked
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
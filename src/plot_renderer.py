@@ -0,0 +1,126 @@
+import multiprocessing
+import queue
+from collections import deque
+from typing import Dict, List, Tuple, Union
+
+_SAMPLE = 'sample'
+_SAVE = 'save'
+_CLOSE = 'close'
+
+Number = Union[int, float]
+
+
+def _render(messages: multiprocessing.Queue, initial_plots: Dict[str, List[Tuple[Tuple, Dict]]], blit: bool,
+            window: int):
+    """Renderer process: owns the matplotlib figure and redraws at most once per batch of queued messages"""
+    # imported here so matplotlib is only ever loaded in the renderer process
+    from src.bot_plotter import BotPlotter
+
+    plotter = BotPlotter(initial_plots, blit=blit)
+    # only the last window samples are kept and plotted, so a redraw costs the same all game long
+    times = deque(maxlen=window)
+    values = {key: [deque(maxlen=window) for _ in plots] for key, plots in initial_plots.items()}
+
+    def draw():
+        for key, series_list in values.items():
+            for index, series in enumerate(series_list):
+                plotter.set_data(key, index, list(times), list(series))
+        plotter.show()
+
+    while True:
+        try:
+            batch = [messages.get(timeout=.5)]
+        except queue.Empty:
+            plotter.process_events()
+            continue
+        # drain everything that piled up, only the latest state gets drawn (older frames are dropped)
+        while True:
+            try:
+                batch.append(messages.get_nowait())
+            except queue.Empty:
+                break
+        needs_draw = False
+        for message in batch:
+            kind = message[0]
+            if kind == _SAMPLE:
+                _, time, sample = message
+                times.append(time)
+                for key, sample_values in sample.items():
+                    for series, value in zip(values[key], sample_values):
+                        series.append(value)
+                needs_draw = True
+            elif kind == _SAVE:
+                if needs_draw:
+                    draw()
+                    needs_draw = False
+                plotter.save(message[1])
+            elif kind == _CLOSE:
+                plotter.reset()
+                return
+        if needs_draw:
+            draw()
+
+
+class PlotRenderer(object):
+    """
+    Plots bot metrics from a separate process so matplotlib never runs on the game loop.
+    The bot only pushes samples into a queue; when the queue is full samples are dropped instead of waiting.
+    """
+
+    def __init__(self, initial_plots: Dict[str, List[Tuple[Tuple, Dict]]], blit: bool=False, max_queued: int=256,
+                 window: int=20):
+        self.initial_plots = initial_plots
+        self.blit = blit
+        self.window = window
+        self.max_queued = max_queued
+        self.dropped_count = 0
+        self.process = None
+        self.messages = None
+
+    @property
+    def is_running(self) -> bool:
+        return self.process is not None and self.process.is_alive()
+
+    def start(self):
+        if self.is_running:
+            return
+        context = multiprocessing.get_context('spawn')
+        self.messages = context.Queue(maxsize=self.max_queued)
+        self.process = context.Process(target=_render, args=(self.messages, self.initial_plots, self.blit, self.window), daemon=True)
+        self.process.start()
+
+    def _send(self, message: tuple) -> bool:
+        if not self.is_running:
+            return False
+        try:
+            self.messages.put_nowait(message)
+            return True
+        except queue.Full:
+            self.dropped_count += 1
+            return False
+
+    def push(self, time: Number, sample: Dict[str, List[Number]]) -> bool:
+        """Queues one value per series of each plot key, returns False if the sample was dropped"""
+        return self._send((_SAMPLE, time, sample))
+
+    def save(self, filename: str, timeout: float=10):
+        """Asks the renderer to save the figure, waiting for room in the queue so the request isn't dropped"""
+        if not self.is_running:
+            return
+        try:
+            self.messages.put((_SAVE, filename), timeout=timeout)
+        except queue.Full:
+            self.dropped_count += 1
+
+    def close(self, timeout: float=10):
+        """Stops the renderer after it has handled everything queued before"""
+        if not self.is_running:
+            return
+        try:
+            self.messages.put((_CLOSE,), timeout=timeout)
+            self.process.join(timeout)
+        except queue.Full:
+            pass
+        if self.process.is_alive():
+            self.process.terminate()
+        self.process = None
@@ -1,6 +1,8 @@
 from sc2 import BotAI
 from sc2.constants import AbilityId, PYLON, STALKER, ZEALOT, SENTRY, GATEWAY, ROBOTICSFACILITY, IMMORTAL, WARPGATE
 
+from src.bot_actions import get_enemies_near_position, get_closest_enemy
+
 
 async def build_proxy(bot: BotAI, distance_towards_location=1, towards_location=None):
     location = towards_location or bot.enemy_start_locations[0]
@@ -13,9 +15,8 @@ async def micro_sentries(bot: BotAI):
     sentries = bot.units(SENTRY).ready
     actions = []
     for sentry in sentries:
-        if bot.known_enemy_units.exists:
-            closest_known_enemy = bot.known_enemy_units.closest_to(
-                sentry.position)
+        closest_known_enemy = get_closest_enemy(bot, sentry)
+        if closest_known_enemy:
             if sentry.target_in_range(closest_known_enemy):
                 guardian_shield = AbilityId.GUARDIANSHIELD_GUARDIANSHIELD
                 can_cast = await bot.can_cast(sentry, guardian_shield)
@@ -33,9 +34,9 @@ async def micro_zealots(bot: BotAI):
     zealots = bot.units(ZEALOT).ready
     actions = []
     for zealot in zealots:
-        if bot.known_enemy_units.exists:
-            actions.append(zealot.attack(
-                bot.known_enemy_units.closest_to(zealot.position)))
+        closest_known_enemy = get_closest_enemy(bot, zealot)
+        if closest_known_enemy:
+            actions.append(zealot.attack(closest_known_enemy))
         else:
             target = bot.known_enemy_structures.random_or(
                 bot.known_enemy_units.random_or(bot.enemy_start_locations[0]))
@@ -47,15 +48,13 @@ async def micro_stalkers(bot: BotAI):
     stalkers = bot.units(STALKER).ready
     actions = []
     for stalker in stalkers:
-        enemy_threats_close = bot.known_enemy_units.filter(
-            lambda x: x.can_attack_ground).closer_than(15, stalker)  # threats that can attack
+        enemy_threats_close = get_enemies_near_position(bot, stalker, 15)  # threats that can attack
         if enemy_threats_close.exists:
             closest_enemy = enemy_threats_close.sorted_by_distance_to(
                 stalker).first
             if stalker.weapon_cooldown == 0:
                 actions.append(stalker.attack(closest_enemy))
-            elif not bot.known_enemy_units.filter(
-                    lambda x: x.can_attack_ground).closer_than(3, stalker).exists:
+            elif not get_enemies_near_position(bot, stalker, 3).exists:
                 actions.append(stalker.move(closest_enemy.position))
         else:
             target = bot.known_enemy_structures.random_or(
@@ -68,15 +67,13 @@ async def micro_immortals(bot: BotAI):
     immortals = bot.units(IMMORTAL).ready
     actions = []
     for immortal in immortals:
-        enemy_threats_close = bot.known_enemy_units.filter(
-            lambda x: x.can_attack_ground).closer_than(15, immortal)  # threats that can attack
+        enemy_threats_close = get_enemies_near_position(bot, immortal, 15)  # threats that can attack
         if enemy_threats_close.exists:
             closest_enemy = enemy_threats_close.sorted_by_distance_to(
                 immortal).first
             if immortal.weapon_cooldown == 0:
                 actions.append(immortal.attack(closest_enemy))
-            elif not bot.known_enemy_units.filter(
-                    lambda x: x.can_attack_ground).closer_than(5, immortal).exists:
+            elif not get_enemies_near_position(bot, immortal, 5).exists:
                 actions.append(immortal.move(closest_enemy.position))
         else:
             target = bot.known_enemy_structures.random_or(
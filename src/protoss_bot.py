@@ -5,14 +5,19 @@ from sc2.constants import AbilityId, BuffId, NEXUS, PROBE, PYLON, ASSIMILATOR, S
 from sc2.position import Point2, Point3
 
 import src.bot_logger as bot_logger
+from src.ability_cache import AbilityCache
+from src.action_buffer import BufferedActionsBot
 from src.helpers import roundrobin
+from src.bot_actions import get_enemies_near_position, get_closest_enemy
 from src.protoss_actions import micro_army, chronoboost_building, build_proxy, get_closest_pylon_to_enemy_base
 
 
-class BalancedProtossBot(sc2.BotAI):
+class BalancedProtossBot(BufferedActionsBot):
     def __init__(self):
+        super().__init__()
         self.attacking = False
         self.attack_count = 0
+        self.ability_cache = AbilityCache(self)
         self.warpgate_started = False
         self.warpgate_start_time = None
         self.warpgate_finished = False
@@ -71,9 +76,10 @@ class BalancedProtossBot(sc2.BotAI):
         await self.distribute_workers()
         await self.scout_enemy()
 
-    async def on_step(self, iteration):
+    async def on_game_step(self, iteration):
         if iteration == 0:
             await self.first_iteration()
+        await self.ability_cache.prefetch(self.get_ability_query_units(iteration))
         if iteration % 8 == 0:
             self.manage_booming()
         if iteration % 50 == 0:
@@ -105,6 +111,14 @@ class BalancedProtossBot(sc2.BotAI):
                 await build_proxy(self, distance_towards_location=x)
             self.proxy_built = True
 
+    def get_ability_query_units(self, iteration):
+        """units whose available abilities are read this step, queried together in one request"""
+        units = self.units(NEXUS) + self.units(WARPGATE).ready + self.units(FORGE).ready.noqueue + \
+            self.units(TWILIGHTCOUNCIL).ready
+        if iteration % 50 == 0:
+            units += self.get_military_buildings()
+        return units
+
     def get_workers_per_nexus(self):
         nexus_amount = self.units(NEXUS).amount
         return self.workers.amount / nexus_amount if nexus_amount > 0 else 0
@@ -120,7 +134,7 @@ class BalancedProtossBot(sc2.BotAI):
 
     async def chronoboost(self):
         for nexus in self.units(NEXUS):
-            available_nexus_abilities = await self.get_available_abilities(nexus)
+            available_nexus_abilities = self.ability_cache.available(nexus)
             chronoboost = AbilityId.EFFECT_CHRONOBOOSTENERGYCOST
             if chronoboost in available_nexus_abilities:
                 if self.is_researching_warpgate:
@@ -267,7 +281,7 @@ class BalancedProtossBot(sc2.BotAI):
                 else:
                     for forge in self.units(FORGE).ready.noqueue:
                         if forge:
-                            forge_abilities = await self.get_available_abilities(forge)
+                            forge_abilities = self.ability_cache.available(forge)
                             for upgrade in self.all_upgrades:
                                 if upgrade in forge_abilities and self.minerals > 400 and self.vespene > 400:
                                     bot_logger.log_action(self,
@@ -281,7 +295,7 @@ class BalancedProtossBot(sc2.BotAI):
                     await self.build(TWILIGHTCOUNCIL, near=pylon)
                 elif has_twilight:
                     twilight_council = self.units(TWILIGHTCOUNCIL).ready.first
-                    twilight_abilities = await self.get_available_abilities(twilight_council)
+                    twilight_abilities = self.ability_cache.available(twilight_council)
                     twilight_upgrades = [
                         AbilityId.RESEARCH_CHARGE
                     ]
@@ -339,7 +353,7 @@ class BalancedProtossBot(sc2.BotAI):
     async def set_rally_points(self):
         print('setting rally points')
         for military_building in self.get_military_buildings():
-            available_military_building_abilities = await self.get_available_abilities(military_building)
+            available_military_building_abilities = self.ability_cache.available(military_building)
             if AbilityId.RALLY_BUILDING in available_military_building_abilities:
                 await self.rally_building(military_building)
         for nexus in self.units(NEXUS).ready:
@@ -371,22 +385,19 @@ class BalancedProtossBot(sc2.BotAI):
                 actions.append(unit.attack(self.enemy_start_locations[0]))
         elif total_combat_unit_count > 2:
             for expansion in self.owned_expansions:
-                if self.known_enemy_units.closer_than(5, expansion).amount > 0:
+                if get_enemies_near_position(self, expansion, 5, unit_filter=None).amount > 0:
                     for unit in all_combat_units:
-                        actions.append(unit.attack(
-                            self.known_enemy_units.closest_to(unit.position)))
+                        actions.append(unit.attack(get_closest_enemy(self, unit)))
             if self.proxy_built:
                 proxy_pylon = get_closest_pylon_to_enemy_base(self)
-                if proxy_pylon and self.known_enemy_units.closer_than(10, proxy_pylon).amount > 0:
+                if proxy_pylon and get_enemies_near_position(self, proxy_pylon, 10, unit_filter=None).amount > 0:
                     for unit in all_combat_units:
-                        actions.append(unit.attack(
-                            self.known_enemy_units.closest_to(unit.position)
-                        ))
+                        actions.append(unit.attack(get_closest_enemy(self, unit)))
             await self.do_actions(actions)
 
     async def warp_new_units(self, proxy: Unit):
         for warpgate in self.units(WARPGATE).ready:
-            abilities = await self.get_available_abilities(warpgate)
+            abilities = self.ability_cache.available(warpgate)
             # all the units have the same cooldown anyway so let's just look at ZEALOT
             if AbilityId.WARPGATETRAIN_ZEALOT in abilities:
                 pos = proxy.position.to2.random_on_distance(4)
@@ -0,0 +1,162 @@
+"""SQLite store with one row per played game.
+
+Query aggregated win rates with ``python -m src.results_store --group-by strategy opponent_race``.
+"""
+import argparse
+import datetime
+import sqlite3
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+DEFAULT_DATABASE_PATH = 'balanced_zerg_bot_results.sqlite'
+
+SCORE_FIELDS = [
+    'score',
+    'collected_minerals',
+    'collected_vespene',
+    'spent_minerals',
+    'spent_vespene',
+    'total_value_units',
+    'total_value_structures',
+    'killed_value_units',
+    'killed_value_structures',
+    'killed_minerals_army',
+    'killed_vespene_army',
+    'lost_minerals_army',
+    'lost_vespene_army',
+    'idle_worker_time',
+    'idle_production_time',
+]
+
+COLUMNS = [
+    'recorded_at',
+    'strategy',
+    'timings',
+    'map_name',
+    'opponent_race',
+    'opponent_difficulty',
+    'result',
+    'duration',
+    'replay_path',
+    *SCORE_FIELDS,
+]
+
+GROUPABLE_COLUMNS = ['strategy', 'timings', 'map_name', 'opponent_race', 'opponent_difficulty']
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY,
+    recorded_at TEXT NOT NULL,
+    strategy TEXT,
+    timings TEXT,
+    map_name TEXT,
+    opponent_race TEXT,
+    opponent_difficulty TEXT,
+    result TEXT NOT NULL,
+    duration REAL,
+    replay_path TEXT,
+    {score_columns}
+);
+CREATE INDEX IF NOT EXISTS games_strategy ON games (strategy);
+CREATE INDEX IF NOT EXISTS games_map_name ON games (map_name);
+CREATE INDEX IF NOT EXISTS games_opponent ON games (opponent_race, opponent_difficulty);
+CREATE INDEX IF NOT EXISTS games_result ON games (result);
+CREATE INDEX IF NOT EXISTS games_matchup ON games (strategy, map_name, opponent_race, opponent_difficulty, result);
+'''.format(score_columns=',\n    '.join('{} REAL'.format(field) for field in SCORE_FIELDS))
+
+
+def _name(value: Any) -> Optional[str]:
+    """Enum members (Result, Race, Difficulty) are stored by name"""
+    if value is None:
+        return None
+    return getattr(value, 'name', str(value))
+
+
+def get_game_summary(bot, game_result) -> Dict[str, Any]:
+    """Collects the result, game length and final score of a bot at the end of its game"""
+    summary = {'result': _name(game_result), 'duration': bot.time}
+    score = bot.state.score
+    for field in SCORE_FIELDS:
+        summary[field] = getattr(score, field)
+    return summary
+
+
+class ResultsStore(object):
+    """
+    One row per game, indexed by strategy, map, opponent and result.
+    Rows are written in bulk from the process running the sweep, workers only return their game summaries.
+
+    >>> store = ResultsStore(':memory:')
+    >>> store.insert_games([
+    ...     {'strategy': 'early_roach', 'map_name': 'NewkirkPrecinctTE', 'opponent_race': 'Terran', 'result': 'Victory'},
+    ...     {'strategy': 'early_roach', 'map_name': 'NewkirkPrecinctTE', 'opponent_race': 'Terran', 'result': 'Defeat'},
+    ...     {'strategy': 'early_roach', 'map_name': 'NewkirkPrecinctTE', 'opponent_race': 'Zerg', 'result': 'Victory'},
+    ...     {'strategy': 'ling_muta', 'map_name': 'NewkirkPrecinctTE', 'opponent_race': 'Terran', 'result': 'Defeat'},
+    ... ])
+    4
+    >>> store.win_rates(group_by=['strategy', 'opponent_race'])
+    [('early_roach', 'Terran', 2, 1, 0.5), ('early_roach', 'Zerg', 1, 1, 1.0), ('ling_muta', 'Terran', 1, 0, 0.0)]
+    >>> store.win_rates(group_by=['strategy'], opponent_race='Terran')
+    [('early_roach', 2, 1, 0.5), ('ling_muta', 1, 0, 0.0)]
+    """
+
+    def __init__(self, path: str=DEFAULT_DATABASE_PATH, timeout: float=30):
+        self.path = path
+        self.connection = sqlite3.connect(path, timeout=timeout)
+        # write ahead logging lets sweeps read while another sweep writes
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.executescript(_SCHEMA)
+
+    def insert_games(self, games: Iterable[Dict[str, Any]]) -> int:
+        """Inserts all games in a single transaction, returns the number of rows written"""
+        recorded_at = datetime.datetime.now().isoformat()
+        rows = []
+        for game in games:
+            row = dict(game, recorded_at=game.get('recorded_at', recorded_at))
+            for column in ('result', 'opponent_race', 'opponent_difficulty'):
+                row[column] = _name(row.get(column))
+            rows.append([row.get(column) for column in COLUMNS])
+        with self.connection:
+            self.connection.executemany('INSERT INTO games ({}) VALUES ({})'.format(
+                ', '.join(COLUMNS), ', '.join('?' for _ in COLUMNS)), rows)
+        return len(rows)
+
+    def win_rates(self, group_by: Sequence[str]=('strategy',), **filters: Any) -> List[tuple]:
+        """Returns (*group values, games, wins, win rate) rows, filters are column=value pairs"""
+        for column in (*group_by, *filters):
+            if column not in GROUPABLE_COLUMNS:
+                raise ValueError('can not group or filter by {}'.format(column))
+        conditions = [(column, _name(value)) for column, value in filters.items() if value is not None]
+        where = 'WHERE {}'.format(' AND '.join('{} = ?'.format(column) for column, _ in conditions)) if conditions else ''
+        group_columns = ', '.join(group_by)
+        query = '''
+            SELECT {select} COUNT(*), SUM(result = 'Victory'), AVG(result = 'Victory')
+            FROM games {where} {group} {order}
+        '''.format(select=group_columns + ',' if group_by else '', where=where,
+                   group='GROUP BY {}'.format(group_columns) if group_by else '',
+                   order='ORDER BY {}'.format(group_columns) if group_by else '')
+        return self.connection.execute(query, [value for _, value in conditions]).fetchall()
+
+    def close(self):
+        self.connection.close()
+
+
+def main(argv: Optional[List[str]]=None):
+    parser = argparse.ArgumentParser(description='Aggregated win rates of recorded games')
+    parser.add_argument('--db', default=DEFAULT_DATABASE_PATH, help='path of the results database')
+    parser.add_argument('--group-by', nargs='*', default=['strategy'], choices=GROUPABLE_COLUMNS)
+    parser.add_argument('--strategy')
+    parser.add_argument('--map', dest='map_name')
+    parser.add_argument('--race', dest='opponent_race', help='opponent race, e.g. Terran')
+    parser.add_argument('--difficulty', dest='opponent_difficulty', help='opponent difficulty, e.g. Hard')
+    args = parser.parse_args(argv)
+    store = ResultsStore(args.db)
+    rows = store.win_rates(group_by=args.group_by, strategy=args.strategy, map_name=args.map_name,
+                           opponent_race=args.opponent_race, opponent_difficulty=args.opponent_difficulty)
+    print(' | '.join([*args.group_by, 'games', 'wins', 'win rate']))
+    for *group_values, games, wins, win_rate in rows:
+        print(' | '.join([*map(str, group_values), str(games), str(wins), '{:.1%}'.format(win_rate)]))
+    store.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+"""Uniform grid spatial index used for enemy lookups.
+
+Run ``python -m src.spatial_index`` to benchmark it against a linear scan.
+"""
+import math
+import random
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple, Union
+
+from sc2.position import Point2
+from sc2.unit import Unit
+from sc2.units import Units
+
+from src.types import Location, UnitPredicate
+
+
+def _to_xy(location: Location) -> Tuple[float, float]:
+    if isinstance(location, Unit):
+        location = location.position
+    return location[0], location[1]
+
+
+class UnitGrid(object):
+    """
+    Buckets units into square cells so radius and nearest queries only look at
+    the cells around the query position instead of every unit.
+    Flying, attack and dps flags are read once per unit when the grid is built.
+    """
+
+    def __init__(self, units: Units, cell_size: Union[int, float]=8):
+        self.units = units
+        self.cell_size = cell_size
+        self.cells: Dict[Tuple[int, int], List[tuple]] = defaultdict(list)
+        for index, unit in enumerate(units):
+            x, y = _to_xy(unit.position)
+            entry = (x, y, index, unit, unit.is_flying, unit.can_attack_ground,
+                     unit.can_attack_air, unit.ground_dps, unit.air_dps)
+            self.cells[self._cell_of(x, y)].append(entry)
+        if self.cells:
+            self.min_cell = (min(cx for cx, _ in self.cells), min(cy for _, cy in self.cells))
+            self.max_cell = (max(cx for cx, _ in self.cells), max(cy for _, cy in self.cells))
+
+    def _cell_of(self, x: float, y: float) -> Tuple[int, int]:
+        return int(x // self.cell_size), int(y // self.cell_size)
+
+    @staticmethod
+    def _matches(entry: tuple, unit_filter: Optional[UnitPredicate], is_flying: Optional[bool],
+                 can_attack_ground: Optional[bool], can_attack_air: Optional[bool],
+                 ground_dps_above: Optional[float], air_dps_above: Optional[float]) -> bool:
+        if is_flying is not None and entry[4] != is_flying:
+            return False
+        if can_attack_ground is not None and entry[5] != can_attack_ground:
+            return False
+        if can_attack_air is not None and entry[6] != can_attack_air:
+            return False
+        if ground_dps_above is not None and not entry[7] > ground_dps_above:
+            return False
+        if air_dps_above is not None and not entry[8] > air_dps_above:
+            return False
+        return unit_filter is None or unit_filter(entry[3])
+
+    def closer_than(self, distance: Union[int, float], position: Location, unit_filter: Optional[UnitPredicate]=None,
+                    is_flying: Optional[bool]=None, can_attack_ground: Optional[bool]=None,
+                    can_attack_air: Optional[bool]=None, ground_dps_above: Optional[float]=None,
+                    air_dps_above: Optional[float]=None) -> Units:
+        """Same result and ordering as Units.closer_than followed by Units.filter"""
+        if not self.cells:
+            return self.units.subgroup([])
+        x, y = _to_xy(position)
+        distance_squared = distance ** 2
+        min_cx, min_cy = self._cell_of(x - distance, y - distance)
+        max_cx, max_cy = self._cell_of(x + distance, y + distance)
+        min_cx, min_cy = max(min_cx, self.min_cell[0]), max(min_cy, self.min_cell[1])
+        max_cx, max_cy = min(max_cx, self.max_cell[0]), min(max_cy, self.max_cell[1])
+        found = []
+        for cx in range(min_cx, max_cx + 1):
+            for cy in range(min_cy, max_cy + 1):
+                for entry in self.cells.get((cx, cy), ()):
+                    if (entry[0] - x) ** 2 + (entry[1] - y) ** 2 < distance_squared \
+                            and self._matches(entry, unit_filter, is_flying, can_attack_ground,
+                                              can_attack_air, ground_dps_above, air_dps_above):
+                        found.append(entry)
+        found.sort(key=lambda entry: entry[2])
+        return self.units.subgroup(entry[3] for entry in found)
+
+    def closest_to(self, position: Location, unit_filter: Optional[UnitPredicate]=None,
+                   max_distance: Union[int, float]=math.inf, is_flying: Optional[bool]=None,
+                   can_attack_ground: Optional[bool]=None, can_attack_air: Optional[bool]=None,
+                   ground_dps_above: Optional[float]=None, air_dps_above: Optional[float]=None) -> Optional[Unit]:
+        """Returns the closest matching unit, searching outwards ring by ring of cells"""
+        if not self.cells:
+            return None
+        x, y = _to_xy(position)
+        center_cx, center_cy = self._cell_of(x, y)
+        max_ring = max(abs(center_cx - self.min_cell[0]), abs(center_cx - self.max_cell[0]),
+                       abs(center_cy - self.min_cell[1]), abs(center_cy - self.max_cell[1]))
+        best_entry = None
+        best_distance_squared = max_distance ** 2
+        for ring in range(max_ring + 1):
+            # every cell in this ring is at least (ring - 1) cells away from the query position
+            ring_distance = max(ring - 1, 0) * self.cell_size
+            if ring_distance ** 2 > best_distance_squared:
+                break
+            for cx in range(center_cx - ring, center_cx + ring + 1):
+                for cy in range(center_cy - ring, center_cy + ring + 1):
+                    if max(abs(cx - center_cx), abs(cy - center_cy)) != ring:
+                        continue
+                    for entry in self.cells.get((cx, cy), ()):
+                        distance_squared = (entry[0] - x) ** 2 + (entry[1] - y) ** 2
+                        if distance_squared > best_distance_squared:
+                            continue
+                        if distance_squared == best_distance_squared and best_entry and best_entry[2] < entry[2]:
+                            continue
+                        if self._matches(entry, unit_filter, is_flying, can_attack_ground,
+                                         can_attack_air, ground_dps_above, air_dps_above):
+                            best_entry = entry
+                            best_distance_squared = distance_squared
+        return best_entry[3] if best_entry else None
+
+
+class _BenchmarkUnit(object):
+    def __init__(self, position: Point2):
+        self.position = position
+        self.is_flying = random.random() < .2
+        self.can_attack_ground = random.random() < .9
+        self.can_attack_air = random.random() < .4
+        self.ground_dps = random.random() * 20
+        self.air_dps = random.random() * 10
+
+
+def benchmark(total_unit_counts=(50, 200, 400), map_size=150, steps=20):
+    """Times one simulated micro step (one radius query per own unit) with and without the grid"""
+    for total in total_unit_counts:
+        own = [_BenchmarkUnit(Point2((random.random() * map_size, random.random() * map_size)))
+               for _ in range(total // 2)]
+        enemies = Units([_BenchmarkUnit(Point2((random.random() * map_size, random.random() * map_size)))
+                         for _ in range(total - total // 2)], None)
+        start = time.perf_counter()
+        for _ in range(steps):
+            for unit in own:
+                enemies.closer_than(20, unit.position).filter(lambda u: u.can_attack_ground)
+        linear_ms = (time.perf_counter() - start) * 1000 / steps
+        start = time.perf_counter()
+        for _ in range(steps):
+            grid = UnitGrid(enemies)
+            for unit in own:
+                grid.closer_than(20, unit.position, can_attack_ground=True)
+        grid_ms = (time.perf_counter() - start) * 1000 / steps
+        print('{:>4} units: linear scan {:7.2f} ms/step, grid {:7.2f} ms/step (includes build)'.format(
+            total, linear_ms, grid_ms))
+
+
+if __name__ == '__main__':
+    benchmark()
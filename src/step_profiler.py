@@ -0,0 +1,206 @@
+"""Opt-in timing of the subsystems run every game step.
+
+Each section records its wall time and the number of requests sent to the game (round trips) into log bucketed
+histograms, so percentiles stay accurate to about 1% with constant memory over a whole game.
+Run ``python -m src.step_profiler`` for the doctests and an overhead measurement.
+"""
+import functools
+import json
+import math
+import time
+from typing import Any, Dict
+
+
+class LatencyHistogram(object):
+    """
+    Counts values in buckets whose width grows with the value (like an HDR histogram),
+    every value above min_value lands in a bucket at most `precision` wider than itself.
+
+    >>> histogram = LatencyHistogram()
+    >>> for value in range(1, 101):
+    ...     histogram.record(value / 1000)
+    >>> histogram.count, round(histogram.mean, 4), histogram.max
+    (100, 0.0505, 0.1)
+    >>> [round(histogram.percentile(p) * 1000, 1) for p in (50, 95, 99, 100)]
+    [50.3, 95.1, 100.0, 100.0]
+    >>> histogram.record(0)
+    >>> histogram.percentile(0)
+    0
+    """
+
+    def __init__(self, min_value: float=1e-6, precision: float=.01):
+        self.min_value = min_value
+        self._log_base = math.log1p(precision)
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0
+
+    def _bucket_value(self, bucket: int) -> float:
+        if bucket < 0:
+            return 0
+        # upper edge of the bucket, so the reported percentile never understates a value
+        return self.min_value * math.exp((bucket + 1) * self._log_base)
+
+    def record(self, value: float):
+        # zero (e.g. no round trips) and tiny values share the first bucket
+        bucket = -1 if value <= self.min_value else int(math.log(value / self.min_value) / self._log_base)
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, percent: float) -> float:
+        """Smallest bucket value that at least percent % of the recorded values are below, capped at the max"""
+        if not self.count:
+            return 0
+        threshold = max(1, math.ceil(self.count * percent / 100))
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= threshold:
+                return min(self._bucket_value(bucket), self.max)
+        return self.max
+
+    def summary(self, scale: float=1) -> Dict[str, float]:
+        return {
+            'mean': self.mean * scale,
+            'p50': self.percentile(50) * scale,
+            'p95': self.percentile(95) * scale,
+            'p99': self.percentile(99) * scale,
+            'max': self.max * scale,
+        }
+
+
+class _Section(object):
+    __slots__ = ('profiler', 'times', 'requests', 'start_time', 'start_round_trips')
+
+    def __init__(self, profiler: 'StepProfiler', times: LatencyHistogram, requests: LatencyHistogram):
+        self.profiler = profiler
+        self.times = times
+        self.requests = requests
+
+    def __enter__(self):
+        self.start_round_trips = self.profiler.round_trips
+        self.start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.times.record(time.perf_counter() - self.start_time)
+        self.requests.record(self.profiler.round_trips - self.start_round_trips)
+        return False
+
+
+class StepProfiler(object):
+    """
+    Records per section wall time and round trips. Sections can nest, a parent's numbers include its children.
+    attach(client) counts every request the client sends to the game.
+
+    >>> profiler = StepProfiler()
+    >>> for step in range(3):
+    ...     with profiler.section('micro_army'):
+    ...         profiler.round_trips += step
+    >>> report = profiler.report()
+    >>> report['micro_army']['calls'], report['micro_army']['round_trips']['total']
+    (3, 3)
+    >>> sorted(report['micro_army']['milliseconds'])
+    ['max', 'mean', 'p50', 'p95', 'p99']
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self.round_trips = 0
+        self.times: Dict[str, LatencyHistogram] = {}
+        self.requests: Dict[str, LatencyHistogram] = {}
+        self._sections: Dict[str, _Section] = {}
+
+    def attach(self, client: Any):
+        """Wraps the client's request method so every request to the game is counted"""
+        execute = client._execute
+
+        @functools.wraps(execute)
+        async def counted_execute(**kwargs):
+            self.round_trips += 1
+            return await execute(**kwargs)
+
+        client._execute = counted_execute
+
+    def section(self, name: str) -> _Section:
+        # sections don't nest with themselves, so one context manager per name is reused
+        section = self._sections.get(name)
+        if section is None:
+            self.times[name] = LatencyHistogram()
+            self.requests[name] = LatencyHistogram(min_value=1, precision=.001)
+            section = self._sections[name] = _Section(self, self.times[name], self.requests[name])
+        return section
+
+    def report(self) -> Dict[str, Dict[str, Any]]:
+        """Calls, millisecond percentiles and round trip percentiles per section, slowest total first"""
+        names = sorted(self.times, key=lambda name: self.times[name].total, reverse=True)
+        return {name: {
+            'calls': self.times[name].count,
+            'total_seconds': self.times[name].total,
+            'milliseconds': self.times[name].summary(scale=1000),
+            'round_trips': dict(self.requests[name].summary(), total=int(self.requests[name].total)),
+        } for name in names}
+
+    def dump(self, path: str):
+        with open(path, 'w') as report_file:
+            json.dump(self.report(), report_file, indent=2)
+
+
+class _NullSection(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SECTION = _NullSection()
+
+
+class NullProfiler(object):
+    """Stands in for StepProfiler when profiling is off, sections do nothing and nothing is written"""
+
+    enabled = False
+
+    def attach(self, client: Any):
+        pass
+
+    def section(self, name: str) -> _NullSection:
+        return _NULL_SECTION
+
+    def report(self) -> Dict[str, Dict[str, Any]]:
+        return {}
+
+    def dump(self, path: str):
+        pass
+
+
+def benchmark(steps: int=20000, sections: int=12, step_seconds: float=.002):
+    """Cost of entering and leaving the sections of one step, against a step_seconds long step"""
+    names = ['section_{}'.format(index) for index in range(sections)]
+    for profiler in (NullProfiler(), StepProfiler()):
+        start = time.perf_counter()
+        for _ in range(steps):
+            for name in names:
+                with profiler.section(name):
+                    pass
+        per_step = (time.perf_counter() - start) / steps
+        print('{:>16}: {:6.2f} us of overhead per step of {} sections ({:.3f}% of a {:g} ms step)'.format(
+            type(profiler).__name__, per_step * 1e6, sections, per_step / step_seconds * 100, step_seconds * 1000))
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
+    benchmark()
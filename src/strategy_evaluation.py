@@ -0,0 +1,179 @@
+"""Early stopping evaluation of competing strategies.
+
+Strategies play in rounds; after each round the ones that are statistically dominated are dropped
+and the following rounds go to the remaining contenders (successive halving style).
+Run ``python -m src.strategy_evaluation`` for the doctests.
+"""
+import math
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+Interval = Tuple[float, float]
+
+
+def wilson_interval(wins: int, games: int, z: float=1.96) -> Interval:
+    """Wilson score interval of a win rate, (0, 1) before any game is played
+    >>> wilson_interval(0, 0)
+    (0.0, 1.0)
+    >>> low, high = wilson_interval(8, 10)
+    >>> round(low, 3), round(high, 3)
+    (0.49, 0.943)
+    >>> low, high = wilson_interval(50, 100)
+    >>> round(low, 3), round(high, 3)
+    (0.404, 0.596)
+    """
+    if not games:
+        return 0.0, 1.0
+    rate = wins / games
+    denominator = 1 + z ** 2 / games
+    center = (rate + z ** 2 / (2 * games)) / denominator
+    margin = z * math.sqrt(rate * (1 - rate) / games + z ** 2 / (4 * games ** 2)) / denominator
+    return max(0.0, center - margin), min(1.0, center + margin)
+
+
+class StrategyRecord(object):
+    def __init__(self, name: str):
+        self.name = name
+        self.games = 0
+        self.wins = 0
+        self.eliminated_in_round: Optional[int] = None
+
+    @property
+    def win_rate(self) -> float:
+        return self.wins / self.games if self.games else 0.0
+
+    def interval(self, z: float=1.96) -> Interval:
+        return wilson_interval(self.wins, self.games, z)
+
+    def __repr__(self):
+        return 'StrategyRecord({!r}, wins={}, games={})'.format(self.name, self.wins, self.games)
+
+
+class StrategyEvaluation(object):
+    """
+    Tracks a Wilson interval per strategy and decides which strategies keep playing.
+    A strategy is dominated once its upper bound is below the best lower bound of the others.
+    With halving, at most half of the contenders (ranked by lower bound) survive each round,
+    but only once they all played min_games.
+
+    >>> evaluation = StrategyEvaluation(['a', 'b', 'c'], min_games=4)
+    >>> for name, won in [('a', True)] * 9 + [('a', False)] + [('b', False)] * 9 + [('b', True)] + [('c', True)] * 5 + [('c', False)] * 5:
+    ...     evaluation.record(name, won)
+    >>> evaluation.end_round()
+    ['b']
+    >>> evaluation.active
+    ['a', 'c']
+    >>> [(row[0], row[1], row[2]) for row in evaluation.summary()]
+    [('a', 10, 9), ('c', 10, 5), ('b', 10, 1)]
+    """
+
+    def __init__(self, strategy_names: Iterable[str], z: float=1.96, min_games: int=5, halving: bool=True):
+        self.records: Dict[str, StrategyRecord] = {name: StrategyRecord(name) for name in strategy_names}
+        self.z = z
+        self.min_games = min_games
+        self.halving = halving
+        self.round = 0
+
+    @property
+    def active(self) -> List[str]:
+        return [name for name, record in self.records.items() if record.eliminated_in_round is None]
+
+    @property
+    def total_games(self) -> int:
+        return sum(record.games for record in self.records.values())
+
+    def record(self, name: str, won: bool):
+        record = self.records[name]
+        record.games += 1
+        record.wins += int(won)
+
+    def _eliminate(self, names: Iterable[str]) -> List[str]:
+        eliminated = []
+        for name in names:
+            self.records[name].eliminated_in_round = self.round
+            eliminated.append(name)
+        return eliminated
+
+    def end_round(self) -> List[str]:
+        """Drops dominated strategies (and the bottom half when halving), returns the dropped names"""
+        active = [self.records[name] for name in self.active]
+        eliminated = []
+        if len(active) > 1:
+            intervals = {record.name: record.interval(self.z) for record in active}
+            best_lower_bound = max(low for low, _ in intervals.values())
+            eliminated += self._eliminate(
+                record.name for record in active if intervals[record.name][1] < best_lower_bound)
+            remaining = [record for record in active if record.name not in eliminated]
+            if self.halving and len(remaining) > 2 and all(record.games >= self.min_games for record in remaining):
+                remaining.sort(key=lambda record: intervals[record.name][0], reverse=True)
+                eliminated += self._eliminate(record.name for record in remaining[math.ceil(len(remaining) / 2):])
+        self.round += 1
+        return eliminated
+
+    def schedule(self, games_per_strategy: int, max_games: Optional[int]=None) -> List[str]:
+        """
+        The strategy of every game of the next round, interleaved so parallel workers share the load.
+        No strategy is scheduled past max_games games in total.
+
+        >>> evaluation = StrategyEvaluation(['a', 'b'])
+        >>> evaluation.record('a', True)
+        >>> evaluation.schedule(2, max_games=2)
+        ['a', 'b', 'b']
+        """
+        games = {name: games_per_strategy for name in self.active}
+        if max_games is not None:
+            games = {name: min(count, max_games - self.records[name].games) for name, count in games.items()}
+        return [name for index in range(games_per_strategy) for name in self.active if index < games[name]]
+
+    def summary(self) -> List[Tuple[str, int, int, float, float, float, Optional[int]]]:
+        """(name, games, wins, win rate, interval low, interval high, eliminated in round) rows, best first"""
+        rows = []
+        for record in self.records.values():
+            low, high = record.interval(self.z)
+            rows.append((record.name, record.games, record.wins, record.win_rate, low, high, record.eliminated_in_round))
+        rows.sort(key=lambda row: (row[6] is None, row[6] or 0, row[4]), reverse=True)
+        return rows
+
+
+def evaluate_strategies(play_round: Callable[[List[str]], Iterable[Tuple[str, bool]]], strategy_names: Iterable[str],
+                        max_games_per_strategy: int, initial_games: int=4, z: float=1.96, min_games: int=5,
+                        halving: bool=True) -> StrategyEvaluation:
+    """
+    Plays rounds until one strategy is left or every remaining one played max_games_per_strategy games.
+    play_round gets the strategy of every game of the round and returns (strategy, won) for the games that finished.
+    The games per strategy double every round up to that cap, dropped strategies never use the rest of theirs.
+
+    >>> import random
+    >>> win_rates = {'strong': .9, 'average': .5, 'weak': .1}
+    >>> rng = random.Random(1)
+    >>> evaluation = evaluate_strategies(lambda schedule: [(name, rng.random() < win_rates[name]) for name in schedule],
+    ...                                  win_rates, max_games_per_strategy=50)
+    >>> evaluation.active
+    ['strong']
+    >>> evaluation.total_games < 50 * len(win_rates)
+    True
+    >>> # even when no strategy can be dropped, none plays past the cap
+    >>> evaluation = evaluate_strategies(lambda schedule: [(name, True) for name in schedule], ['a', 'b'],
+    ...                                  max_games_per_strategy=10)
+    >>> [(row[0], row[1]) for row in evaluation.summary()]
+    [('a', 10), ('b', 10)]
+    """
+    evaluation = StrategyEvaluation(strategy_names, z=z, min_games=min_games, halving=halving)
+    games_per_strategy = initial_games
+    while len(evaluation.active) > 1:
+        schedule = evaluation.schedule(games_per_strategy, max_games=max_games_per_strategy)
+        if not schedule:
+            break
+        games_before_round = evaluation.total_games
+        for name, won in play_round(schedule):
+            evaluation.record(name, won)
+        if evaluation.total_games == games_before_round:
+            # every game of the round crashed, playing more rounds would not help
+            break
+        evaluation.end_round()
+        games_per_strategy *= 2
+    return evaluation
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -1,5 +1,7 @@
 from collections import namedtuple
-from typing import List, Dict
+from typing import Callable, Dict, FrozenSet, List, Optional
+import bisect
+import json
 import math
 
 from src.helpers import between
@@ -17,23 +19,110 @@ class Timing(object):
         return f'Timing({self.time_start}, {self.time_end})'
 
 
+def serialize_timings(timings: Dict[str, List[Timing]]) -> str:
+    """Serializes timings to JSON, open ended timings are written as Infinity
+    >>> serialize_timings({'roach': [Timing(200, 700), Timing(1000, math.inf)], 'mutalisk': []})
+    '{"mutalisk": [], "roach": [[200, 700], [1000, Infinity]]}'
+    """
+    return json.dumps({name: [[timing.time_start, timing.time_end] for timing in name_timings]
+                       for name, name_timings in timings.items()}, sort_keys=True)
+
+
+def deserialize_timings(serialized_timings: str) -> Dict[str, List[Timing]]:
+    """Reads timings written by serialize_timings
+    >>> deserialize_timings('{"roach": [[200, 700], [1000, Infinity]]}')
+    {'roach': [Timing(200, 700), Timing(1000, inf)]}
+    """
+    return {name: [Timing(time_start, time_end) for time_start, time_end in name_timings]
+            for name, name_timings in json.loads(serialized_timings).items()}
+
+
 class TimingManager(object):
-    def __init__(self, timings: Dict[str, List[Timing]] = {}):
+    """
+    Compiles the timings into a sorted table of breakpoints with the matched timing names between them,
+    so while the time stays before the next breakpoint a step costs a single comparison.
+    on_enter / on_exit are called with the timing name exactly when a timing starts or stops matching.
+
+    >>> events = []
+    >>> manager = TimingManager({'roach': [Timing(200, 700), Timing(1000, math.inf)], 'boom': [Timing(-1, 375)]},
+    ...                         on_enter=lambda name: events.append('+' + name), on_exit=lambda name: events.append('-' + name))
+    >>> manager.breakpoints
+    [-1, 200, 375, 700, 1000]
+    >>> manager.manage_timings(0)
+    >>> sorted(manager.matched_timings), manager.next_transition_time
+    (['boom'], 200)
+    >>> for now in (100, 250, 400, 700, 701, 1500):
+    ...     manager.manage_timings(now)
+    >>> events
+    ['+boom', '+roach', '-boom', '-roach', '+roach']
+    >>> manager.next_transition_time
+    inf
+    >>> manager.check_timing(300, 'roach'), manager.check_timing(300, 'boom'), manager.check_timing(300, 'hydralisk')
+    (True, True, False)
+    """
+
+    def __init__(self, timings: Dict[str, List[Timing]] = {}, on_enter: Optional[Callable[[str], None]]=None,
+                 on_exit: Optional[Callable[[str], None]]=None):
         self.timings = timings
+        self.on_enter = on_enter
+        self.on_exit = on_exit
         self.matched_timings = set()
+        self.breakpoints: List[float] = sorted({boundary for name_timings in timings.values() for timing in name_timings
+                                                for boundary in (timing.time_start, timing.time_end) if boundary != math.inf})
+        # timings are open intervals, so a breakpoint itself has its own set of matched names
+        # and so does the span after it, up to the next breakpoint
+        self._at_breakpoint = [self._get_matching(breakpoint) for breakpoint in self.breakpoints]
+        self._spans = [self._get_matching(self._span_sample_time(index)) for index in range(len(self.breakpoints) + 1)]
+        self._span_start = math.inf
+        self.next_transition_time = -math.inf
 
-    def manage_timings(self, now: int):
-        self.matched_timings.clear()
-        for timing_name, timings in self.timings.items():
-            # timing_matches = timings.matches(now)
-            timing_matches = any(timing.matches(now) for timing in timings)
-            if timing_matches:
-                self.matched_timings.add(timing_name)
+    def _span_sample_time(self, index: int) -> float:
+        """A time strictly inside the span before the index-th breakpoint"""
+        if not self.breakpoints:
+            return 0
+        if index == 0:
+            return self.breakpoints[0] - 1
+        if index == len(self.breakpoints):
+            return self.breakpoints[-1] + 1
+        return (self.breakpoints[index - 1] + self.breakpoints[index]) / 2
 
-    def check_timing(self, now: int, timing_name: str) -> bool:
-        timing = self.timings[timing_name]
-        timing_matches = timing.matches(now)
-        return timing_matches
+    def _get_matching(self, now: float) -> FrozenSet[str]:
+        return frozenset(timing_name for timing_name, timings in self.timings.items()
+                         if any(timing.matches(now) for timing in timings))
+
+    def get_matching(self, now: float) -> FrozenSet[str]:
+        """Names of the timings that match at the given time, looked up in the breakpoint table"""
+        index = bisect.bisect_left(self.breakpoints, now)
+        if index < len(self.breakpoints) and self.breakpoints[index] == now:
+            return self._at_breakpoint[index]
+        return self._spans[index]
+
+    def manage_timings(self, now: float):
+        if self._span_start < now < self.next_transition_time:
+            return
+        index = bisect.bisect_left(self.breakpoints, now)
+        on_breakpoint = index < len(self.breakpoints) and self.breakpoints[index] == now
+        matching = self._at_breakpoint[index] if on_breakpoint else self._spans[index]
+        # on a breakpoint the fast path never applies, so the next step looks the time up again
+        self._span_start = now if on_breakpoint else (self.breakpoints[index - 1] if index else -math.inf)
+        next_index = index + 1 if on_breakpoint else index
+        self.next_transition_time = self.breakpoints[next_index] if next_index < len(self.breakpoints) else math.inf
+        ended, started = self.matched_timings - matching, matching - self.matched_timings
+        self.matched_timings = set(matching)
+        for timing_name in sorted(ended):
+            if self.on_exit:
+                self.on_exit(timing_name)
+        for timing_name in sorted(started):
+            if self.on_enter:
+                self.on_enter(timing_name)
+
+    def check_timing(self, now: float, timing_name: str) -> bool:
+        return timing_name in self.get_matching(now)
 
     def is_timing(self, timing_name: str):
         return timing_name in self.matched_timings
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
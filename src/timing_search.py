@@ -0,0 +1,281 @@
+"""Search over the boundaries of Timing windows.
+
+Every finite boundary of a base schedule is a parameter, a diagonal evolution strategy proposes new schedules
+and every trial is written to SQLite so an interrupted search resumes where it stopped.
+Run ``python -m src.timing_search`` for the doctests.
+"""
+import datetime
+import json
+import math
+import sqlite3
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from src.timing_manager import Timing, deserialize_timings, serialize_timings
+
+Timings = Dict[str, List[Timing]]
+
+DEFAULT_DATABASE_PATH = 'timing_search.sqlite'
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS searches (
+    name TEXT PRIMARY KEY,
+    base_timings TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS trials (
+    id INTEGER PRIMARY KEY,
+    search TEXT NOT NULL,
+    generation INTEGER NOT NULL,
+    candidate INTEGER NOT NULL,
+    parameters TEXT NOT NULL,
+    timings TEXT NOT NULL,
+    games INTEGER,
+    wins INTEGER,
+    finished_at TEXT,
+    UNIQUE (search, generation, candidate)
+);
+'''
+
+
+class TimingSpace(object):
+    """
+    Maps a schedule to a vector of its finite boundaries and back.
+    Windows starting at -1 keep that start and open ended windows keep their end, so those aren't parameters.
+    Vectors are repaired into valid schedules: boundaries are rounded, clipped to [0, max_time]
+    and sorted per name so the windows stay in order and never overlap.
+
+    >>> space = TimingSpace({'roach': [Timing(200, 700), Timing(1000, math.inf)], 'boom': [Timing(-1, 375)], 'ultralisk': []})
+    >>> space.names
+    ['roach.0.start', 'roach.0.end', 'roach.1.start', 'boom.0.end']
+    >>> space.to_vector(space.base_timings).tolist()
+    [200.0, 700.0, 1000.0, 375.0]
+    >>> space.from_vector([710.4, 180, 990, -50])
+    {'roach': [Timing(180, 710), Timing(990, inf)], 'boom': [Timing(-1, 0)], 'ultralisk': []}
+    """
+
+    def __init__(self, base_timings: Timings, max_time: float=3000):
+        self.base_timings = base_timings
+        self.max_time = max_time
+        # (timing name, window index, 'start' or 'end') of every parameter
+        self.parameters: List[Tuple[str, int, str]] = []
+        for name, timings in base_timings.items():
+            for index, timing in enumerate(timings):
+                if timing.time_start >= 0:
+                    self.parameters.append((name, index, 'start'))
+                if timing.time_end != math.inf:
+                    self.parameters.append((name, index, 'end'))
+
+    @property
+    def names(self) -> List[str]:
+        return ['{}.{}.{}'.format(*parameter) for parameter in self.parameters]
+
+    @property
+    def dimensions(self) -> int:
+        return len(self.parameters)
+
+    def to_vector(self, timings: Timings) -> np.ndarray:
+        return np.array([getattr(timings[name][index], 'time_' + side) for name, index, side in self.parameters], dtype=float)
+
+    def repair(self, vector: Iterable[float]) -> np.ndarray:
+        """Rounds, clips and sorts the boundaries of each timing name"""
+        vector = np.clip(np.round(np.asarray(vector, dtype=float)), 0, self.max_time)
+        names = [name for name, _, _ in self.parameters]
+        for name in set(names):
+            indices = [i for i, parameter_name in enumerate(names) if parameter_name == name]
+            vector[indices] = np.sort(vector[indices])
+        return vector
+
+    def from_vector(self, vector: Iterable[float]) -> Timings:
+        vector = self.repair(vector)
+        timings = {name: [[timing.time_start, timing.time_end] for timing in name_timings]
+                   for name, name_timings in self.base_timings.items()}
+        for (name, index, side), value in zip(self.parameters, vector):
+            timings[name][index][0 if side == 'start' else 1] = int(value)
+        return {name: [Timing(time_start, time_end) for time_start, time_end in name_timings]
+                for name, name_timings in timings.items()}
+
+
+class Trial(object):
+    def __init__(self, generation: int, candidate: int, parameters: List[float], timings: Timings,
+                 games: Optional[int]=None, wins: Optional[int]=None):
+        self.generation = generation
+        self.candidate = candidate
+        self.parameters = parameters
+        self.timings = timings
+        self.games = games
+        self.wins = wins
+
+    @property
+    def is_finished(self) -> bool:
+        return self.games is not None
+
+    @property
+    def fitness(self) -> Optional[float]:
+        """Win rate, None while unfinished or when every game crashed"""
+        return self.wins / self.games if self.games else None
+
+    @property
+    def key(self) -> str:
+        return 'g{}c{}'.format(self.generation, self.candidate)
+
+    def __repr__(self):
+        return 'Trial({}, wins={}, games={})'.format(self.key, self.wins, self.games)
+
+
+class TimingSearch(object):
+    """
+    Diagonal evolution strategy over a TimingSpace: each generation samples population_size schedules around a mean,
+    the mean moves to the weighted average of the best half and each boundary's spread shrinks or grows
+    with how far the best half strayed along it (a separable rank-mu update).
+    The optimizer state is rebuilt from the stored trials, so constructing a search with the same database
+    and name resumes it; the unfinished trials of the last generation are handed out again by ask().
+
+    >>> space = TimingSpace({'roach': [Timing(100, 900)], 'hydralisk': [Timing(1500, math.inf)]})
+    >>> search = TimingSearch(space, ':memory:', seed=3)
+    >>> trials = search.ask()
+    >>> len(trials), trials[0].generation
+    (7, 0)
+    >>> for trial in trials:
+    ...     search.tell(trial, games=4, wins=4 if trial.timings['roach'][0].time_start < 100 else 1)
+    >>> search.generation, len(search.ask())
+    (1, 7)
+    >>> search.best().timings['roach'][0].time_start < 100
+    True
+    """
+
+    def __init__(self, space: TimingSpace, path: str=DEFAULT_DATABASE_PATH, name: str='default',
+                 population_size: Optional[int]=None, initial_scale: float=120, min_scale: float=10,
+                 learning_rate: float=.3, seed: int=0):
+        self.space = space
+        self.name = name
+        dimensions = max(space.dimensions, 1)
+        self.population_size = population_size or 4 + int(3 * math.log(dimensions))
+        self.min_scale = min_scale
+        self.max_scale = space.max_time / 4
+        self.learning_rate = learning_rate
+        self.seed = seed
+        parents = self.population_size // 2
+        weights = np.log(parents + .5) - np.log(np.arange(1, parents + 1))
+        self.weights = weights / weights.sum()
+        self.mean = space.repair(space.to_vector(space.base_timings))
+        self.scales = np.full(space.dimensions, float(initial_scale))
+        self.generation = 0
+        self.connection = sqlite3.connect(path, timeout=30)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.executescript(_SCHEMA)
+        self._register()
+        self._replay()
+
+    def _register(self):
+        base_timings = serialize_timings(self.space.base_timings)
+        row = self.connection.execute('SELECT base_timings FROM searches WHERE name = ?', (self.name,)).fetchone()
+        if row is None:
+            with self.connection:
+                self.connection.execute('INSERT INTO searches (name, base_timings, created_at) VALUES (?, ?, ?)',
+                                        (self.name, base_timings, datetime.datetime.now().isoformat()))
+        elif row[0] != base_timings:
+            raise ValueError('search {} was started from different base timings, pick another name'.format(self.name))
+
+    def _load_generation(self, generation: int) -> List[Trial]:
+        rows = self.connection.execute(
+            'SELECT generation, candidate, parameters, timings, games, wins FROM trials '
+            'WHERE search = ? AND generation = ? ORDER BY candidate', (self.name, generation)).fetchall()
+        return [Trial(generation, candidate, json.loads(parameters), deserialize_timings(timings), games, wins)
+                for generation, candidate, parameters, timings, games, wins in rows]
+
+    def _replay(self):
+        """Applies the updates of every finished generation stored for this search"""
+        while True:
+            trials = self._load_generation(self.generation)
+            if not trials or not all(trial.is_finished for trial in trials):
+                return
+            self._update(trials)
+
+    def _update(self, trials: List[Trial]):
+        # unfinished or fully crashed trials rank last
+        ranked = sorted(trials, key=lambda trial: -1 if trial.fitness is None else trial.fitness, reverse=True)
+        parents = np.array([trial.parameters for trial in ranked[:len(self.weights)]], dtype=float)
+        weights = self.weights[:len(parents)] / self.weights[:len(parents)].sum()
+        if self.space.dimensions:
+            steps = parents - self.mean
+            variance = weights @ steps ** 2
+            self.scales = np.clip(np.sqrt((1 - self.learning_rate) * self.scales ** 2 + self.learning_rate * variance),
+                                  self.min_scale, self.max_scale)
+            self.mean = self.space.repair(weights @ parents)
+        self.generation += 1
+
+    def _sample_generation(self) -> List[Trial]:
+        # seeded per generation so a resumed search proposes the same candidates it would have
+        rng = np.random.RandomState([self.seed, self.generation])
+        trials = []
+        for candidate in range(self.population_size):
+            if self.generation == 0 and candidate == 0:
+                # the base schedule is always part of the first generation
+                vector = self.mean
+            else:
+                vector = self.space.repair(self.mean + self.scales * rng.standard_normal(self.space.dimensions))
+            trials.append(Trial(self.generation, candidate, vector.tolist(), self.space.from_vector(vector)))
+        with self.connection:
+            self.connection.executemany(
+                'INSERT INTO trials (search, generation, candidate, parameters, timings) VALUES (?, ?, ?, ?, ?)',
+                [(self.name, trial.generation, trial.candidate, json.dumps(trial.parameters), serialize_timings(trial.timings))
+                 for trial in trials])
+        return trials
+
+    def ask(self) -> List[Trial]:
+        """The unfinished trials of the current generation, sampling a new generation when there are none"""
+        trials = self._load_generation(self.generation) or self._sample_generation()
+        return [trial for trial in trials if not trial.is_finished]
+
+    def tell(self, trial: Trial, games: int, wins: int):
+        """Stores the outcome of a trial, the generation is updated once all its trials are finished"""
+        trial.games, trial.wins = games, wins
+        with self.connection:
+            self.connection.execute(
+                'UPDATE trials SET games = ?, wins = ?, finished_at = ? WHERE search = ? AND generation = ? AND candidate = ?',
+                (games, wins, datetime.datetime.now().isoformat(), self.name, trial.generation, trial.candidate))
+        if trial.generation == self.generation:
+            self._replay()
+
+    def trials(self) -> List[Trial]:
+        trials = []
+        for generation in range(self.generation + 1):
+            trials += self._load_generation(generation)
+        return trials
+
+    def best(self, min_games: int=1) -> Optional[Trial]:
+        """The finished trial with the highest win rate, more games break ties"""
+        finished = [trial for trial in self.trials() if trial.games and trial.games >= min_games]
+        return max(finished, key=lambda trial: (trial.fitness, trial.games), default=None)
+
+    def close(self):
+        self.connection.close()
+
+
+def run_search(search: TimingSearch, evaluate: Callable[[List[Trial]], Iterable[Tuple[Trial, int, int]]],
+               generations: int) -> Optional[Trial]:
+    """
+    Runs until the search has finished the given number of generations (counting generations of earlier runs).
+    evaluate gets the pending trials of a generation, plays them (in parallel if it likes)
+    and returns (trial, games, wins) for each of them.
+
+    >>> space = TimingSpace({'roach': [Timing(600, math.inf)]})
+    >>> search = TimingSearch(space, ':memory:', population_size=6, seed=1)
+    >>> evaluate = lambda trials: [(trial, 10, 10 - abs(trial.timings['roach'][0].time_start - 300) // 60) for trial in trials]
+    >>> best = run_search(search, evaluate, generations=8)
+    >>> search.generation
+    8
+    >>> abs(best.timings['roach'][0].time_start - 300) < 60
+    True
+    """
+    while search.generation < generations:
+        for trial, games, wins in evaluate(search.ask()):
+            search.tell(trial, games, wins)
+    return search.best()
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,81 @@
+from collections import defaultdict
+from heapq import merge
+from typing import Dict, Iterable, List, Tuple, Union
+
+from sc2.constants import UnitTypeId
+from sc2.unit import Unit
+from sc2.units import Units
+
+UnitTypes = Union[UnitTypeId, Iterable[UnitTypeId]]
+
+ALL = 'all'
+READY = 'ready'
+NOT_READY = 'not_ready'
+IDLE = 'idle'
+NOQUEUE = 'noqueue'
+READY_IDLE = 'ready_idle'
+READY_NOQUEUE = 'ready_noqueue'
+
+
+class UnitSnapshot(object):
+    """
+    Partitions a step's units by type id and by ready / idle / noqueue state in one pass.
+    Lookups are memoized for the rest of the step; ZergBotBase takes a new snapshot every on_step.
+    Results keep the order of the source units, same as Units.of_type(...).ready etc.
+    """
+
+    def __init__(self, units: Units):
+        self.units = units
+        self._partitions: Dict[UnitTypeId, Dict[str, List[Tuple[int, Unit]]]] = defaultdict(lambda: defaultdict(list))
+        self._cache: Dict[Tuple, Units] = {}
+        for index, unit in enumerate(units):
+            partition = self._partitions[unit.type_id]
+            item = (index, unit)
+            is_ready = unit.is_ready
+            is_idle = unit.is_idle
+            is_noqueue = unit.noqueue
+            partition[ALL].append(item)
+            partition[READY if is_ready else NOT_READY].append(item)
+            if is_idle:
+                partition[IDLE].append(item)
+            if is_noqueue:
+                partition[NOQUEUE].append(item)
+            if is_ready and is_idle:
+                partition[READY_IDLE].append(item)
+            if is_ready and is_noqueue:
+                partition[READY_NOQUEUE].append(item)
+
+    def _select(self, unit_types: UnitTypes, state: str) -> Units:
+        types_key = unit_types if isinstance(unit_types, UnitTypeId) else frozenset(unit_types)
+        key = (types_key, state)
+        cached = self._cache.get(key)
+        if cached is None:
+            if isinstance(unit_types, UnitTypeId):
+                items = self._partitions[unit_types][state] if unit_types in self._partitions else []
+            else:
+                items = merge(*(self._partitions[unit_type][state]
+                                for unit_type in types_key if unit_type in self._partitions))
+            cached = self.units.subgroup(unit for _, unit in items)
+            self._cache[key] = cached
+        return cached
+
+    def __call__(self, unit_types: UnitTypes) -> Units:
+        return self._select(unit_types, ALL)
+
+    def ready(self, unit_types: UnitTypes) -> Units:
+        return self._select(unit_types, READY)
+
+    def not_ready(self, unit_types: UnitTypes) -> Units:
+        return self._select(unit_types, NOT_READY)
+
+    def idle(self, unit_types: UnitTypes) -> Units:
+        return self._select(unit_types, IDLE)
+
+    def noqueue(self, unit_types: UnitTypes) -> Units:
+        return self._select(unit_types, NOQUEUE)
+
+    def ready_idle(self, unit_types: UnitTypes) -> Units:
+        return self._select(unit_types, READY_IDLE)
+
+    def ready_noqueue(self, unit_types: UnitTypes) -> Units:
+        return self._select(unit_types, READY_NOQUEUE)
@@ -0,0 +1,124 @@
+"""Counts of our units kept up to date by diffing each observation against the previous one.
+
+Only units whose type, readiness or orders changed touch the counts, so a lookup is a dict get
+instead of a scan of every unit.
+Run ``python -m src.unit_tracker`` for the doctests.
+"""
+from collections import Counter
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Tuple, Union
+
+from sc2.constants import AbilityId, UnitTypeId
+
+UnitTypes = Union[UnitTypeId, Iterable[UnitTypeId]]
+
+
+class UnitRecord(NamedTuple):
+    tag: int
+    # raw ids, the step's diff then builds no enums
+    type_id: int
+    is_ready: bool
+    abilities: FrozenSet[int]
+
+
+class UnitChanges(NamedTuple):
+    created: List[int]
+    destroyed: List[int]
+    # (tag, previous type id, new type id), e.g. larva to egg or hatchery to lair
+    morphed: List[Tuple[int, int, int]]
+    completed: List[int]
+    orders_changed: List[int]
+
+
+def get_unit_records(units) -> List[UnitRecord]:
+    """Records of sc2 units read from their raw proto fields"""
+    return [UnitRecord(unit.tag, unit._proto.unit_type, unit._proto.build_progress >= 1,
+                       frozenset(order.ability_id for order in unit._proto.orders))
+            for unit in units]
+
+
+def _type_values(unit_types: UnitTypes) -> List[int]:
+    if isinstance(unit_types, UnitTypeId):
+        return [unit_types.value]
+    return [unit_type.value for unit_type in unit_types]
+
+
+class UnitTracker(object):
+    """
+    >>> hatchery, pool, drone = UnitTypeId.HATCHERY.value, UnitTypeId.SPAWNINGPOOL.value, UnitTypeId.DRONE.value
+    >>> lair = AbilityId.UPGRADETOLAIR_LAIR.value
+    >>> tracker = UnitTracker()
+    >>> changes = tracker.update([UnitRecord(1, hatchery, True, frozenset()), UnitRecord(2, drone, True, frozenset())])
+    >>> changes.created, tracker.count(UnitTypeId.HATCHERY), tracker.count([UnitTypeId.HATCHERY, UnitTypeId.DRONE])
+    ([1, 2], 1, 2)
+    >>> # the drone becomes a spawning pool (a new tag) and the hatchery starts morphing to a lair
+    >>> changes = tracker.update([UnitRecord(1, hatchery, True, frozenset([lair])), UnitRecord(3, pool, False, frozenset())])
+    >>> changes.destroyed, changes.created, changes.orders_changed
+    ([2], [3], [1])
+    >>> tracker.not_ready_count(UnitTypeId.SPAWNINGPOOL), tracker.order_count(UnitTypeId.HATCHERY, AbilityId.UPGRADETOLAIR_LAIR)
+    (1, 1)
+    >>> changes = tracker.update([UnitRecord(1, UnitTypeId.LAIR.value, True, frozenset()), UnitRecord(3, pool, True, frozenset())])
+    >>> changes.morphed == [(1, hatchery, UnitTypeId.LAIR.value)], changes.completed
+    (True, [3])
+    >>> tracker.count(UnitTypeId.HATCHERY), tracker.ready_count(UnitTypeId.LAIR), tracker.ready_count(UnitTypeId.SPAWNINGPOOL)
+    (0, 1, 1)
+    >>> tracker.order_count(UnitTypeId.HATCHERY, AbilityId.UPGRADETOLAIR_LAIR)
+    0
+    """
+
+    def __init__(self):
+        self.records: Dict[int, UnitRecord] = {}
+        # (type id, is ready): units
+        self._counts: Counter = Counter()
+        # (type id, ability id): units of the type with the ability in their orders
+        self._orders: Counter = Counter()
+
+    def _add(self, record: UnitRecord, amount: int):
+        self._counts[(record.type_id, record.is_ready)] += amount
+        for ability in record.abilities:
+            self._orders[(record.type_id, ability)] += amount
+
+    def update(self, records: Iterable[UnitRecord]) -> UnitChanges:
+        """Brings the counts to this observation's units, returns what changed since the previous one"""
+        changes = UnitChanges([], [], [], [], [])
+        previous_records = self.records
+        current_records = {}
+        for record in records:
+            current_records[record.tag] = record
+            previous = previous_records.get(record.tag)
+            if previous == record:
+                continue
+            if previous is None:
+                changes.created.append(record.tag)
+            else:
+                self._add(previous, -1)
+                if previous.type_id != record.type_id:
+                    changes.morphed.append((record.tag, previous.type_id, record.type_id))
+                if record.is_ready and not previous.is_ready:
+                    changes.completed.append(record.tag)
+                if previous.abilities != record.abilities:
+                    changes.orders_changed.append(record.tag)
+            self._add(record, 1)
+        for tag, previous in previous_records.items():
+            if tag not in current_records:
+                self._add(previous, -1)
+                changes.destroyed.append(tag)
+        self.records = current_records
+        return changes
+
+    def count(self, unit_types: UnitTypes) -> int:
+        return sum(self._counts[(type_id, True)] + self._counts[(type_id, False)] for type_id in _type_values(unit_types))
+
+    def ready_count(self, unit_types: UnitTypes) -> int:
+        return sum(self._counts[(type_id, True)] for type_id in _type_values(unit_types))
+
+    def not_ready_count(self, unit_types: UnitTypes) -> int:
+        return sum(self._counts[(type_id, False)] for type_id in _type_values(unit_types))
+
+    def order_count(self, unit_types: UnitTypes, ability_id: AbilityId) -> int:
+        """Units of the types that have the ability among their orders"""
+        return sum(self._orders[(type_id, ability_id.value)] for type_id in _type_values(unit_types))
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
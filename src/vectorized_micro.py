@@ -0,0 +1,75 @@
+import numpy as np
+from typing import Dict, List, Optional
+
+from sc2.unit import Unit
+from sc2.units import Units
+
+
+class MicroTargetPlan(object):
+    """
+    Computes target candidates for every own combat unit at once.
+    Mirrors the priority order of BalancedZergBot._iter_target_candidates:
+      1. lowest health threat in range (below 50% health)
+      2. closest threat
+      3. first unit in range by the "lowest health" sort key (if below 80% health)
+      4. closest targettable unit
+    Targettable and threat masks follow get_is_targettable_callable / get_is_threat_callable.
+    """
+
+    def __init__(self, forces: Units, enemies: Units, search_distance: float=20):
+        self.enemies = enemies
+        self.rows: Dict[int, int] = {unit.tag: row for row, unit in enumerate(forces)}
+        own_count = len(forces)
+        self.candidate_indices = np.full((own_count, 4), -1, dtype=np.int64)
+        if not own_count or not enemies:
+            return
+
+        own_positions = np.array([(u.position.x, u.position.y) for u in forces])
+        own_can_attack_air = np.array([u.can_attack_air for u in forces])
+        own_can_attack_ground = np.array([u.can_attack_ground for u in forces])
+        own_is_flying = np.array([u.is_flying for u in forces])
+        own_weapon_range = np.array([max(u.ground_range, u.air_range) for u in forces])
+
+        enemy_positions = np.array([(u.position.x, u.position.y) for u in enemies])
+        enemy_is_flying = np.array([u.is_flying for u in enemies])
+        enemy_can_attack_air = np.array([u.can_attack_air for u in enemies])
+        enemy_can_attack_ground = np.array([u.can_attack_ground for u in enemies])
+        enemy_health = np.array([u.health_percentage for u in enemies])
+
+        offsets = own_positions[:, np.newaxis, :] - enemy_positions[np.newaxis, :, :]
+        distances = np.sqrt((offsets ** 2).sum(axis=2))
+
+        targettable = (distances < search_distance) & (
+            (own_can_attack_air[:, np.newaxis] & enemy_is_flying[np.newaxis, :]) |
+            (own_can_attack_ground[:, np.newaxis] & ~enemy_is_flying[np.newaxis, :]))
+        is_threat = np.where(own_is_flying[:, np.newaxis],
+                             enemy_can_attack_air[np.newaxis, :], enemy_can_attack_ground[np.newaxis, :])
+        threats = targettable & is_threat
+        in_range = targettable & (distances < own_weapon_range[:, np.newaxis])
+        health = np.broadcast_to(enemy_health, distances.shape)
+
+        # same value as the `u.health_percentage and u.can_attack_ground or u.can_attack_air` sort key
+        sort_key = np.where(enemy_health > 0, enemy_can_attack_ground | enemy_can_attack_air,
+                            enemy_can_attack_air).astype(np.float64)
+
+        low_health_threats_in_range = threats & in_range & (health < .5)
+        self.candidate_indices[:, 0] = self._masked_argmin(health, low_health_threats_in_range)
+        self.candidate_indices[:, 1] = self._masked_argmin(distances, threats)
+        lowest_in_range = self._masked_argmin(np.broadcast_to(sort_key, distances.shape), in_range)
+        lowest_in_range_health = np.where(lowest_in_range >= 0, enemy_health[np.maximum(lowest_in_range, 0)], 1)
+        self.candidate_indices[:, 2] = np.where(lowest_in_range_health < .8, lowest_in_range, -1)
+        self.candidate_indices[:, 3] = self._masked_argmin(distances, targettable)
+
+    @staticmethod
+    def _masked_argmin(values: np.ndarray, mask: np.ndarray) -> np.ndarray:
+        """Row-wise index of the first minimum where mask is set, -1 for rows without any"""
+        masked = np.where(mask, values, np.inf)
+        indices = masked.argmin(axis=1)
+        return np.where(mask.any(axis=1), indices, -1)
+
+    def get_candidates(self, unit: Unit) -> Optional[List[Unit]]:
+        """Returns the ordered target candidates of the unit, or None if the unit was not planned"""
+        row = self.rows.get(unit.tag)
+        if row is None:
+            return None
+        return [self.enemies[index] for index in self.candidate_indices[row] if index >= 0]
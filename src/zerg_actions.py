@@ -1,5 +1,6 @@
-from sc2 import BotAI
+from sc2 import BotAI, Race
 from sc2.constants import UnitTypeId, AbilityId
+from sc2.data import race_townhalls
 from sc2.unit import Unit
 from sc2.units import Units
 from typing import Union
@@ -20,6 +21,8 @@ COMBAT_UNIT_TYPES = [
     UnitTypeId.ULTRALISK
 ]
 
+TOWNHALL_TYPES = race_townhalls[Race.Zerg]
+
 ZERG_MELEE_WEAPON_UPGRADES = [
     AbilityId.RESEARCH_ZERGMELEEWEAPONSLEVEL1,
     AbilityId.RESEARCH_ZERGMELEEWEAPONSLEVEL2,
@@ -68,8 +71,14 @@ ULTRALISK_CAVERN_ABILITIES = [
 ]
 
 
+def get_free_larvae(bot: BotAI) -> Units:
+    """ready larvae that weren't given a command earlier in the step"""
+    larvae = bot.unit_snapshot.ready(UnitTypeId.LARVA)
+    return larvae.filter(lambda larva: larva.tag not in bot.action_buffer.commands)
+
+
 def get_random_larva(bot: BotAI) -> Union[Unit, None]:
-    larva = bot.units(UnitTypeId.LARVA).ready
+    larva = get_free_larvae(bot)
     return larva.exists and larva.random
 
 
@@ -82,7 +91,7 @@ async def build_drone(bot: BotAI, larva=None):
 
 async def build_zergling(bot: BotAI, larva):
     unit = larva if larva else get_random_larva(bot)
-    if unit and bot.can_afford(UnitTypeId.ZERGLING) and bot.units(UnitTypeId.SPAWNINGPOOL).ready.exists:
+    if unit and bot.can_afford(UnitTypeId.ZERGLING) and bot.unit_snapshot.ready(UnitTypeId.SPAWNINGPOOL).exists:
         bot_logger.log_action(bot, "building zergling")
         return await bot.do(unit.train(UnitTypeId.ZERGLING))
 
@@ -96,13 +105,13 @@ async def build_overlord(bot: BotAI, larva):
 
 
 async def upgrade_zergling_speed(bot: BotAI):
-    spawning_pool = bot.units(UnitTypeId.SPAWNINGPOOL).ready
+    spawning_pool = bot.unit_snapshot.ready(UnitTypeId.SPAWNINGPOOL)
     if not spawning_pool.exists:
         return False
     spawning_pool = spawning_pool.first
     metabolic_boost = AbilityId.RESEARCH_ZERGLINGMETABOLICBOOST
     if bot.can_afford(metabolic_boost):
-        available_abilities = await bot.get_available_abilities(spawning_pool)
+        available_abilities = await bot.ability_cache.get(spawning_pool)
         if metabolic_boost in available_abilities:
             bot_logger.log_action(bot, 'upgrading metabolic boost')
             await bot.do(spawning_pool(metabolic_boost))
@@ -111,11 +120,15 @@ async def upgrade_zergling_speed(bot: BotAI):
 
 
 def get_forces(bot: BotAI) -> Units:
-    return bot.units.of_type(COMBAT_UNIT_TYPES)
+    return bot.unit_snapshot(COMBAT_UNIT_TYPES)
+
+
+def get_ready_townhalls(bot: BotAI) -> Units:
+    return bot.unit_snapshot.ready(TOWNHALL_TYPES)
 
 
 def geyser_has_extractor(bot: BotAI, geyser: Unit, distance: Union[int, float]=1.0):
-    return bot.units(UnitTypeId.EXTRACTOR).closer_than(distance, geyser)
+    return bot.unit_snapshot(UnitTypeId.EXTRACTOR).closer_than(distance, geyser)
 
 
 def is_already_researching_lair(bot: BotAI, building: Unit) -> bool:
@@ -123,8 +136,7 @@ def is_already_researching_lair(bot: BotAI, building: Unit) -> bool:
 
 
 def already_researching_lair(bot: BotAI) -> bool:
-    return sum(
-        [is_already_researching_lair(bot, hatch) for hatch in bot.units(UnitTypeId.HATCHERY)]) > 1
+    return bot.unit_tracker.order_count(UnitTypeId.HATCHERY, AbilityId.UPGRADETOLAIR_LAIR) > 1
 
 
 def is_already_researching_hive(bot: BotAI, building: Unit) -> bool:
@@ -132,7 +144,4 @@ def is_already_researching_hive(bot: BotAI, building: Unit) -> bool:
 
 
 def already_researching_hive(bot: BotAI) -> bool:
-    return sum(
-        [is_already_researching_hive(bot, lair)
-         for lair in bot.units(UnitTypeId.LAIR)]
-    ) > 1
+    return bot.unit_tracker.order_count(UnitTypeId.LAIR, AbilityId.UPGRADETOHIVE_HIVE) > 1
@@ -1,14 +1,35 @@
 from abc import ABC, abstractmethod
-from sc2 import BotAI
 from sc2.unit import Unit
 from sc2.units import Units
 from sc2.position import Point2, Point3
-from typing import Union
+from sc2.constants import UnitTypeId, UpgradeId
+from sc2.data import race_worker
+from typing import Dict, Iterable, Union
 
+from src.ability_cache import AbilityCache
+from src.action_buffer import BufferedActionsBot
+from src.frame_scheduler import FrameScheduler
+from src.memoization import memoized_property, STEP
+from src.pending_production import PendingProduction, get_pending_records
+from src.step_profiler import NullProfiler
+from src.unit_snapshot import UnitSnapshot
+from src.unit_tracker import UnitTracker, UnitChanges, get_unit_records
 
-class ZergBotBase(ABC, BotAI):
+
+class ZergBotBase(ABC, BufferedActionsBot):
     def __init__(self):
         super().__init__()
+        self.unit_snapshot: UnitSnapshot = None
+        # counts per type, readiness and order, updated from the units that changed since the previous step
+        self.unit_tracker = UnitTracker()
+        self.unit_changes: UnitChanges = None
+        # unit type: raw id of the ability that creates it
+        self._creation_ability_ids: Dict[UnitTypeId, int] = {}
+        self.ability_cache = AbilityCache(self)
+        # replaced by a StepProfiler to time the step and its subsystems
+        self.profiler = NullProfiler()
+        # subclasses register their subsystems and call run_step from on_game_step
+        self.scheduler = FrameScheduler()
 
     @property
     @abstractmethod
@@ -90,12 +111,59 @@ class ZergBotBase(ABC, BotAI):
         """override to allow the bot to perform actions every game step"""
         pass
 
+    @memoized_property(STEP)
+    def pending_production(self) -> PendingProduction:
+        """indexed on the first already_pending call of each game loop"""
+        pending_production = PendingProduction({race_worker[self.race].value}, UnitTypeId.EGG.value)
+        pending_production.update(get_pending_records(self.units))
+        return pending_production
+
+    def already_pending(self, unit_type: Union[UpgradeId, UnitTypeId], all_units: bool=False) -> Union[int, float]:
+        """same as BotAI.already_pending, read from the pending production index instead of walking the units"""
+        if isinstance(unit_type, UpgradeId):
+            return self.already_pending_upgrade(unit_type)
+        ability_id = self._creation_ability_ids.get(unit_type)
+        if ability_id is None:
+            ability_id = self._creation_ability_ids[unit_type] = \
+                self._game_data.units[unit_type.value].creation_ability._proto.ability_id
+        return self.pending_production.count(unit_type.value, ability_id, all_units=all_units)
+
+    def already_pending_upgrade(self, upgrade_type: UpgradeId) -> Union[int, float]:
+        """same as BotAI.already_pending_upgrade: 0 not started, the research progress, 1 finished"""
+        if upgrade_type in self.state.upgrades:
+            return 1
+        level = upgrade_type.name[-1] if 'LEVEL' in upgrade_type.name else None
+        research_ability_id = self._game_data.upgrades[upgrade_type.value].research_ability.id
+        for ability_id, progress in self.pending_production.research_orders:
+            ability = self._game_data.abilities[ability_id]
+            if ability.id is research_ability_id:
+                if level and ability.button_name[-1] != level:
+                    return 0
+                return progress
+        return 0
+
+    def get_ability_query_units(self) -> Iterable[Unit]:
+        """override to choose which units get their available abilities queried at the start of each step"""
+        return []
+
     async def first_iteration(self):
         """override to allow the bot to perform actions at the beginning of the game"""
         pass
 
-    async def on_step(self, iteration):
-        if iteration == 0:
-            await self.first_iteration()
+    async def flush_actions(self):
+        with self.profiler.section('flush_actions'):
+            return await super().flush_actions()
 
-        await self.on_game_step(iteration)
+    async def on_step(self, iteration):
+        with self.profiler.section('step'):
+            # taken once per step, so every lookup below shares the same partitions of self.units
+            self.unit_snapshot = UnitSnapshot(self.units)
+            with self.profiler.section('unit_tracker'):
+                self.unit_changes = self.unit_tracker.update(get_unit_records(self.units))
+            with self.profiler.section('ability_prefetch'):
+                await self.ability_cache.prefetch(self.get_ability_query_units())
+            if iteration == 0:
+                await self.first_iteration()
+
+            # runs on_game_step, then sends every action issued during the step in one request
+            await super().on_step(iteration)
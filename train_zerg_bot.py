@@ -8,7 +8,11 @@ from sc2.player import Bot, Computer
 from src.balanced_zerg_bot import BalancedZergBot
 from src.colors import Colorizer
 from src.helpers import get_replay_name
-from src.timing_manager import Timing
+from src.match_runner import run_matches, summarize_record
+from src.results_store import ResultsStore
+from src.strategy_evaluation import evaluate_strategies
+from src.timing_manager import Timing, serialize_timings
+from src.timing_search import TimingSearch, TimingSpace, run_search
 
 # 4 player maps
 # "CactusValleyLE",
@@ -57,6 +61,27 @@ parser.add_argument(
 parser.add_argument(
     '--no-debug',  help='hide debugging lines', action='store_true'
 )
+parser.add_argument(
+    '--workers', help='number of games to play at the same time, each in its own process', type=int, default=1
+)
+parser.add_argument(
+    '--early-stopping', help='play strategies in rounds and stop playing the ones that are clearly worse, iterations becomes the most games per strategy', action='store_true'
+)
+parser.add_argument(
+    '--profile', help='time the subsystems of every step and write their percentiles to the profiles directory', action='store_true'
+)
+parser.add_argument(
+    '--build-order', help='open with this precompiled order from build_orders.json: speedling (6 zerglings and zergling speed by 3:20) or roach_push (8 roaches by 5:00), more are searched with src/build_order_search.py', default=None
+)
+parser.add_argument(
+    '--search', help='search the timing windows for this many generations, iterations becomes the games per candidate schedule', type=int, metavar='GENERATIONS'
+)
+parser.add_argument(
+    '--search-base', help='timings the search starts from', default='early_roach'
+)
+parser.add_argument(
+    '--search-name', help='name of the search in the search database, running it again resumes it', default=None
+)
 
 
 default_timings = {
@@ -273,23 +298,110 @@ all_timings = {
 }
 
 
-def test_bot(timings=default_timings, training_map=maps.get(all_map_names[1]), iterations=1, use_camera=True, should_show_plot=True, opponent_race=Race.Random, opponent_difficulty=Difficulty.Hard, show_debug=True):
-    record = []
-    for i in range(iterations):
-        players = [
-            Bot(Race.Zerg, BalancedZergBot(auto_camera=use_camera,
-                                           should_show_plot=should_show_plot, show_debug=show_debug, timings=timings)),
-            Computer(opponent_race, opponent_difficulty)
-        ]
-        replay_name = get_replay_name(players, training_map)
-        result = run_game(training_map, players, realtime=False,
-                          save_replay_as=replay_name)
-        record.append(result)
-        print('RESULT {}'.format(result))
-        print(Colorizer.bg_green(Colorizer.black(record)))
-    victory_count = sum(map(lambda x: x == Result.Victory, record))
-    defeat_count = len(record) - victory_count
-    return record, victory_count, defeat_count
+def get_game_result(game_summary):
+    return game_summary['result']
+
+
+def play_game(map_name, timings=default_timings, use_camera=True, should_show_plot=True, opponent_race=Race.Random, opponent_difficulty=Difficulty.Hard, show_debug=True,
+              profile_steps=False, build_order=None):
+    """Plays one game and returns its summary, module level so it can be sent to worker processes"""
+    training_map = maps.get(map_name)
+    bot = BalancedZergBot(auto_camera=use_camera, should_show_plot=should_show_plot, show_debug=show_debug, timings=timings,
+                          profile_steps=profile_steps, build_order=build_order)
+    players = [
+        Bot(Race.Zerg, bot),
+        Computer(opponent_race, opponent_difficulty)
+    ]
+    replay_name = get_replay_name(players, training_map)
+    result = run_game(training_map, players, realtime=False,
+                      save_replay_as=replay_name)
+    summary = dict(getattr(bot, 'game_summary', {}))
+    summary.update(result=result, map_name=map_name, opponent_race=opponent_race,
+                   opponent_difficulty=opponent_difficulty, replay_path=replay_name)
+    return summary
+
+
+def test_bot(timings=default_timings, training_map=maps.get(all_map_names[1]), iterations=1, use_camera=True, should_show_plot=True, opponent_race=Race.Random, opponent_difficulty=Difficulty.Hard, show_debug=True, workers=1,
+             strategy_name=None, results_store=None, profile_steps=False, build_order=None):
+    game_settings = dict(map_name=training_map.name, timings=timings, use_camera=use_camera, should_show_plot=should_show_plot,
+                         opponent_race=opponent_race, opponent_difficulty=opponent_difficulty, show_debug=show_debug,
+                         profile_steps=profile_steps, build_order=build_order)
+    results = []
+    # results stream in as games finish, a game that crashes is reported and left out of the record
+    for match_result in run_matches(play_game, [(i, game_settings) for i in range(iterations)], workers=workers):
+        results.append(match_result)
+        if match_result.crashed:
+            print(Colorizer.red('GAME {} CRASHED {!r}'.format(match_result.key, match_result.error)))
+            continue
+        print('RESULT {}'.format(match_result.result['result']))
+        print(Colorizer.bg_green(Colorizer.black(summarize_record(results, get_game_result=get_game_result)[0])))
+    if results_store:
+        store_games(results_store, [(strategy_name, timings, match_result.result) for match_result in results if not match_result.crashed])
+    return summarize_record(results, get_game_result=get_game_result)
+
+
+def store_games(results_store, games):
+    """games are (strategy name, timings, game summary) tuples"""
+    results_store.insert_games(dict(summary, strategy=strategy_name, timings=serialize_timings(timings))
+                               for strategy_name, timings, summary in games)
+
+
+def play_strategy_round(schedule, game_settings, workers=1, results_store=None):
+    """Plays one game per scheduled strategy name, returns (strategy name, won) for every game that didn't crash"""
+    matches = [(strategy_name, dict(game_settings, timings=all_timings[strategy_name])) for strategy_name in schedule]
+    finished = []
+    for match_result in run_matches(play_game, matches, workers=workers):
+        if match_result.crashed:
+            print(Colorizer.red('GAME {} CRASHED {!r}'.format(match_result.key, match_result.error)))
+            continue
+        print('RESULT {} {}'.format(match_result.key, match_result.result['result']))
+        finished.append(match_result)
+    if results_store:
+        store_games(results_store, [(match_result.key, all_timings[match_result.key], match_result.result) for match_result in finished])
+    return [(match_result.key, match_result.result['result'] == Result.Victory) for match_result in finished]
+
+
+def play_search_trials(trials, games_per_trial, game_settings, search_name, workers=1, results_store=None):
+    """Plays games_per_trial games of every trial schedule, returns (trial, games, wins) for each trial"""
+    matches = [(trial.candidate, dict(game_settings, timings=trial.timings)) for trial in trials for _ in range(games_per_trial)]
+    results = {trial.candidate: [] for trial in trials}
+    for match_result in run_matches(play_game, matches, workers=workers):
+        if match_result.crashed:
+            print(Colorizer.red('GAME {} CRASHED {!r}'.format(match_result.key, match_result.error)))
+            continue
+        results[match_result.key].append(match_result.result)
+    if results_store:
+        store_games(results_store, [('{}:{}'.format(search_name, trial.key), trial.timings, summary)
+                                    for trial in trials for summary in results[trial.candidate]])
+    outcomes = []
+    for trial in trials:
+        wins = sum(get_game_result(summary) == Result.Victory for summary in results[trial.candidate])
+        print('TRIAL {} {} / {} wins {}'.format(trial.key, wins, len(results[trial.candidate]), serialize_timings(trial.timings)))
+        outcomes.append((trial, len(results[trial.candidate]), wins))
+    return outcomes
+
+
+def run_timing_search(generations, base_name, games_per_trial, game_settings, search_name=None, workers=1, results_store=None):
+    search_name = search_name or 'search_{}'.format(base_name)
+    search = TimingSearch(TimingSpace(all_timings[base_name]), name=search_name)
+    best = run_search(search, lambda trials: play_search_trials(trials, games_per_trial, game_settings, search_name,
+                                                                workers=workers, results_store=results_store), generations)
+    search.close()
+    if best:
+        # the printed JSON reads back with deserialize_timings and goes straight into BalancedZergBot(timings=...)
+        print('best {} {} / {} wins {}'.format(best.key, best.wins, best.games, serialize_timings(best.timings)))
+    return best
+
+
+def run_early_stopping_sweep(max_games_per_strategy, game_settings, workers=1, results_store=None):
+    evaluation = evaluate_strategies(
+        lambda schedule: play_strategy_round(schedule, game_settings, workers=workers, results_store=results_store),
+        all_timings, max_games_per_strategy=max_games_per_strategy)
+    print('played {} games instead of {}'.format(evaluation.total_games, max_games_per_strategy * len(all_timings)))
+    for name, games, wins, win_rate, low, high, eliminated_in_round in evaluation.summary():
+        status = 'dropped after round {}'.format(eliminated_in_round) if eliminated_in_round is not None else 'contender'
+        print('{}: {} / {} wins ({:.0%}, 95% interval {:.0%} - {:.0%}) {}'.format(name, wins, games, win_rate, low, high, status))
+    return evaluation
 
 
 if __name__ == '__main__':
@@ -299,21 +411,30 @@ if __name__ == '__main__':
     use_camera = not args.no_camera
     should_show_plot = not args.no_plots
     should_show_debug = not args.no_debug
+    workers = args.workers
     opponent_race = Race[all_races[args.race]]
     opponent_difficulty = Difficulty[all_difficulties[args.difficulty]]
     total_record = []
-    for timing_name, timings in all_timings.items():
-        record, victory_count, defeat_count = test_bot(timings=timings, training_map=training_map, iterations=iterations, use_camera=use_camera, should_show_plot=should_show_plot,
-                                                       opponent_race=opponent_race, opponent_difficulty=opponent_difficulty, show_debug=should_show_debug)
-        total_record.append({
-            'record': record,
-            'wins': victory_count,
-            'losses': defeat_count,
-            'timings': timings
-        })
-        with open('balanced_zerg_bot_record.txt', 'a') as f:
-            f.write(',\n{}'.format(
-                [record, victory_count, defeat_count, timings]))
-    print(total_record)
-    with open('balanced_zerg_bot_record_total.txt', 'a') as f:
-        f.write('\n{}'.format(total_record))
+    results_store = ResultsStore()
+    game_settings = dict(map_name=training_map.name, use_camera=use_camera, should_show_plot=should_show_plot,
+                         opponent_race=opponent_race, opponent_difficulty=opponent_difficulty, show_debug=should_show_debug,
+                         profile_steps=args.profile, build_order=args.build_order)
+    if args.search:
+        run_timing_search(args.search, args.search_base, iterations, game_settings, search_name=args.search_name,
+                          workers=workers, results_store=results_store)
+    elif args.early_stopping:
+        run_early_stopping_sweep(iterations, game_settings, workers=workers, results_store=results_store)
+    else:
+        for timing_name, timings in all_timings.items():
+            record, victory_count, defeat_count = test_bot(timings=timings, training_map=training_map, iterations=iterations, use_camera=use_camera, should_show_plot=should_show_plot,
+                                                           opponent_race=opponent_race, opponent_difficulty=opponent_difficulty, show_debug=should_show_debug,
+                                                           workers=workers, strategy_name=timing_name, results_store=results_store,
+                                                           profile_steps=args.profile, build_order=args.build_order)
+            total_record.append({
+                'record': record,
+                'wins': victory_count,
+                'losses': defeat_count,
+                'timings': timings
+            })
+        print(total_record)
+    results_store.close()